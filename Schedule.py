@@ -1,4 +1,4 @@
-import base64
+import contextlib
 import csv
 import json
 import os
@@ -10,34 +10,104 @@ import requests
 from bs4 import BeautifulSoup as bs
 
 from defs import FBS, WEEKS
+from database import ScheduleDatabase
+from games import GameIndex
+from journal import ScheduleJournal
+from logos import LogoStore
 from poll import APPoll
+from projection import ScheduleVersion, VersionedSchedule
+from stream import ScheduleStream
 from utils import Utils
 
 
 class Schedule(object):
-    def __init__(self, file=None, year=datetime.now().year):
+    def __init__(self, file=None, year=datetime.now().year, conferences=None, teams=None, fields=None, skip=(),
+                 journal=False):
+        # conferences, teams, fields, skip: load only part of the file (see ScheduleStream); the rest is never parsed
+        # into memory
+        # A .db file is a ScheduleDatabase: every change below is written to it as it is made, row by row
+        # journal: log the changes to a json file in its ScheduleJournal as they are made, and only rewrite the file
+        # itself when the journal has grown (see save_to_file)
+        self.store = None
+        self.file = file
+        self.partial = False
         if file:
-            self.file = file
-            with open(file, 'r', encoding='utf8') as infile:
-                self.data = json.load(infile)
+            if ScheduleDatabase.handles(file):
+                self.store = ScheduleDatabase(file)
+                self.data = self.store.load(conferences=conferences, teams=teams)
+                self.partial = conferences is not None or teams is not None
+            else:
+                # either way with the changes logged since the file was last written
+                if conferences is None and teams is None and fields is None and not skip:
+                    self.data = ScheduleJournal(file).load()
+                else:
+                    self.data = ScheduleStream(file, conferences=conferences, teams=teams, fields=fields,
+                                               skip=skip).load()
+                    self.partial = True
+                if journal:
+                    self.store = ScheduleJournal(file, partial=self.partial)
+            # carrying the count of the changes made to it, for the projections built from it
+            self.data = VersionedSchedule(self.data)
+            # logos moved to the store next to the file (see externalize_logos) are read from there
+            self.logos = LogoStore.beside(file)
+            self.logos.attach(self.data)
+            self.games = GameIndex(self.data)
         else:
             self.url = 'https://api.collegefootballdata.com/games?year={}'.format(year)
+            self.logos = LogoStore()
             self.download_schedules()
 
+    def externalize_logos(self):
+        """
+        Move the logos still held inline in the schedule into the store next to its file, and save it without them:
+        a database row by row, a json file whole. Loading a schedule never does this by itself.
+        :return: (list) the teams whose logos were moved
+        """
+        if self.partial:
+            # the file would be replaced by just the teams that were loaded
+            raise ValueError('only part of {} was loaded; move the logos out of the whole schedule'.format(self.file))
+        moved = self.logos.externalize(self.data)
+        if not moved or not self.file:
+            return moved
+        if isinstance(self.store, ScheduleDatabase):
+            with self._transaction():
+                for team in moved:
+                    self._write_team(team)
+        elif self.store is not None:
+            self.store.compact(self.data)
+        else:
+            ScheduleJournal(self.file).compact(self.data)
+        return moved
+
     def add_game(self, team, **kwargs):
         g = {x: kwargs[x] if x in kwargs else [] if x == "scoreBreakdown" else "" for x in
              ["canceled", "home-away", "id", "location", "opponent", "scoreBreakdown",
               "startDate", "startTime", "teamRank", "winner"] if x in kwargs}
 
         self.data[team]['schedule'].append(g)
+        self.games.add(team, len(self.data[team]['schedule']) - 1)
+        self._write_games(team, len(self.data[team]['schedule']) - 1)
+        ScheduleVersion.bump(self.data)
+
+    def _transaction(self):
+        # Changes to a database or journal go in one transaction; a plain json schedule is written by save_to_file
+        return self.store.transaction() if self.store is not None else contextlib.nullcontext()
+
+    def _write_games(self, team, *slots):
+        if self.store is not None:
+            self.store.put_games(team, [(i, self.data[team]['schedule'][i]) for i in slots])
+
+    def _write_team(self, team):
+        if self.store is not None:
+            self.store.put_team(team, self.data[team])
 
     def box_score(self, game):
         opponent = game['opponent']
 
-        try:
-            opp_game = [x for x in self.data[opponent]['schedule'] if x['id'] == game['id']][0]
-        except IndexError:
+        j = self.games.find(game['id'], opponent)
+        if j is None:
             raise IndexError
+        opp_game = self.data[opponent]['schedule'][j]
         # TODO: make this spit out a boxscore
 
     @staticmethod
@@ -153,7 +223,10 @@ class Schedule(object):
         return result
 
     def cull(self):
-        new = {}
+        if self.partial:
+            # the store would be replaced by just the teams that were loaded
+            raise ValueError('only part of {} was loaded; cull needs the whole schedule'.format(self.file))
+        new = VersionedSchedule()
         for t in self.data:
             # cull any games between fcs schools
             if self.data[t]['conference'] not in FBS:
@@ -166,13 +239,16 @@ class Schedule(object):
             if len(self.data[t]['schedule']) > 0:
                 new[t] = self.data[t]
         self.data = new
+        self.games = GameIndex(self.data)
+        if self.store is not None:
+            self.store.write(self.data)
 
     def download_schedules(self, year=datetime.now().year) -> None:
         # get the schedule
         games = json.loads(requests.get(self.url).text)
 
         # build a list of teams
-        self.data = {x: {} for x in set([y[z] for y in games for z in ['home_team', 'away_team']])}
+        self.data = VersionedSchedule({x: {} for x in set([y[z] for y in games for z in ['home_team', 'away_team']])})
 
         # populate the team data
         teams = json.loads(requests.get('https://api.collegefootballdata.com/teams').text)
@@ -187,7 +263,7 @@ class Schedule(object):
                 try:
                     self.data[t['school']]['logo'] = t['logos'][0]
                     response = requests.get(self.data[t['school']]['logo'], stream=True)
-                    self.data[t['school']]['logoURI'] = base64.b64encode(response.raw.read()).decode()
+                    self.data[t['school']]['logoHash'] = self.logos.put(response.raw.read())
 
                 except TypeError:
                     print("no logo available for {}".format(t['school']))
@@ -229,6 +305,9 @@ class Schedule(object):
                                                  g['away_line_scores']) > sum(
                                                  g['home_line_scores']) else 'false'})
 
+        self.logos.attach(self.data)
+        self.games = GameIndex(self.data)
+
     @staticmethod
     def export_game_times_from_raw(file, year=None):
         with open(file, 'r') as infile:
@@ -285,15 +364,6 @@ class Schedule(object):
                 cw.writerow([home, h_rank, h_conf, away, a_rank, a_conf, conf_game, startDate, startTime, location])
 
     def export_game_results(self, file: str = 'out', fbs=False, conference=None):
-        def find(t, o):
-            try:
-                for i, dict in enumerate(self.data[t]['schedule']):
-                    if dict['opponent'] == o:
-                        return i
-            except KeyError:
-                return -2
-            return -1
-
         if not file.endswith('.csv'):
             file += '.csv'
         with open(file, 'w+', newline='') as outfile:
@@ -320,8 +390,8 @@ class Schedule(object):
                                     continue
                             except KeyError:
                                 continue
-                        j = find(opp, team)
-                        if j > 0:
+                        j = self.games.find(self.data[team]['schedule'][i]['id'], opp)
+                        if j is not None:
                             pf = sum(self.data[team]['schedule'][i]['scoreBreakdown'])
                             pa = sum(self.data[opp]['schedule'][j]['scoreBreakdown'])
                             flow = pf - pa
@@ -339,7 +409,8 @@ class Schedule(object):
                 conf = self.data[team]['conference']
             except KeyError:
                 conf = 'independent'
-            if conf in FBS:
+            # opponents in a partial schedule have no games of their own
+            if conf in FBS and 'schedule' in self.data[team]:
                 name = Schedule.clean_team_name(team, display=True)
                 result[name] = []
                 for i in range(len(self.data[team]['schedule'])):
@@ -375,8 +446,7 @@ class Schedule(object):
 
     @staticmethod
     def make_blank_schedule(year=None):
-        with open('schedule.json', 'r', encoding='utf8') as infile:
-            s = json.load(infile)
+        s = ScheduleJournal('schedule.json').load()
         for x in s:
             del s[x]['rankings']
             s[x]['schedule'] = []
@@ -391,67 +461,78 @@ class Schedule(object):
 
     def normalize_schedule(self, method: str = 'spplus', week: int = -1):
         # A method to ensure that all games have a total win probability equal to one
-
-        # local helper function to locate the opponent within the schedule
-        def find(lst, team, opp):
-            try:
-                for i, dict in enumerate(lst[team]['schedule']):
-                    if dict['opponent'] == opp:
-                        return i
-            except KeyError:
-                return -2
-            return -1
-
-        for team in self.data:
-            for i in range(len(self.data[team]['schedule'])):
-                try:
-                    win_prob = self.data[team]['schedule'][i][method]
-                except KeyError:
-                    continue
-                if len(win_prob) > 0:
-                    opponent = self.data[team]['schedule'][i]['opponent']
-                    # Is this a opponent even in our json file?
-                    if opponent not in self.data:
-                        continue
-                    opp_win_prob = round(1 - win_prob[week], 3)
-                    # We have to find the correct index for the opponent
-                    # because they may not play in the same order due to byes
-                    j = find(self.data, opponent, team)
-
+        with self._transaction():
+            for team in self.data:
+                for i in range(len(self.data[team]['schedule'])):
                     try:
-                        if self.data[opponent]['schedule'][j][method][week] != opp_win_prob:
-                            self.data[opponent]['schedule'][j][method][week] = opp_win_prob
-                    except IndexError:
-                        self.data[opponent]['schedule'][j][method].append(opp_win_prob)
+                        win_prob = self.data[team]['schedule'][i][method]
                     except KeyError:
-                        self.data[opponent]['schedule'][j][method] = [opp_win_prob]
-                    except TypeError:
-                        print('problem with {}, {}'.format(team, opponent))
+                        continue
+                    if len(win_prob) > 0:
+                        opponent = self.data[team]['schedule'][i]['opponent']
+                        # Is this a opponent even in our json file?
+                        if opponent not in self.data:
+                            continue
+                        opp_win_prob = round(1 - win_prob[week], 3)
+                        # We have to find the correct index for the opponent
+                        # because they may not play in the same order due to byes
+                        j = self.games.find(self.data[team]['schedule'][i]['id'], opponent)
+                        if j is None:
+                            continue
+
+                        try:
+                            if self.data[opponent]['schedule'][j][method][week] != opp_win_prob:
+                                self.data[opponent]['schedule'][j][method][week] = opp_win_prob
+                        except IndexError:
+                            self.data[opponent]['schedule'][j][method].append(opp_win_prob)
+                        except KeyError:
+                            self.data[opponent]['schedule'][j][method] = [opp_win_prob]
+                        except TypeError:
+                            print('problem with {}, {}'.format(team, opponent))
+                        self._write_games(opponent, j)
 
     def populate_URIs(self):
         for file in os.listdir("./Resources"):
             if file.endswith(".jpg"):
                 name = file[:-4].lower()
                 with open(os.path.join("./Resources/", file), "rb") as imageFile:
-                    uri = base64.b64encode(imageFile.read()).decode()
-                    try:
-                        self.data[name][file[:-4].lower()] = uri
-                    except KeyError:
-                        print("File for {}, but not found in schedule.".format(name, uri))
+                    data = imageFile.read()
+                if name in self.data:
+                    self.data[name]['logoHash'] = self.logos.put(data)
+                    self.data[name].pop('logoURI', None)
+                    self._write_team(name)
+                else:
+                    print("File for {}, but not found in schedule.".format(name))
 
-    def save_to_file(self, file=None):
+    def save_to_file(self, file=None, compact=False):
+        """
+        Save without asking; by default over the file the schedule was loaded from.
+        :param compact: with a journal, rewrite the file now instead of waiting for the journal to grow
+        """
         if not file:
             file = self.file
 
-        if file == self.file:
-            if input('Overwrite existing schedule file? Y/N: ')[0].lower() != 'y':
-                file = input('New file name: ')
-                if file[-5:] != '.json':
-                    file += '.json'
-                raise TypeError
+        if isinstance(self.store, ScheduleDatabase) and file == self.file:
+            # every change is already in the database
+            return
+        if isinstance(self.store, ScheduleJournal) and file == self.file:
+            # every change is already logged; the file itself is only rewritten now and then (and never from a
+            # partial load, whose journal is only logged to)
+            self.store.flush()
+            if compact or self.store.due():
+                self.store.compact(self.data)
+            return
+        if self.partial and file == self.file:
+            raise ValueError('only part of {} was loaded; save it to a different file'.format(file))
+        if ScheduleDatabase.handles(file):
+            ScheduleDatabase(file).write(self.data)
+            return
 
         with open(file, 'w+', encoding='utf8') as outfile:
             json.dump(self.data, outfile, indent=4, sort_keys=True, ensure_ascii=False)
+        if file == self.file:
+            # the file holds every logged change now
+            ScheduleJournal(file).clear()
 
     @staticmethod
     def scrape_spplus(
@@ -489,11 +570,13 @@ class Schedule(object):
                 teams.pop(teams['opponent'])
 
     def update_from_NCAA(self, new=None):
+        # look teams up by their NCAA name; if two teams share a name the first one wins
+        names = {}
+        for x in self.data:
+            names.setdefault(self.data[x].get('nameRaw'), x)
+
         def find(t):
-            for x in self.data:
-                if t == self.data[x]['nameRaw']:
-                    return x
-            return None
+            return names.get(t)
 
         if not new:
             new = Schedule.download_schedules()
@@ -502,116 +585,77 @@ class Schedule(object):
                 new = json.load(infile)
 
         keys = {'canceled', 'home-away', 'location', 'opponent', 'scoreBreakdown', 'startDate', 'startTime', 'winner'}
+        # anything projected from the old results is now stale
+        ScheduleVersion.bump(self.data)
+        touched = []
         for game in new:
-            away = find(game['away']['nameRaw'])
-            if away and self.data[away]['conference'] in FBS:
-                found = False
-                try:
-                    for i in range(len(self.data[away]['schedule'])):
-                        if self.data[away]['schedule'][i]['id'] == game['id']:
-                            found = True
-                            try:
-                                if self.data[away]['schedule'][i]['doNotUpdate']:
-                                    continue
-                            except KeyError:
-                                pass
-                            for key in ['startDate', 'startTime']:
-                                self.data[away]['schedule'][i][key] = game[key]
-                            for key in ['scoreBreakdown', 'teamRank', 'winner']:
-                                self.data[away]['schedule'][i][key] = game['away'][key]
-                            try:
-                                self.data[away]['schedule'][i]['scoreBreakdown'] = [int(x) if len(x) > 0 else 0
-                                                                                    for x in
-                                                                                    self.data[away]['schedule'][i][
-                                                                                        'scoreBreakdown']]
-                            except ValueError as e:
-                                print("problem with scores for {}".format(away))
-                                pass
-                            break
-                except KeyError as e:
-                    print("couldn't find {}".format(e))
-                    pass
-                if not found:
-                    foo = {x: None for x in keys}
-                    foo['canceled'] = 'false'
-                    foo['home-away'] = 'away'
-                    foo['location'] = game['location']
-                    foo['opponent'] = game['home']['nameSeo']
+            for side, other in (('away', 'home'), ('home', 'away')):
+                team = find(game[side]['nameRaw'])
+                if not (team and self.data[team]['conference'] in FBS):
+                    continue
+
+                i = self.games.find(game['id'], team)
+                if i is not None:
+                    current = self.data[team]['schedule'][i]
+                    if current.get('doNotUpdate'):
+                        continue
                     try:
-                        foo['scoreBreakdown'] = [int(x) if len(x) > 0 else 0 for x in game[away]['scoreBreakdown']]
+                        for key in ['startDate', 'startTime']:
+                            current[key] = game[key]
+                        for key in ['scoreBreakdown', 'teamRank', 'winner']:
+                            current[key] = game[side][key]
+                        try:
+                            current['scoreBreakdown'] = [int(x) if len(x) > 0 else 0 for x in current['scoreBreakdown']]
+                        except ValueError as e:
+                            print("problem with scores for {}".format(team))
+                            pass
                     except KeyError as e:
-                        print(e)
-                    foo['startDate'] = game['startDate']
-                    foo['startTime'] = game['startTime']
-                    foo['winner'] = game['away']['winner']
-                    self.data[away]['schedule'].append(foo)
-
-            home = find(game['home']['nameRaw'])
-            if home and self.data[home]['conference'] in FBS:
-                found = False
-                try:
-                    for i in range(len(self.data[home]['schedule'])):
-                        if self.data[home]['schedule'][i]['id'] == game['id']:
-                            found = True
-                            try:
-                                if self.data[home]['schedule'][i]['doNotUpdate']:
-                                    continue
-                            except KeyError:
-                                pass
-                            for key in ['startDate', 'startTime']:
-                                self.data[home]['schedule'][i][key] = game[key]
-                            for key in ['scoreBreakdown', 'teamRank', 'winner']:
-                                self.data[home]['schedule'][i][key] = game['home'][key]
-                            try:
-                                self.data[home]['schedule'][i]['scoreBreakdown'] = [int(x) if len(x) > 0 else 0
-                                                                                    for x in
-                                                                                    self.data[home]['schedule'][i][
-                                                                                        'scoreBreakdown']]
-                            except ValueError as e:
-                                print("problem with scores for {}".format(away))
-                                pass
-
-                            break
-                except KeyError as e:
-                    print("couldn't find {}".format(e))
-                    pass
-                if not found:
+                        print("couldn't find {}".format(e))
+                        pass
+                    touched.append((team, i))
+                else:
                     foo = {x: None for x in keys}
                     foo['canceled'] = 'false'
-                    foo['home-away'] = 'home'
+                    foo['home-away'] = side
+                    foo['id'] = game['id']
                     foo['location'] = game['location']
-                    foo['opponent'] = game['away']['nameSeo']
+                    foo['opponent'] = game[other]['nameSeo']
                     try:
-                        foo['scoreBreakdown'] = [int(x) if len(x) > 0 else 0 for x in game[home]['scoreBreakdown']]
+                        foo['scoreBreakdown'] = [int(x) if len(x) > 0 else 0 for x in game[side]['scoreBreakdown']]
                     except KeyError as e:
                         print(e)
                     foo['startDate'] = game['startDate']
                     foo['startTime'] = game['startTime']
-                    foo['winner'] = game['home']['winner']
-                    self.data[home]['schedule'].append(foo)
+                    foo['winner'] = game[side]['winner']
+                    self.data[team]['schedule'].append(foo)
+                    self.games.add(team, len(self.data[team]['schedule']) - 1)
+                    touched.append((team, len(self.data[team]['schedule']) - 1))
+
+        with self._transaction():
+            for team, slot in touched:
+                self._write_games(team, slot)
 
     def update_game(self, game_id, field, new_val):
         c = 0
 
-        def find_game(t, g):
-            for j in range(len(self.data[t]['schedule'])):
-                if self.data[t]['schedule'][j]['id'] == str(g):
-                    if field in self.data[t]['schedule'][j]:
-                        self.data[t]['schedule'][j][field] = new_val
-                        return 1
-                    else:
-                        return -1
-            return 0
-
-        for team in self.data:
-            res = find_game(team, game_id)
-            c += res
-            if res >= 0:
-                continue
+        slots = self.games.locate(game_id)
+        for team, j in slots:
+            if field in self.data[team]['schedule'][j]:
+                self.data[team]['schedule'][j][field] = new_val
+                if field == 'id':
+                    # the index is keyed by id, so the slot moves to the new one
+                    self.games.discard(game_id, team)
+                    self.games.add(team, j)
+                ScheduleVersion.bump(self.data)
+                c += 1
             else:
                 print('Not a valid field choice: {}'.format(field))
                 return
 
+        with self._transaction():
+            for team, j in slots:
+                self._write_games(team, j)
+
         print('Found {} occurrences of game id {} '.format(c, game_id))
 
     def update_rankings(self, year=datetime.now().year, week=None) -> None:
@@ -658,6 +702,11 @@ class Schedule(object):
                 del ap.ballots['results'][key]
             except KeyError:
                 not_in_poll.append(team)
+
+        if self.store is not None:
+            with self.store.transaction():
+                for team in self.data:
+                    self.store.put_ranking(team, 'AP', date, self.data[team]['rankings']['AP'][date])
         pp = pprint.PrettyPrinter(indent=4)
         if len(ap.ballots['results']) > 0:
             print('Portions of the poll couldn\'t be found:')
@@ -674,6 +723,9 @@ class Schedule(object):
 
     def update_spplus(self):
         new = Schedule.scrape_spplus()
+        ScheduleVersion.bump(self.data)
+        date = datetime.now().strftime("%Y-%m-%d")
+        updated = []
 
         for team in new:
             try:
@@ -699,10 +751,16 @@ class Schedule(object):
                     team['name'] = 'UT San Antonio'
                 elif team['name'] == 'Connecticut':
                     team['name'] = 'Uconn'
-                self.data[team['name'].lower()]['sp+'][datetime.now().strftime("%Y-%m-%d")] = team['sp+']
+                self.data[team['name'].lower()]['sp+'][date] = team['sp+']
+                updated.append(team['name'].lower())
             except KeyError:
                 print(team)
 
+        if self.store is not None:
+            with self.store.transaction():
+                for team in updated:
+                    self.store.put_ratings(team, [(date, self.data[team]['sp+'][date])])
+
     def to_csv(self, csv_file):
         with open(csv_file, 'w+', newline='') as outfile:
             csvwriter = csv.writer(outfile)
@@ -1,18 +1,20 @@
 import base64
-import json
 import os
 import re
 import urllib.parse
 from colorsys import hls_to_rgb
-from defs import PFIVE, GFIVE, FBS
+from defs import PFIVE, GFIVE, FBS, HOME_FIELD_ADVANTAGE, SPPLUS_STDEV
 from datetime import datetime
 
 from subprocess import Popen
 
+import numpy as np
 import requests
 from bs4 import BeautifulSoup as bs
 from scipy.stats import norm
 
+from journal import ScheduleJournal
+
 
 class Utils:
     headers = {'User-Agent': 'Mozilla/5.0'}
@@ -20,11 +22,30 @@ class Utils:
     @staticmethod
     def calculate_win_prob_from_spplus(a, b, loc):
         if loc == 'home':
-            return norm.cdf((a - b + 2.5) / 17)
+            return norm.cdf((a - b + HOME_FIELD_ADVANTAGE) / SPPLUS_STDEV)
         elif loc == 'neutral':
-            return norm.cdf((a - b) / 17)
+            return norm.cdf((a - b) / SPPLUS_STDEV)
         else:
-            return norm.cdf((a - b - 2.5) / 17)
+            return norm.cdf((a - b - HOME_FIELD_ADVANTAGE) / SPPLUS_STDEV)
+
+    @staticmethod
+    def date_to_ordinal(value):
+        """Return (int) the day number of a 'YYYY-MM-DD' string, date or datetime; day numbers pass through."""
+        if isinstance(value, (int, np.integer)):
+            return int(value)
+        return int(np.datetime64(value, 'D').astype(np.int64))
+
+    @staticmethod
+    def dates_to_ordinals(dates):
+        """Return (numpy array) of integer day numbers for a list of 'YYYY-MM-DD' strings, without strptime."""
+        return np.array(dates, dtype='datetime64[D]').astype(np.int64)
+
+    @staticmethod
+    def is_past(ordinals, now=None):
+        """Return (bool or numpy array) whether the days given started before now."""
+        if not now:
+            now = datetime.now()
+        return np.asarray(ordinals, dtype=np.int64).astype('datetime64[D]') < np.datetime64(now)
 
     @staticmethod
     def download_logos(width=40, height=40):
@@ -67,6 +88,29 @@ class Utils:
         else:
             return 255, 255, 255
 
+    @staticmethod
+    def cumulative_percentages(probabilities):
+        """Return (list) of labels for the chance of at least each number of wins, e.g. '87.5%'."""
+        labels, total = [], 0
+        for p in probabilities:
+            labels.append(str(round(abs(100 * (1 - total)), 1)) + '%')
+            total += p
+        return labels
+
+    @staticmethod
+    def percentage_changes(new, old):
+        """Return (list) of labels for the change in each probability from old to new, e.g. '(+1.5)%'."""
+        labels = []
+        for j in range(len(new)):
+            diff = round(100 * (new[j] - old[j]), 1)
+            if diff > 0:
+                labels.append('(+{})%'.format(diff))
+            elif diff < 0:
+                labels.append('(' + str(diff) + '%)')
+            else:
+                labels.append('(+' + str(diff) + '%)')
+        return labels
+
     @staticmethod
     def gradient_color(lower, upper, val, method='linear', scale='red-green', primaryColor=None,
                        secondaryColor=None):
@@ -123,8 +167,7 @@ class Utils:
 
     @staticmethod
     def scrape_png_links(format='reddit'):
-        with open("schedule.json", "r") as file:
-            schedule = json.load(file)
+        schedule = ScheduleJournal('schedule.json').load()
 
         scale = ['red-green']
         result = {}
@@ -177,4 +220,5 @@ class Utils:
         return (sum([(x - sum(spplus) / len(spplus)) ** 2 for x in spplus]) / len(spplus)) ** 0.5
 
 
-Utils.scrape_png_links()
+if __name__ == '__main__':
+    Utils.scrape_png_links()
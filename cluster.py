@@ -1,28 +1,55 @@
 import csv
-import itertools
 import os
-from datetime import datetime
 
+import numpy as np
+
+from colors import ColorScale
 from defs import FBS
+from distribution import WinTotalEngine
 from graph import Graph
+from history import RatingHistory
+from layout import TableLayout
+from probability import WinProbabilityEngine
+from simulation import RankCounts, SeasonSimulator
+from strength import StrengthOfScheduleEngine
+from swap import ScheduleSwapEngine
 from team import Team
 from utils import Utils
 
 
 class Cluster:
     # A cluster is just a group of teams, not necessarily any particular conference or division
-    def __init__(self, schedule, teams):
-        self.teams = [Team(name=x, schedule=schedule) for x in schedule if x in teams]
+    def __init__(self, schedule, teams, history=None, registry=None, lazy=False):
+        # lazy: only evaluate the S&P+ dates that are actually used, e.g. for a single week's graph
+        self.members = [x for x in schedule if x in teams]
+        self.registry = registry
+        if registry is not None:
+            # the teams are shared with everything else built from the registry
+            self.history = registry.history
+            self.teams = registry.teams(self.members)
+            self._engine = None
+        else:
+            if history is None:
+                history = RatingHistory(schedule)
+            self.history = history
+            self._engine = WinProbabilityEngine(schedule=schedule, teams=self.members, history=history, lazy=lazy)
+            self.teams = [Team(name=x, schedule=schedule, engine=self._engine) for x in self.members]
         self.schedule = self.teams[0].schedule
 
+    @property
+    def engine(self):
+        # An engine over just the members, for the schedule swaps, rankings and simulations; with a registry it is
+        # only built if one of those is run
+        if self._engine is None:
+            self._engine = self.registry.engine(self.members)
+        return self._engine
+
     def get_avg_spplus(self, lower, upper):
         sp = []
 
         for team in self.schedule:
             if self.schedule[team]['conference'] in FBS:
-                date = max(datetime.strptime(dt, '%Y-%m-%d') for dt in self.schedule[team]['sp+'].keys()).strftime(
-                    '%Y-%m-%d')
-                sp.append(self.schedule[team]['sp+'][date])
+                sp.append(self.history.latest(team)[1])
         sp.sort(reverse=True)
         if upper == -1:
             return sum(sp[lower - 1:upper]) / (len(sp) - lower + 1)
@@ -34,7 +61,7 @@ class Cluster:
         record = []
 
         for t in self.teams:
-            record.append([t, t.project_win_totals(week=week)[-1], t.project_win_totals(week=week - 1)[-1]])
+            record.append([t, t.project_win_distribution(week=week), t.project_win_distribution(week=week - 1)])
 
         if order == 'winexp':
             # sort teams by their weighted average number of wins
@@ -43,10 +70,33 @@ class Cluster:
             record.sort(key=lambda x: x[0].latest_spplus, reverse=True)
         return record
 
+    def get_standings_distribution(self, week=-1, simulations=100000, seed=None):
+        """
+        Simulate the season and return (dict) of team name -> probability of finishing in each position of the
+        cluster by total wins.
+        """
+        dates = {t.name: t.get_best_sp_match(week) for t in self.teams}
+        simulator = SeasonSimulator(self.engine, dates, seed=seed)
+        ranks, = simulator.run(simulations, [RankCounts({'all': [t.name for t in self.teams]})])
+        return ranks.result(simulator)['all']
+
     def make_schedule_ranking_graph(self, file=None, week=None, hstep=50, vstep=50, margin=5, logowidth=40,
                                     absolute=False, old=None, method='sp+', logoheight=40, scale='red-green',
                                     record=None, spplus='top25'):
-        date = datetime.now()
+        # spplus may be a list, e.g. ['top5', 'average']: every reference is evaluated by one
+        # StrengthOfScheduleEngine, which both ranks the schedules and colors the cells, and each gets its own file
+        references = [self._schedule_reference(x) for x in (spplus if isinstance(spplus, (list, tuple)) else [spplus])]
+        dates = {x.name: x.get_best_sp_match(-1) for x in self.teams}
+        strength = StrengthOfScheduleEngine(self.engine, [x[0] for x in references], dates=dates)
+        for k, (x, txt, stxt) in enumerate(references):
+            # a file name given for several references is told apart by each one's label
+            name = file if not file or len(references) == 1 else '{} using {}'.format(file, txt)
+            self._draw_schedule_ranking(strength, k, txt, stxt, file=name, hstep=hstep, vstep=vstep, margin=margin,
+                                        logowidth=logowidth, old=old, method=method, logoheight=logoheight,
+                                        scale=scale)
+
+    def _schedule_reference(self, spplus):
+        # Return (rating, label, sub label) for a reference given as a rating or as 'top25', 'average', ...
         if not isinstance(spplus, int):
             if spplus.lower()[0:3] == 'top':
                 try:
@@ -71,18 +121,21 @@ class Cluster:
             else:
                 x = 0.0
                 txt = 'spplus 0'
+                stxt = None
         else:
             x = spplus
             txt = 'SP+ {}'.format(round(spplus, 1))
             stxt = None
+        return x, txt, stxt
 
-        record = self.rank_schedules(spplus=x)
+    def _draw_schedule_ranking(self, strength, reference, txt, stxt, file=None, hstep=50, vstep=50, margin=5,
+                               logowidth=40, old=None, method='sp+', logoheight=40, scale='red-green'):
+        record = self.rank_schedules(strength=strength, reference=reference)
 
         if not file:
             file = 'Strength of Schedule using {}'.format(txt)
 
-        if not os.path.exists(".\svg output\{} ~ {}".format(method, scale)):
-            os.makedirs(".\svg output\{} ~ {}".format(method, scale))
+        os.makedirs(".\svg output\{} ~ {}".format(method, scale), exist_ok=True)
         path = os.path.join(".\svg output\{} ~ {}".format(method, scale),
                             '{} ~ {}.svg'.format(file, scale))
         if not old:
@@ -114,33 +167,22 @@ class Cluster:
 
         # This set of loops fills in the body of the table
         for i in range(0, rows - 2):
-            # Add the team logo
-            graph.add_image(margin + (hstep - logowidth) / 2,
-                            vstep * (2 + i) + margin + (vstep - logoheight) / 2,
-                            logowidth,
-                            logoheight,
-                            record[i][0].logo_URI)
+            # Add the team logo, if there is one
+            try:
+                graph.add_image(margin + (hstep - logowidth) / 2,
+                                vstep * (2 + i) + margin + (vstep - logoheight) / 2,
+                                logowidth,
+                                logoheight,
+                                record[i][0].logo_URI)
+            except KeyError:
+                pass
 
             # Add the rank in the upper left of the logo box
             graph.add_text(2.5 * margin, vstep * (2 + i) + 2.5 * margin, alignment='middle', size=8, text=i + 1)
 
             team = record[i][0].name
 
-            cur = x
-            win_probabilities = []
-            for k in range(len(self.schedule[team]['schedule'])):
-                # Get the opponent S&P+ value
-                opp_sp = self.schedule[self.schedule[team]['schedule'][k]['opponent']]['sp+']
-                # Use the most recent S&P+ values prior to the specified date
-                # Note there might be a misalignment between the S&P+ value dates for different teams, especially FCS teams
-                best_match = max(
-                    datetime.strptime(dt, '%Y-%m-%d') for dt in opp_sp.keys() if
-                    datetime.strptime(dt, '%Y-%m-%d') <= date).strftime('%Y-%m-%d')
-                osp = opp_sp[best_match]
-                # Who has the 2.5 point home field advantage?
-                loc = self.schedule[team]['schedule'][k]['home-away']
-                # Calculate the win probability and record it
-                win_probabilities.append(Utils.calculate_win_prob_from_spplus(cur, osp, loc))
+            win_probabilities = strength.win_probabilities(team, reference)
             for j in range(0, cols - 1):
                 if i == 0:
                     if j == cols - 2:
@@ -174,21 +216,22 @@ class Cluster:
                                        text=j + 1)
 
                 if j < len(win_probabilities):
-                    r, g, b = Utils.gradient_color(0, 1, win_probabilities[j], scale=scale)
+                    # the box's fill, and whether its text should be white or black
+                    fill, text_color = ColorScale.of(scale).color(win_probabilities[j])
 
                     # Draw the color-coded box
                     graph.add_rect(margin + hstep * (1 + j), margin + vstep * (2 + i), hstep, vstep, color='none',
-                                   fill=(r, g, b))
-                    # Add the opponent logo
+                                   fill=fill)
+                    # Add the opponent logo, if there is one
                     opponent = self.schedule[team]['schedule'][j]['opponent']
-                    graph.add_image(margin + hstep * (2 + j) - (hstep + logowidth * 0.8) / 2,
-                                    vstep * (2 + i) + margin + (vstep - logoheight * 0.8) / 2,
-                                    logowidth * 0.8,
-                                    logoheight * 0.8,
-                                    self.schedule[opponent]['logoURI'])
-
-                    # Should the text be white or black?
-                    text_color = Utils.get_text_contrast_color(r, g, b)
+                    try:
+                        graph.add_image(margin + hstep * (2 + j) - (hstep + logowidth * 0.8) / 2,
+                                        vstep * (2 + i) + margin + (vstep - logoheight * 0.8) / 2,
+                                        logowidth * 0.8,
+                                        logoheight * 0.8,
+                                        self.schedule[opponent]['logoURI'])
+                    except KeyError:
+                        pass
 
                     # Write the probability in the box
                     graph.add_text(margin + hstep * (1 + j) + 3,
@@ -208,14 +251,11 @@ class Cluster:
                     # Calculate the win expectation
                     xw = sum(x * record[i][1][x] for x in range(len(record[i][1])))
 
-                    r, g, b = Utils.gradient_color(lower, upper, xw, scale=scale)
+                    fill, text_color = ColorScale.of(scale).color(xw, lower, upper)
 
                     # Draw the color-coded box
                     graph.add_rect(margin + hstep * (1 + j), margin + vstep * (2 + i), hstep, vstep, color='none',
-                                   fill=(r, g, b))
-
-                    # Should the text be white or black?
-                    text_color = Utils.get_text_contrast_color(r, g, b)
+                                   fill=fill)
 
                     graph.add_text(margin + hstep * (1.5 + j),
                                    margin + vstep * (2.5 + i),
@@ -263,17 +303,19 @@ class Cluster:
             # get the records for the final week for each team
             record = self.get_record_array(week, order)
 
-        if not os.path.exists(".\svg output\{} ~ {}".format(method, scale)):
-            os.makedirs(".\svg output\{} ~ {}".format(method, scale))
-        path = os.path.join(".\svg output\{} ~ {}".format(method, scale),
-                            '{} ~ {} ~ {} using {}.svg'.format(file, method, scale, order))
+        # scale may be a list of color scales; each gets its own file, all drawn from the one layout
+        paths = {}
+        for x in ([scale] if isinstance(scale, str) else scale):
+            os.makedirs(".\svg output\{} ~ {}".format(method, x), exist_ok=True)
+            paths[x] = os.path.join(".\svg output\{} ~ {}".format(method, x),
+                                    '{} ~ {} ~ {} using {}.svg'.format(file, method, x, order))
 
         if not old:
             rows, cols = len(record) + 2, max([len(x[1]) for x in record]) + 1
         else:
             rows, cols = len(record) + 2, max([len(x[1]) for x in record]) + 2
 
-        graph = Graph(path=path, width=hstep * cols + 2 * margin, height=vstep * rows + 2 * margin)
+        graph = TableLayout(width=hstep * cols + 2 * margin, height=vstep * rows + 2 * margin)
 
         # Add the horizontal header label; it is at the very top of the svg and covers all but the first column, with centered text
         graph.add_text(margin + hstep * (cols + 1) / 2, margin + vstep * 0.5 - 4, size=13, alignment='middle',
@@ -294,14 +336,32 @@ class Cluster:
         # Add column labels for the Team Name
         graph.add_text(margin + hstep * 0.5, margin + vstep * 1.5, alignment='middle', size=13, text='Team')
 
-        # This set of loops fills in the body of the table
+        # Add the column labels
+        for j in range(0, cols - 1):
+            if j == cols - 2:
+                if old:
+                    graph.add_texts(margin + hstep * (1.5 + j), [margin + vstep * 1.5 - 10, margin + vstep * 1.5,
+                                                                 margin + vstep * 1.5 + 10],
+                                    ['Expected', 'Wins', '(Change)'], size=10, alignment='middle')
+            elif j <= len(record[0][1]):
+                if j != 1:
+                    txt = 'Wins'
+                else:
+                    txt = 'Win'
+                graph.add_texts(margin + hstep * (1.5 + j), [margin + vstep * 1.5 - 7, margin + vstep * 1.5 + 7],
+                                [j, txt], size=13, alignment='middle')
+
+        # This loop fills in the body of the table, a row of cells at a time
         for i in range(0, rows - 2):
-            # Add the team logo
-            graph.add_image(margin + (hstep - logowidth) / 2,
-                            vstep * (2 + i) + margin + (vstep - logoheight) / 2,
-                            logowidth,
-                            logoheight,
-                            record[i][0].logo_URI)
+            # Add the team logo, if there is one
+            try:
+                graph.add_image(margin + (hstep - logowidth) / 2,
+                                vstep * (2 + i) + margin + (vstep - logoheight) / 2,
+                                logowidth,
+                                logoheight,
+                                record[i][0].logo_URI)
+            except KeyError:
+                pass
 
             # Add the rank in the upper left of the logo box
             graph.add_text(2.5 * margin, vstep * (2 + i) + 2.5 * margin, alignment='middle', size=8, text=i + 1)
@@ -312,91 +372,34 @@ class Cluster:
             else:
                 upper, lower = max(record[i][1]), min(record[i][1])
 
-            for j in range(0, cols - 1):
-                if i == 0:
-                    if j == cols - 2:
-                        if old:
-                            # Add the column label
-                            graph.add_text(margin + hstep * (1.5 + j),
-                                           margin + vstep * 1.5 - 10,
-                                           size=10,
-                                           alignment='middle',
-                                           text='Expected')
-                            graph.add_text(margin + hstep * (1.5 + j),
-                                           margin + vstep * 1.5,
-                                           size=10,
-                                           alignment='middle',
-                                           text='Wins')
-                            graph.add_text(margin + hstep * (1.5 + j),
-                                           margin + vstep * 1.5 + 10,
-                                           alignment='middle',
-                                           size=10,
-                                           text='(Change)')
-                    elif j <= len(record[i][1]):
-                        if j != 1:
-                            txt = 'Wins'
-                        else:
-                            txt = 'Win'
-                        # Add the column label
-                        graph.add_text(margin + hstep * (1.5 + j),
-                                       margin + vstep * 1.5 - 7,
-                                       size=13,
-                                       alignment='middle',
-                                       text=j)
-                        graph.add_text(margin + hstep * (1.5 + j),
-                                       margin + vstep * 1.5 + 7,
-                                       size=13,
-                                       alignment='middle',
-                                       text=txt)
-
-                if j < len(record[i][1]):
-                    if absolute:
-                        r, g, b = Utils.gradient_color(0, 1, record[i][1][j], scale=scale,
-                                                       primaryColor=record[i][0].primary_color,
-                                                       secondaryColor=record[i][0].secondary_color)
-                    else:
-                        r, g, b = Utils.gradient_color(lower, upper, record[i][1][j], scale=scale,
-                                                       primaryColor=record[i][0].primary_color,
-                                                       secondaryColor=record[i][0].secondary_color)
-
-                    # Draw the color-coded box
-                    graph.add_rect(margin + hstep * (1 + j), margin + vstep * (2 + i), hstep, vstep,
-                                   color='none', fill=(r, g, b))
-
-                    # Should the text be white or black?
-                    text_color = Utils.get_text_contrast_color(r, g, b)
-
-                    # Write the probability in the box
-                    graph.add_text(margin + hstep * (1.5 + j),
-                                   margin + vstep * (2.5 + i) - 2,
-                                   alignment='middle',
-                                   color=tuple(text_color),
-                                   text=str(round(100 * record[i][1][j], 1)) + '%')
-
-                    # Add the cumulative probability text
-                    graph.add_text(0.8 * margin + hstep * (2 + j),
-                                   vstep * (3 + i),
-                                   alignment='middle', anchor='end', size=8,
-                                   color=tuple(text_color),
-                                   text=str(round(abs(100 * (1 - sum(record[i][1][x] for x in range(0, j)))), 1)) + '%')
-
-                    if old:
-                        diff = round(100 * (record[i][1][j] - record[i][2][j]), 1)
-                        if diff > 0:
-                            txt = '(+{})%'.format(diff)
-                        elif diff < 0:
-                            txt = '(' + str(diff) + '%)'
-                        else:
-                            txt = '(+' + str(diff) + '%)'
-
-                        # Write the probability change in the box
-                        graph.add_text(margin + hstep * (1.5 + j),
-                                       margin + vstep * (2.5 + i) + 8,
-                                       size=10, alignment='middle',
-                                       color=tuple(text_color),
-                                       text=txt)
-
-                elif j == cols - 2 and old:
+            probabilities = record[i][1]
+            columns = np.arange(len(probabilities))
+            # the fill of each box, and whether its text should be white or black, in whichever color scale
+            fills, text_colors = graph.scaled(probabilities, lower, upper, record[i][0].primary_color,
+                                              record[i][0].secondary_color)
+
+            # Draw the color-coded boxes
+            graph.add_rects(margin + hstep * (1 + columns), margin + vstep * (2 + i), hstep, vstep, color='none',
+                            fill=fills)
+
+            # Write the probabilities in the boxes
+            graph.add_texts(margin + hstep * (1.5 + columns), margin + vstep * (2.5 + i) - 2,
+                            [str(round(100 * p, 1)) + '%' for p in probabilities], alignment='middle',
+                            color=text_colors)
+
+            # Add the cumulative probability text
+            graph.add_texts(0.8 * margin + hstep * (2 + columns), vstep * (3 + i),
+                            Utils.cumulative_percentages(probabilities), alignment='middle', anchor='end', size=8,
+                            color=text_colors)
+
+            if old:
+                # Write the probability changes in the boxes
+                graph.add_texts(margin + hstep * (1.5 + columns), margin + vstep * (2.5 + i) + 8,
+                                Utils.percentage_changes(probabilities, record[i][2]), size=10, alignment='middle',
+                                color=text_colors)
+
+            for j in range(len(probabilities), cols - 1):
+                if j == cols - 2 and old:
                     # Calculate the win expectation
                     old_xw = sum(x * record[i][2][x] for x in range(len(record[i][2])))
                     new_xw = sum(x * record[i][1][x] for x in range(len(record[i][1])))
@@ -432,66 +435,52 @@ class Cluster:
                     graph.add_rect(margin + hstep * (1 + j), margin + vstep * (2 + i), hstep, vstep,
                                    color='none', fill=(150, 150, 150))
 
-        # This set of loops draws the grid over the table.
-        for i in range(2, rows):
-            for j in range(1, cols):
-                # add the vertical lines between the columns
-                graph.add_line(x1=margin + hstep * j, y1=margin + vstep, x2=margin + hstep * j,
-                               y2=margin + vstep * rows)
-
-            # add the horizontal lines between the rows
-            graph.add_line(x1=margin, y1=margin + vstep * i, x2=margin + hstep * cols,
-                           y2=margin + vstep * i)
+        # Draw the grid over the table: the vertical lines between the columns, then the horizontal lines between
+        # the rows
+        graph.add_lines(margin + hstep * np.arange(1, cols), margin + vstep, margin + hstep * np.arange(1, cols),
+                        margin + vstep * rows)
+        graph.add_lines(margin, margin + vstep * np.arange(2, rows), margin + hstep * cols,
+                        margin + vstep * np.arange(2, rows))
 
-            # Draw the outline box for the table
-            graph.add_rect(margin, margin + vstep, hstep * cols, vstep * (rows - 1), color=(0, 0, 0), fill='none',
-                           stroke_width=2)
+        # Draw the outline box for the table
+        graph.add_rect(margin, margin + vstep, hstep * cols, vstep * (rows - 1), color=(0, 0, 0), fill='none',
+                       stroke_width=2)
 
-            # Draw the outline box for the win total sub-table
-            graph.add_rect(margin + hstep, margin + vstep, hstep * (cols - 1), vstep * (rows - 1), color=(0, 0, 0),
-                           fill='none', stroke_width=2)
+        # Draw the outline box for the win total sub-table
+        graph.add_rect(margin + hstep, margin + vstep, hstep * (cols - 1), vstep * (rows - 1), color=(0, 0, 0),
+                       fill='none', stroke_width=2)
 
-            # Draw the outline box for the column headers
-            graph.add_rect(margin, margin + vstep, hstep * cols, vstep, color=(0, 0, 0), fill='none', stroke_width=2)
+        # Draw the outline box for the column headers
+        graph.add_rect(margin, margin + vstep, hstep * cols, vstep, color=(0, 0, 0), fill='none', stroke_width=2)
 
-            # Draw the outline box for the win total header label
-            graph.add_rect(margin + hstep, margin, hstep * (cols - 2), vstep, color=(0, 0, 0), fill='none',
-                           stroke_width=2)
-            graph.write_file()
+        # Draw the outline box for the win total header label
+        graph.add_rect(margin + hstep, margin, hstep * (cols - 2), vstep, color=(0, 0, 0), fill='none',
+                       stroke_width=2)
+        # the FBS wide tables run to thousands of cells, so they go straight to the files
+        graph.render(paths, stream=True)
 
     def rank_schedules(self, file='out', week=None, hstep=40, vstep=40, margin=5, logowidth=30,
-                       method='sp+', logoheight=30, absolute=False, scale='red-green', spplus=0.0, txtoutput=False):
-        record = []
+                       method='sp+', logoheight=30, absolute=False, scale='red-green', spplus=0.0, txtoutput=False,
+                       strength=None, reference=0):
+        # strength: a StrengthOfScheduleEngine already holding the rating to rank by, as its reference'th reference
+        dates = {x.name: x.get_best_sp_match(-1) for x in self.teams}
+        if strength is None:
+            strength = StrengthOfScheduleEngine(self.engine, [spplus], dates=dates)
 
         # make sure the week is valid
-        if (not week) or (week < 1) or (week > max([len(x.win_probabilities[week]) for x in self.teams])):
+        if (not week) or (week < 1) or (week >= min([len(x.win_probabilities[dates[x.name]]) for x in self.teams])):
             week = -1
 
-        # recalculate the win probabilities as though the team were average (S&P+ = 0.0)
-        modified_teams = self.teams
-        for team in modified_teams:
-            for x in team.spplus:
-                cur = spplus
-                team.win_probabilities[x] = []
-                date = datetime.strptime(x, "%Y-%m-%d")
-                for i in range(len(team.schedule[team.name]['schedule'])):
-                    # Get the opponent S&P+ value
-                    opp_sp = team.schedule[team.schedule[team.name]['schedule'][i]['opponent']]['sp+']
-                    # Use the most recent S&P+ values prior to the specified date
-                    # Note there might be a misalignment between the S&P+ value dates for different teams, especially FCS teams
-                    best_match = max(
-                        datetime.strptime(dt, '%Y-%m-%d') for dt in opp_sp.keys() if
-                        datetime.strptime(dt, '%Y-%m-%d') <= date).strftime('%Y-%m-%d')
-                    osp = opp_sp[best_match]
-                    # Who has the 2.5 point home field advantage?
-                    loc = team.schedule[team.name]['schedule'][i]['home-away']
-                    # Calculate the win probability and record it
-                    team.win_probabilities[x].append(Utils.calculate_win_prob_from_spplus(cur, osp, loc))
+        # the win totals as though each team were rated spplus (S&P+ = 0.0 is an average team); the Teams are untouched
+        if week == -1:
+            totals = [strength.distribution(x.name, reference) for x in self.teams]
+        else:
+            totals = [WinTotalEngine(strength.win_probabilities(x.name, reference)).record()[week] for x in self.teams]
 
         # sort teams by their weighted average number of wins and division
-        ordered_teams = sorted([[x, x.project_win_totals()[week]] for x in modified_teams],
+        ordered_teams = sorted([[x, y] for x, y in zip(self.teams, totals)],
                                key=lambda y: 12 * sum([y[1][z] * z for z in range(len(y[1]))]) / len(y[1]))
-        record.extend(ordered_teams)
+        record = list(ordered_teams)
 
         if txtoutput:
             with open(file + '.csv', 'w+', newline='') as outfile:
@@ -531,11 +520,39 @@ class Cluster:
 
         return record
 
+    def get_reference_ratings(self, grid=range(-20, 31), top=(5, 10, 25)):
+        """Return (dict) of label -> S&P+ rating used to measure schedules: a grid of ratings plus FBS averages."""
+        references = {'sp+ {}'.format(x): float(x) for x in grid}
+        for n in top:
+            references['average SP+ of top {}'.format(n)] = self.get_avg_spplus(0, n)
+        references['average SP+ of all FBS'] = self.get_avg_spplus(1, -1)
+        return references
+
+    def get_schedule_strength_curves(self, references=None):
+        """
+        Return (labels, dict of team name -> expected wins for each label) for a team of each reference rating
+        playing every schedule in the cluster. All of the references are computed together.
+        """
+        if references is None:
+            references = self.get_reference_ratings()
+        labels = list(references)
+        dates = {x.name: x.get_best_sp_match(-1) for x in self.teams}
+        strength = StrengthOfScheduleEngine(self.engine, [references[x] for x in labels], dates=dates)
+        return labels, strength.curves()
+
+    def write_schedule_strength_csv(self, file='schedule strength', references=None):
+        labels, curves = self.get_schedule_strength_curves(references)
+        with open('{}.csv'.format(file), 'w', newline='') as outfile:
+            writer = csv.writer(outfile)
+            writer.writerow(['Team', *labels])
+            for team in sorted(curves):
+                writer.writerow([team.title(), *curves[team].tolist()])
+
     def write_expected_win_csv(self, file='out'):
         result = [['Team', 'Week', 'Expected Wins']]
         for team in self.teams:
             for w in range(0, 13):
-                rec = team.project_win_totals(w)[-1]
+                rec = team.project_win_distribution(w)
                 row = [team.name.title(), w, Team.expected_wins(rec)]
                 result.append(row)
         with open("{}.csv".format(file), 'w', newline='') as outfile:
@@ -543,26 +560,11 @@ class Cluster:
             for r in result:
                 writer.writerow(r)
 
-    def write_schedule_swap_matrix(self, file='swapped schedules.csv'):
-        data = {x.name: {x.name: 1} for x in self.teams}
-        for tA, tB in itertools.combinations(self.teams, 2):
-            A, B = tA.name, tB.name
-            # swap the values
-            self.schedule[A]['schedule'], self.schedule[B]['schedule'] = self.schedule[B]['schedule'], self.schedule[A][
-                'schedule']
-
-            wA, wB = tA.expected_wins(tA.project_win_totals()[-1]), tB.expected_wins(tB.project_win_totals()[-1])
-            teamA = Team(name=A, schedule=self.schedule)
-
-            data[A][B] = teamA.expected_wins(teamA.project_win_totals()[-1]) / wA
-
-            teamB = Team(name=B, schedule=self.schedule)
-
-            data[B][A] = teamB.expected_wins(teamB.project_win_totals()[-1]) / wB
-
-            # unswap the values
-            self.schedule[A]['schedule'], self.schedule[B]['schedule'] = self.schedule[B]['schedule'], self.schedule[A][
-                'schedule']
+    def write_schedule_swap_matrix(self, file='swapped schedules.csv', workers=None):
+        # How many wins would each team expect with every other team's schedule, relative to its own?
+        # With workers > 1 the rows of the matrix are split across a process pool; the output is the same.
+        dates = {x.name: x.get_best_sp_match(-1) for x in self.teams}
+        data = ScheduleSwapEngine(self.engine, dates=dates).matrix(workers=workers)
 
         with open(file, 'w+', newline='') as outfile:
             cw = csv.writer(outfile)
@@ -0,0 +1,75 @@
+import numpy as np
+
+from utils import Utils
+
+
+class ColorScale:
+    # A color scale precomputed into a lookup table: SIZE fill colors evenly spaced along the scale, each with the
+    # text color (black or white) that reads on it. A table cell's color is then an index into the table rather than
+    # an interpolation, a trip through colorsys and a brightness sort, and a whole row or table maps in one call.
+    # Scales are built once per run; a team's two color scale once per pair of team colors.
+    SIZE = 1024
+
+    _built = {}
+
+    def __init__(self, scale='red-green', primary=None, secondary=None, size=SIZE):
+        """
+        :param scale: 'red-green', 'red-blue', 'black-red' or 'team'
+        :param primary: the team's primary (red, green, blue), for the team scale
+        :param secondary: the team's secondary (red, green, blue), for the team scale
+        :param size: the number of entries in the table
+        """
+        self.scale = scale
+        self.size = size
+        steps = np.linspace(0, 1, size)
+        if scale == 'team':
+            if not (primary and secondary):
+                raise ValueError('the team color scale needs both team colors')
+            # brighter colors should mean higher probabilities, as a general rule
+            low, high = (np.array(x, dtype=float) for x in
+                         sorted([primary, secondary], key=lambda y: Utils.get_color_brightness(*y)))
+            self.fills = low + steps[:, None] * (high - low)
+        elif scale in ('red-green', 'red-blue', 'black-red'):
+            self.fills = np.array([Utils.gradient_color(0, 1, x, scale=scale) for x in steps.tolist()], dtype=np.int64)
+        else:
+            raise ValueError('unknown color scale {}'.format(scale))
+
+        brightness = (self.fills[:, 0] * 299 + self.fills[:, 1] * 587 + self.fills[:, 2] * 114) / 1000
+        self.text = np.where((brightness > 123)[:, None], 0, 255).repeat(3, axis=1)
+
+    @staticmethod
+    def of(scale='red-green', primary=None, secondary=None):
+        """Return (ColorScale) the scale, built on first use. Team colors only matter to the team scale."""
+        if scale == 'team':
+            key = (scale, tuple(primary or ()), tuple(secondary or ()))
+        else:
+            key = (scale,)
+        try:
+            return ColorScale._built[key]
+        except KeyError:
+            built = ColorScale._built[key] = ColorScale(scale, primary, secondary)
+            return built
+
+    def index(self, values, lower=0, upper=1, method='linear'):
+        """Return (numpy array) the table entries for the values, placed between lower and upper."""
+        values = np.asarray(values, dtype=float)
+        if upper == lower:
+            inter = np.ones_like(values)
+        else:
+            inter = (values - lower) / (upper - lower)
+            if method.lower() == 'cubic':
+                inter = inter ** 3 * (10 + inter * (-15 + 6 * inter))
+        return np.rint(np.clip(inter, 0, 1) * (self.size - 1)).astype(np.intp)
+
+    def colors(self, values, lower=0, upper=1, method='linear'):
+        """
+        Return (fills, text colors) for a row or table of values, each a numpy array of (red, green, blue) with one
+        more axis than the values. Graph's batch methods take them as they are.
+        """
+        i = self.index(values, lower, upper, method)
+        return self.fills[i], self.text[i]
+
+    def color(self, value, lower=0, upper=1, method='linear'):
+        """Return ((red, green, blue), (red, green, blue)) the fill and text colors of a single value."""
+        i = int(self.index(value, lower, upper, method))
+        return tuple(self.fills[i].tolist()), tuple(self.text[i].tolist())
@@ -1,14 +1,29 @@
 import os
 
-from graph import Graph
+import numpy as np
+
+from layout import TableLayout
+from probability import WinProbabilityEngine
+from simulation import RankCounts, SeasonSimulator
 from team import Team
+from tiebreak import TitleCounts
 from utils import Utils
 
 
 class Conference:
-    def __init__(self, name, schedule):
+    def __init__(self, name, schedule, history=None, registry=None, lazy=False):
+        # lazy: only evaluate the S&P+ dates that are actually used, e.g. for a single week's graph
         self.name = name
-        self.teams = {Team(name=x, schedule=schedule) for x in schedule if schedule[x]['conference'] == name}
+        self.registry = registry
+        if registry is not None:
+            # the teams are shared with everything else built from the registry
+            self.members = registry.conferences.get(name, [])
+            self.teams = set(registry.teams(self.members))
+            self._engine = None
+        else:
+            self.members = [x for x in schedule if schedule[x]['conference'] == name]
+            self._engine = WinProbabilityEngine(schedule=schedule, teams=self.members, history=history, lazy=lazy)
+            self.teams = {Team(name=x, schedule=schedule, engine=self._engine) for x in self.members}
         self.divisions = {}
         for team in self.teams:
             if team.division not in self.divisions:
@@ -18,24 +33,43 @@ class Conference:
         if len(self.divisions) == 0:
             self.divisions['all'] = self.teams
 
+    @property
+    def engine(self):
+        # An engine over just the members, for the simulations; with a registry it is only built if one is run
+        if self._engine is None:
+            self._engine = self.registry.engine(self.members)
+        return self._engine
+
+    @staticmethod
+    def expected_conference_wins(team, week=-1):
+        table = team.project_conference_record(week=week)
+        return sum(i * sum(row) for i, row in enumerate(table))
+
     def get_record_array(self, week=-1, order='winexp'):
         # get the records for the final week for each team
         record = []
 
         for t in self.teams:
-            record.append([t, t.project_win_totals(week=week)[-1], t.project_win_totals(week=week - 1)[-1]])
+            record.append([t, t.project_win_distribution(week=week), t.project_win_distribution(week=week - 1)])
 
         # sort teams by their weighted average number of wins and division
         if order == 'winexp':
             record.sort(key=lambda x: (x[0].division, sum([x[1][z] * z for z in range(len(x[1]))])), reverse=True)
         elif order == 'sp+':
             record.sort(key=lambda x: (x[0].division, x[0].latest_spplus), reverse=True)
+        elif order == 'confwins':
+            # by expected conference wins, the way the standings are really decided
+            record.sort(key=lambda x: (x[0].division, Conference.expected_conference_wins(x[0], week),
+                                       sum([x[1][z] * z for z in range(len(x[1]))])), reverse=True)
         new = [x[0].name for x in record]
         if order == 'winexp':
             last = sorted(record, key=lambda x: (x[0].division, sum([x[2][z] * z for z in range(len(x[2]))])), reverse=True)
         elif order == 'sp+':
             last = sorted(record, key=lambda x: (x[0].division, sum([x[2][z] * z for z in range(len(x[2]))])),
                           reverse=True)
+        elif order == 'confwins':
+            last = sorted(record, key=lambda x: (x[0].division, Conference.expected_conference_wins(x[0], week - 1),
+                                                 sum([x[2][z] * z for z in range(len(x[2]))])), reverse=True)
         # find the team's last divisional rank
         last = [x[0].name for x in last]
         div_size = len(list(self.divisions.items())[0][1])
@@ -47,6 +81,31 @@ class Conference:
                     y.append([new_rank, old_rank, old_rank - new_rank])
         return record
 
+    def get_standings_distribution(self, week=-1, simulations=100000, seed=None):
+        """
+        Simulate the season and return (dict) of division -> {team name -> probability of finishing in each
+        position of the division by total wins}.
+        """
+        dates = {t.name: t.get_best_sp_match(week) for t in self.teams}
+        groups = {d: [t.name for t in members] for d, members in self.divisions.items()}
+        simulator = SeasonSimulator(self.engine, dates, seed=seed)
+        ranks, = simulator.run(simulations, [RankCounts(groups)])
+        return ranks.result(simulator)
+
+    def get_title_odds(self, week=-1, simulations=250000, seed=None):
+        """
+        Simulate the season and return (dict) of team name -> {'positions': division finish probabilities,
+        'division': probability of winning the division, 'title game': probability of playing for the title}.
+        Tiebreakers are applied in each simulated season; 250000 seasons keep the odds stable to about 0.1%.
+        """
+        dates = {t.name: t.get_best_sp_match(week) for t in self.teams}
+        divisions = {d: sorted(t.name for t in members) for d, members in self.divisions.items()}
+        # the coin flips get a stream of their own, independent of the one that decides the games they break ties in
+        games, flips = np.random.SeedSequence(seed).spawn(2)
+        simulator = SeasonSimulator(self.engine, dates, seed=games)
+        titles, = simulator.run(simulations, [TitleCounts(divisions, seed=flips)])
+        return titles.result(simulator)
+
     def make_standings_projection_graph(self, file='out', week=None, hstep=50, vstep=50, margin=5, logowidth=40,
                                         method='sp+', logoheight=40, absolute=False,
                                         scale='red-green', old=None, order='winexp'):
@@ -54,17 +113,19 @@ class Conference:
         # get the records for the final week for each team
         record = self.get_record_array(week=week, order=order)
 
-        if not os.path.exists(".\svg output\{} ~ {}".format(method, scale)):
-            os.makedirs(".\svg output\{} ~ {}".format(method, scale))
-        path = os.path.join(".\svg output\{} ~ {}".format(method, scale),
-                            '{} ~ {} ~ {} using {}.svg'.format(file, method, scale, order))
+        # scale may be a list of color scales; each gets its own file, all drawn from the one layout
+        paths = {}
+        for x in ([scale] if isinstance(scale, str) else scale):
+            os.makedirs(".\svg output\{} ~ {}".format(method, x), exist_ok=True)
+            paths[x] = os.path.join(".\svg output\{} ~ {}".format(method, x),
+                                    '{} ~ {} ~ {} using {}.svg'.format(file, method, x, order))
 
         if not old:
             rows, cols = len(record) + 2, max([len(x[1]) for x in record]) + 1
         else:
             rows, cols = len(record) + 2, max([len(x[1]) for x in record]) + 3
 
-        graph = Graph(path=path, width=hstep * cols + 2 * margin, height=vstep * rows + 2 * margin)
+        graph = TableLayout(width=hstep * cols + 2 * margin, height=vstep * rows + 2 * margin)
 
         # Add the horizontal header label; it is at the very top of the svg and covers the win columns, with centered text
         graph.add_text(margin + hstep * (cols / 2), margin + vstep * 0.5 - 4, size=13, alignment='middle',
@@ -84,14 +145,37 @@ class Conference:
         # Add column labels for the Team Name
         graph.add_text(margin + hstep * 0.5, margin + vstep * 1.5, alignment='middle', size=13, text='Team')
 
-        # This set of loops fills in the body of the table
+        # Add the column labels
+        for j in range(0, cols - 1):
+            if j == cols - 3:
+                if old:
+                    graph.add_texts(margin + hstep * (1.5 + j), [margin + vstep * 1.5 - 10, margin + vstep * 1.5,
+                                                                 margin + vstep * 1.5 + 10],
+                                    ['Expected', 'Wins', '(Change)'], size=10, alignment='middle')
+            elif j == cols - 2:
+                if old:
+                    graph.add_texts(margin + hstep * (1.5 + j), [margin + vstep * 1.5 - 10, margin + vstep * 1.5,
+                                                                 margin + vstep * 1.5 + 10],
+                                    ['Divisional', 'Rank', '(Change)'], size=10, alignment='middle')
+            else:
+                if j != 1:
+                    txt = 'Wins'
+                else:
+                    txt = 'Win'
+                graph.add_texts(margin + hstep * (1.5 + j), [margin + vstep * 1.5 - 7, margin + vstep * 1.5 + 7],
+                                [j, txt], size=13, alignment='middle')
+
+        # This loop fills in the body of the table, a row of cells at a time
         for i in range(0, rows - 2):
-            # Add the team logo
-            graph.add_image(margin + (hstep - logowidth) / 2,
-                            vstep * (2 + i) + margin + (vstep - logoheight) / 2,
-                            logowidth,
-                            logoheight,
-                            record[i][0].logo_URI)
+            # Add the team logo, if there is one
+            try:
+                graph.add_image(margin + (hstep - logowidth) / 2,
+                                vstep * (2 + i) + margin + (vstep - logoheight) / 2,
+                                logowidth,
+                                logoheight,
+                                record[i][0].logo_URI)
+            except KeyError:
+                pass
 
             # find the max and min in this week to determine color of cell
             if absolute:
@@ -99,110 +183,34 @@ class Conference:
             else:
                 upper, lower = max(record[i][1]), min(record[i][1])
 
-            for j in range(0, cols - 1):
-                if i == 0:
-                    if j == cols - 3:
-                        if old:
-                            # Add the column label
-                            graph.add_text(margin + hstep * (1.5 + j),
-                                           margin + vstep * 1.5 - 10,
-                                           size=10,
-                                           alignment='middle',
-                                           text='Expected')
-                            graph.add_text(margin + hstep * (1.5 + j),
-                                           margin + vstep * 1.5,
-                                           size=10,
-                                           alignment='middle',
-                                           text='Wins')
-                            graph.add_text(margin + hstep * (1.5 + j),
-                                           margin + vstep * 1.5 + 10,
-                                           alignment='middle',
-                                           size=10,
-                                           text='(Change)')
-                    elif j == cols - 2:
-                        if old:
-                            # Add the column label
-                            graph.add_text(margin + hstep * (1.5 + j),
-                                           margin + vstep * 1.5 - 10,
-                                           size=10,
-                                           alignment='middle',
-                                           text='Divisional')
-                            graph.add_text(margin + hstep * (1.5 + j),
-                                           margin + vstep * 1.5,
-                                           size=10,
-                                           alignment='middle',
-                                           text='Rank')
-                            graph.add_text(margin + hstep * (1.5 + j),
-                                           margin + vstep * 1.5 + 10,
-                                           alignment='middle',
-                                           size=10,
-                                           text='(Change)')
-                    else:
-                        if j != 1:
-                            txt = 'Wins'
-                        else:
-                            txt = 'Win'
-
-                        # Add the column label
-                        graph.add_text(margin + hstep * (1.5 + j),
-                                       margin + vstep * 1.5 - 7,
-                                       size=13,
-                                       alignment='middle',
-                                       text=j)
-                        graph.add_text(margin + hstep * (1.5 + j),
-                                       margin + vstep * 1.5 + 7,
-                                       size=13,
-                                       alignment='middle',
-                                       text=txt)
-
-                if j < len(record[i][1]):
-                    if absolute:
-                        r, g, b = Utils.gradient_color(0, 1, record[i][1][j], scale=scale,
-                                                       primaryColor=record[i][0].primary_color,
-                                                       secondaryColor=record[i][0].secondary_color)
-                    else:
-                        r, g, b = Utils.gradient_color(lower, upper, record[i][1][j], scale=scale,
-                                                       primaryColor=record[i][0].primary_color,
-                                                       secondaryColor=record[i][0].secondary_color)
-
-                    # Draw the color-coded box
-                    graph.add_rect(margin + hstep * (1 + j), margin + vstep * (2 + i), hstep, vstep,
-                                   color='none', fill=(r, g, b))
-
-                    # Should the text be white or black?
-                    text_color = Utils.get_text_contrast_color(r, g, b)
-
-                    # Write the probability in the box
-                    graph.add_text(margin + hstep * (1.5 + j),
-                                   margin + vstep * (2.5 + i) - 2,
-                                   alignment='middle',
-                                   color=tuple(text_color),
-                                   text=str(round(100 * record[i][1][j], 1)) + '%')
-
-                    # Add the cumulative probability text
-                    graph.add_text(0.8 * margin + hstep * (2 + j),
-                                   vstep * (3 + i),
-                                   alignment='middle', anchor='end', size=8,
-                                   color=tuple(text_color),
-                                   text=str(round(abs(100 * (1 - sum(record[i][1][x] for x in range(0, j)))), 1)) + '%')
-
-                    if old:
-                        diff = round(100 * (record[i][1][j] - record[i][2][j]), 1)
-                        if diff > 0:
-                            txt = '(+{})%'.format(diff)
-                        elif diff < 0:
-                            txt = '(' + str(diff) + '%)'
-                        else:
-                            txt = '(+' + str(diff) + '%)'
-
-                        # Write the probability change in the box
-                        graph.add_text(margin + hstep * (1.5 + j),
-                                       margin + vstep * (2.5 + i) + 8,
-                                       size=10, alignment='middle',
-                                       color=tuple(text_color),
-                                       text=txt)
-
-                elif j == cols - 3 and old:
+            probabilities = record[i][1]
+            columns = np.arange(len(probabilities))
+            # the fill of each box, and whether its text should be white or black, in whichever color scale
+            fills, text_colors = graph.scaled(probabilities, lower, upper, record[i][0].primary_color,
+                                              record[i][0].secondary_color)
+
+            # Draw the color-coded boxes
+            graph.add_rects(margin + hstep * (1 + columns), margin + vstep * (2 + i), hstep, vstep, color='none',
+                            fill=fills)
+
+            # Write the probabilities in the boxes
+            graph.add_texts(margin + hstep * (1.5 + columns), margin + vstep * (2.5 + i) - 2,
+                            [str(round(100 * p, 1)) + '%' for p in probabilities], alignment='middle',
+                            color=text_colors)
+
+            # Add the cumulative probability text
+            graph.add_texts(0.8 * margin + hstep * (2 + columns), vstep * (3 + i),
+                            Utils.cumulative_percentages(probabilities), alignment='middle', anchor='end', size=8,
+                            color=text_colors)
+
+            if old:
+                # Write the probability changes in the boxes
+                graph.add_texts(margin + hstep * (1.5 + columns), margin + vstep * (2.5 + i) + 8,
+                                Utils.percentage_changes(probabilities, record[i][2]), size=10, alignment='middle',
+                                color=text_colors)
+
+            for j in range(len(probabilities), cols - 1):
+                if j == cols - 3 and old:
                     # Calculate the win expectation
                     old_xw = sum(x * record[i][2][x] for x in range(len(record[i][2])))
                     new_xw = sum(x * record[i][1][x] for x in range(len(record[i][1])))
@@ -267,16 +275,12 @@ class Conference:
                     graph.add_rect(margin + hstep * (1 + j), margin + vstep * (2 + i), hstep, vstep,
                                    color='none', fill=(150, 150, 150))
 
-        # This set of loops draws the grid over the table.
-        for i in range(2, rows):
-            for j in range(1, cols):
-                # add the vertical lines between the columns
-                graph.add_line(x1=margin + hstep * j, y1=margin + vstep, x2=margin + hstep * j,
-                               y2=margin + vstep * rows)
-
-                # add the horizontal lines between the rows
-                graph.add_line(x1=margin, y1=margin + vstep * i, x2=margin + hstep * cols,
-                               y2=margin + vstep * i)
+        # Draw the grid over the table: the vertical lines between the columns, then the horizontal lines between
+        # the rows
+        graph.add_lines(margin + hstep * np.arange(1, cols), margin + vstep, margin + hstep * np.arange(1, cols),
+                        margin + vstep * rows)
+        graph.add_lines(margin, margin + vstep * np.arange(2, rows), margin + hstep * cols,
+                        margin + vstep * np.arange(2, rows))
 
         # add the horizontal line between the divisions
         graph.add_line(x1=margin, y1=margin + vstep * (2 + len(self.teams) / len(self.divisions)),
@@ -296,4 +300,4 @@ class Conference:
 
         # Draw the outline box for the win total header label
         graph.add_rect(margin + hstep, margin, hstep * (cols - 3), vstep, color=(0, 0, 0), fill='none', stroke_width=2)
-        graph.write_file()
+        graph.render(paths, stream=True)
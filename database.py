@@ -0,0 +1,256 @@
+import contextlib
+import json
+import os
+import sqlite3
+
+from stream import ScheduleStream
+
+
+class ScheduleDatabase:
+    # The schedule kept in an sqlite database instead of one json file.
+    # Teams, games, S&P+ ratings and poll rankings are rows of their own, indexed the way Team, Cluster and Schedule
+    # look them up (a team's games in order, a conference's teams, a game by id or date, a team's ratings), so an
+    # update is a row level transaction rather than a rewrite of the whole file. load() rebuilds exactly the dict the
+    # json layout holds, for the projections and graphs, and import_json/export_json convert to and from that layout.
+    # The database runs in WAL mode: any number of worker processes can read while one writes, each through its own
+    # connection.
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS teams (
+            name TEXT PRIMARY KEY, position INTEGER NOT NULL, conference TEXT, division TEXT,
+            fields TEXT NOT NULL, keys TEXT NOT NULL);
+        CREATE INDEX IF NOT EXISTS teams_conference ON teams (conference, position);
+        CREATE INDEX IF NOT EXISTS teams_position ON teams (position);
+
+        CREATE TABLE IF NOT EXISTS games (
+            team TEXT NOT NULL, slot INTEGER NOT NULL, game_id TEXT, opponent TEXT, start_date TEXT,
+            game TEXT NOT NULL, PRIMARY KEY (team, slot)) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS games_id ON games (game_id);
+        CREATE INDEX IF NOT EXISTS games_date ON games (start_date);
+        CREATE INDEX IF NOT EXISTS games_opponent ON games (opponent);
+
+        CREATE TABLE IF NOT EXISTS ratings (team TEXT NOT NULL, date TEXT NOT NULL, value, UNIQUE (team, date));
+
+        CREATE TABLE IF NOT EXISTS rankings (
+            team TEXT NOT NULL, poll TEXT NOT NULL, date TEXT NOT NULL, entry TEXT NOT NULL,
+            UNIQUE (team, poll, date));
+    '''
+    EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+    def __init__(self, file, timeout=30.0):
+        self.file = file
+        self.timeout = timeout
+        self._connection = None
+        self._pid = None
+        self._depth = 0
+
+    @staticmethod
+    def handles(file):
+        """Return (bool) whether the file name is one of a schedule database."""
+        return os.path.splitext(file)[1].lower() in ScheduleDatabase.EXTENSIONS
+
+    def __getstate__(self):
+        # a connection can't cross a process boundary; each process opens its own
+        state = dict(self.__dict__)
+        state['_connection'] = None
+        state['_pid'] = None
+        state['_depth'] = 0
+        return state
+
+    @property
+    def connection(self):
+        if self._connection is None or self._pid != os.getpid():
+            # autocommit; transactions are begun explicitly in transaction()
+            self._connection = sqlite3.connect(self.file, timeout=self.timeout, isolation_level=None)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.executescript(ScheduleDatabase.SCHEMA)
+            self._pid = os.getpid()
+            self._depth = 0
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+        self._connection = None
+
+    @contextlib.contextmanager
+    def transaction(self, write=True):
+        """Group statements into one transaction; nested uses join the outermost one."""
+        connection = self.connection
+        if self._depth == 0:
+            # a reader doesn't take the write lock, so readers never wait on each other
+            connection.execute('BEGIN IMMEDIATE' if write else 'BEGIN DEFERRED')
+        self._depth += 1
+        try:
+            yield connection
+        except BaseException:
+            self._depth -= 1
+            if self._depth == 0:
+                connection.execute('ROLLBACK')
+            raise
+        self._depth -= 1
+        if self._depth == 0:
+            connection.execute('COMMIT')
+
+    # -- writing ------------------------------------------------------------------------------------------------------
+
+    def import_json(self, file):
+        """Replace the contents of the database with the schedule json file (and its journal), one team at a time."""
+        with self.transaction():
+            self._clear()
+            for position, (name, team) in enumerate(ScheduleStream(file).records()):
+                self._insert_team(name, team, position)
+
+    def write(self, schedule):
+        """Replace the contents of the database with the schedule dict."""
+        with self.transaction():
+            self._clear()
+            for position, name in enumerate(schedule):
+                self._insert_team(name, schedule[name], position)
+
+    def _clear(self):
+        for table in ('teams', 'games', 'ratings', 'rankings'):
+            self.connection.execute('DELETE FROM {}'.format(table))
+
+    def _insert_team(self, name, team, position):
+        self._put_team_row(name, team, position)
+        self.put_games(name, enumerate(team.get('schedule', [])))
+        self.put_ratings(name, team.get('sp+', {}).items())
+        rankings = team.get('rankings')
+        if _poll_layout(rankings):
+            with self.transaction() as connection:
+                connection.executemany('INSERT INTO rankings (team, poll, date, entry) VALUES (?, ?, ?, ?)',
+                                       [(name, poll, date, json.dumps(entry)) for poll in rankings
+                                        for date, entry in rankings[poll].items()])
+
+    def _put_team_row(self, name, team, position):
+        fields = {k: v for k, v in team.items() if k not in ('schedule', 'sp+', 'rankings', 'scores')}
+        if 'rankings' in team:
+            rankings = team['rankings']
+            # well formed polls go to the rankings table and only their names stay here
+            fields['rankings'] = {x: {} for x in rankings} if _poll_layout(rankings) else rankings
+        with self.transaction() as connection:
+            connection.execute('INSERT OR REPLACE INTO teams (name, position, conference, division, fields, keys) '
+                               'VALUES (?, ?, ?, ?, ?, ?)',
+                               (name, position, team.get('conference'), team.get('division'),
+                                json.dumps(fields, ensure_ascii=False), json.dumps(list(team))))
+
+    def put_team(self, name, team):
+        """Write the team's own fields (everything but its games, ratings and rankings)."""
+        with self.transaction() as connection:
+            row = connection.execute('SELECT position FROM teams WHERE name = ?', (name,)).fetchone()
+            if row is None:
+                row = connection.execute('SELECT COALESCE(MAX(position) + 1, 0) FROM teams').fetchone()
+            self._put_team_row(name, team, row[0])
+
+    def put_games(self, team, games):
+        """Write (slot, game dict) pairs of the team's schedule."""
+        rows = [(team, slot, str(game['id']) if 'id' in game else None, game.get('opponent'), game.get('startDate'),
+                 json.dumps(game, ensure_ascii=False)) for slot, game in games]
+        with self.transaction() as connection:
+            connection.executemany('INSERT OR REPLACE INTO games (team, slot, game_id, opponent, start_date, game) '
+                                   'VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def put_ratings(self, team, ratings):
+        """Write (date, S&P+) pairs of the team's ratings."""
+        with self.transaction() as connection:
+            # an upsert keeps the row, and so the rating's place in the team's history
+            connection.executemany('INSERT INTO ratings (team, date, value) VALUES (?, ?, ?) '
+                                   'ON CONFLICT (team, date) DO UPDATE SET value = excluded.value',
+                                   [(team, date, value) for date, value in ratings])
+
+    def put_ranking(self, team, poll, date, entry):
+        """Write one team's entry in one poll."""
+        with self.transaction() as connection:
+            connection.execute('INSERT INTO rankings (team, poll, date, entry) VALUES (?, ?, ?, ?) '
+                               'ON CONFLICT (team, poll, date) DO UPDATE SET entry = excluded.entry',
+                               (team, poll, date, json.dumps(entry)))
+
+    # -- reading ------------------------------------------------------------------------------------------------------
+
+    def names(self, conferences=None):
+        """Return (list) of the teams, in schedule order, optionally only those in the conferences given."""
+        if conferences is None:
+            rows = self.connection.execute('SELECT name FROM teams ORDER BY position')
+        else:
+            conferences = list(conferences)
+            rows = self.connection.execute('SELECT name FROM teams WHERE conference IN ({}) ORDER BY position'.format(
+                ','.join('?' * len(conferences))), conferences)
+        return [x[0] for x in rows]
+
+    def locate(self, game_id):
+        """Return (list) of (team, slot) for every team playing in the game."""
+        return self.connection.execute('SELECT team, slot FROM games WHERE game_id = ?', (str(game_id),)).fetchall()
+
+    def games_on(self, date):
+        """Return (list) of (team, game dict) for every game starting on the date (YYYY-MM-DD)."""
+        return [(x[0], json.loads(x[1])) for x in self.connection.execute(
+            'SELECT team, game FROM games WHERE start_date = ? ORDER BY team, slot', (date,))]
+
+    def load(self, conferences=None, teams=None, opponents=True):
+        """
+        Return (dict) the schedule in the json layout.
+        :param conferences: only the teams in these conferences; with teams, a team in either is loaded
+        :param teams: only these teams
+        :param opponents: with a filter, also load the opponents of those teams, without their games (as
+            ScheduleStream does)
+        """
+        # One read transaction, so a concurrent writer can't be seen half way through
+        with self.transaction(write=False):
+            every = self.names()
+            if conferences is None and teams is None:
+                names = every
+                summaries = []
+            else:
+                wanted = set(self.names(conferences)) if conferences is not None else set()
+                wanted.update(teams or [])
+                names = [x for x in every if x in wanted]
+                summaries = []
+                if opponents:
+                    found = set()
+                    for name in names:
+                        found.update(x[0] for x in self.connection.execute(
+                            'SELECT opponent FROM games WHERE team = ?', (name,)))
+                    summaries = [x for x in every if x in found and x not in wanted]
+            return self._build(names, summaries)
+
+    def _build(self, names, summaries):
+        connection = self.connection
+        teams = {}
+        full = set(names)
+        for name in sorted(names + summaries, key=self._positions().get):
+            fields, keys = connection.execute('SELECT fields, keys FROM teams WHERE name = ?', (name,)).fetchone()
+            fields = json.loads(fields)
+            parts = {'sp+': {date: value for date, value in connection.execute(
+                'SELECT date, value FROM ratings WHERE team = ? ORDER BY rowid', (name,))}}
+            games = [json.loads(x[0]) for x in connection.execute(
+                'SELECT game FROM games WHERE team = ? ORDER BY slot', (name,))]
+            if name in full:
+                parts['schedule'] = games
+            else:
+                # an opponent's summary keeps its scores, as ScheduleStream's do
+                parts['scores'] = {str(g['id']): g['scoreBreakdown'] for g in games
+                                   if 'id' in g and 'scoreBreakdown' in g}
+            if 'rankings' in fields:
+                rankings = fields['rankings']
+                for poll, date, entry in connection.execute(
+                        'SELECT poll, date, entry FROM rankings WHERE team = ? ORDER BY rowid', (name,)):
+                    rankings.setdefault(poll, {})[date] = json.loads(entry)
+            # the json layout's key order
+            teams[name] = {k: parts[k] if k in parts else fields[k] for k in json.loads(keys)
+                           if k in parts or k in fields}
+            if 'scores' in parts:
+                teams[name]['scores'] = parts['scores']
+        return teams
+
+    def _positions(self):
+        return {x: i for x, i in self.connection.execute('SELECT name, position FROM teams')}
+
+    def export_json(self, file):
+        with open(file, 'w+', encoding='utf8') as outfile:
+            json.dump(self.load(), outfile, indent=4, sort_keys=True, ensure_ascii=False)
+
+
+def _poll_layout(rankings):
+    # {poll: {date: entry}}, the layout update_rankings writes
+    return isinstance(rankings, dict) and all(isinstance(x, dict) for x in rankings.values())
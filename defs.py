@@ -1,6 +1,8 @@
 PFIVE = ('ACC', 'Big Ten', 'Big 12', 'Pac-12', 'SEC')
 GFIVE = ('American Athletic', 'Conference USA', 'Mid-American', 'Mountain West', 'Sun Belt')
 FBS = (*PFIVE, *GFIVE, 'FBS Independents')  # don't forget the independents
+HOME_FIELD_ADVANTAGE = 2.5  # points given to the home team
+SPPLUS_STDEV = 17  # stdev of the S&P+ scoring margin, used for win probabilities
 WEEKS = (('2018-02-01', '2019-08-23'),
          ('2019-08-24', '2019-09-02'),
          ('2019-09-03', '2019-09-10'),
@@ -0,0 +1,124 @@
+import numpy as np
+
+
+class WinTotalEngine:
+    # Win total distributions (Poisson binomial) for a whole batch of win probability vectors at once.
+    # The probabilities can have any leading shape, e.g. (team x date x game); the games are convolved in one at a time
+    # across the whole batch, giving (team x date x game + 1) distributions padded with zeros past each team's games.
+    def __init__(self, probabilities, mask=None, keep_steps=True):
+        probabilities = np.asarray(probabilities, dtype=float)
+        if mask is not None:
+            # padded game slots never add a win
+            probabilities = np.where(mask, probabilities, 0.0)
+        self.probabilities = probabilities
+
+        n_games = probabilities.shape[-1]
+        batch = probabilities.shape[:-1]
+
+        # steps[..., g, :] is the distribution after the first g + 1 games; skip it when only the totals are needed
+        self.steps = np.zeros(batch + (n_games, n_games + 1)) if keep_steps else None
+        dist = np.zeros(batch + (n_games + 1,))
+        dist[..., 0] = 1
+        for g in range(n_games):
+            p = probabilities[..., g, None]
+            new = dist * (1 - p)  # newest game was a loss
+            new[..., 1:] += dist[..., :-1] * p  # newest game was a win
+            dist = new
+            if keep_steps:
+                self.steps[..., g, :] = dist
+
+        self.distributions = dist
+
+    def expected_wins(self):
+        """Return (numpy array) of the expected number of wins for every distribution in the batch."""
+        # accumulate in the same order as Team.expected_wins so the results match exactly
+        result = np.zeros(self.distributions.shape[:-1])
+        for k in range(self.distributions.shape[-1]):
+            result = result + k * self.distributions[..., k]
+        return result
+
+    def at_least(self):
+        """Return (numpy array) of P(wins >= k) for every k, shaped like the distributions."""
+        below = np.zeros(self.distributions.shape)
+        below[..., 1:] = np.cumsum(self.distributions[..., :-1], axis=-1)
+        return 1 - below
+
+    def record(self, index=(), games=None):
+        """
+        The ragged 'games' x 'wins' table for one entry in the batch, as returned by Team.project_win_totals.
+        :param index: the leading index of the entry, e.g. (team, date)
+        :param games: how many games the entry really has; defaults to every game slot
+        :return: a list holding, for each game, the distribution over wins so far
+        """
+        if games is None:
+            games = self.probabilities.shape[-1]
+        steps = self.steps[index]
+        return [steps[g, :g + 2].tolist() for g in range(games)]
+
+    def final(self, index=(), games=None):
+        """Return (list) the distribution over season win totals for one entry in the batch."""
+        if games is None:
+            games = self.probabilities.shape[-1]
+        return self.distributions[index][:games + 1].tolist()
+
+
+class JointWinTotalEngine:
+    # The joint distribution of conference wins and overall wins, exactly, for a whole batch of teams at once.
+    # Same convolution as WinTotalEngine with a second axis: a conference win moves a season one step along both axes,
+    # any other win only along the overall axis. distributions[..., i, j] = P(i conference wins, j wins overall).
+    def __init__(self, probabilities, conference, mask=None):
+        """
+        :param probabilities: win probabilities with any leading shape, games last
+        :param conference: boolean array broadcastable against probabilities, True for conference games
+        :param mask: boolean array broadcastable against probabilities, False for padded game slots
+        """
+        probabilities = np.asarray(probabilities, dtype=float)
+        if mask is not None:
+            probabilities = np.where(mask, probabilities, 0.0)
+        conference = np.broadcast_to(conference, probabilities.shape)
+        self.probabilities = probabilities
+        self.conference = conference
+
+        n_games = probabilities.shape[-1]
+        n_conference = int(conference.sum(axis=-1).max()) if conference.size else 0
+        batch = probabilities.shape[:-1]
+
+        dist = np.zeros(batch + (n_conference + 1, n_games + 1))
+        dist[..., 0, 0] = 1
+        for g in range(n_games):
+            p = probabilities[..., g, None, None]
+            c = conference[..., g, None, None]
+            new = dist * (1 - p)  # newest game was a loss
+            win = np.zeros(dist.shape)
+            win[..., :, 1:] = dist[..., :, :-1]  # a win, overall only
+            both = np.zeros(dist.shape)
+            both[..., 1:, 1:] = dist[..., :-1, :-1]  # a win, conference and overall
+            new += np.where(c, both, win) * p
+            dist = new
+
+        self.distributions = dist
+
+    def conference_wins(self):
+        """Return (numpy array) of the distribution over conference wins, summed over overall wins."""
+        return self.distributions.sum(axis=-1)
+
+    def overall_wins(self):
+        """Return (numpy array) of the distribution over overall wins, summed over conference wins."""
+        return self.distributions.sum(axis=-2)
+
+    def expected_conference_wins(self):
+        """Return (numpy array) of the expected number of conference wins for every entry in the batch."""
+        dist = self.conference_wins()
+        return (dist * np.arange(dist.shape[-1])).sum(axis=-1)
+
+    def table(self, index=(), games=None, conference_games=None):
+        """
+        Return (list) of rows for one entry in the batch: table[i][j] = P(i conference wins, j wins overall).
+        :param games: how many games the entry really has; defaults to every game slot
+        :param conference_games: how many of them are conference games; defaults to every conference slot
+        """
+        if games is None:
+            games = self.probabilities.shape[-1]
+        if conference_games is None:
+            conference_games = int(self.conference[index].sum())
+        return self.distributions[index][:conference_games + 1, :games + 1].tolist()
@@ -0,0 +1,75 @@
+class GameIndex:
+    # Maps every game id to the schedule slots that hold it, one for each team that plays in the game.
+    # Game ids come from different sources as ints or strings, so they are always keyed as strings.
+    def __init__(self, schedule, teams=None):
+        self.schedule = schedule
+        self.slots = {}
+
+        if teams is None:
+            teams = list(schedule)
+        for team in teams:
+            self.add_team(team)
+
+    def __contains__(self, game_id):
+        return str(game_id) in self.slots
+
+    def add(self, team, slot):
+        # Register the game found at schedule[team]['schedule'][slot]
+        try:
+            game_id = str(self.schedule[team]['schedule'][slot]['id'])
+        except KeyError:
+            # no id, nothing to index it by
+            return
+        self.slots.setdefault(game_id, {})[team] = slot
+
+    def discard(self, game_id, team):
+        # Forget the team's slot for the game, e.g. before the game's id is changed
+        slots = self.slots.get(str(game_id))
+        if slots is None:
+            return
+        slots.pop(team, None)
+        if not slots:
+            del self.slots[str(game_id)]
+
+    def add_team(self, team):
+        # opponents in a partial schedule may be loaded without their games
+        for slot in range(len(self.schedule[team].get('schedule', ()))):
+            self.add(team, slot)
+
+    def find(self, game_id, team):
+        """Return (int) the slot in the team's schedule holding the game, or None if the team doesn't play in it."""
+        try:
+            return self.slots[str(game_id)][team]
+        except KeyError:
+            return None
+
+    def locate(self, game_id):
+        """Return (list) of (team, slot) for every team playing in the game."""
+        return list(self.slots.get(str(game_id), {}).items())
+
+    def opponent_score(self, team, slot):
+        """
+        Return (int) the opponent's points in the game at schedule[team]['schedule'][slot], or None if they aren't
+        known: the opponent isn't in the schedule, or was loaded without its games or their scores.
+        """
+        other = self.opponent_game(team, slot)
+        if other is not None:
+            return sum(other['scoreBreakdown'])
+        game = self.schedule[team]['schedule'][slot]
+        try:
+            # an opponent in a partial schedule keeps only its scores, by game id
+            return sum(self.schedule[game['opponent']]['scores'][str(game['id'])])
+        except KeyError:
+            return None
+
+    def opponent_game(self, team, slot):
+        """Return (dict) the opponent's copy of the game at schedule[team]['schedule'][slot], or None."""
+        game = self.schedule[team]['schedule'][slot]
+        try:
+            j = self.find(game['id'], game['opponent'])
+        except KeyError:
+            return None
+        if j is None:
+            return None
+        return self.schedule[game['opponent']]['schedule'][j]
+
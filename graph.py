@@ -1,60 +1,325 @@
+import gzip
+import hashlib
+import os
+import urllib.parse
+
+import numpy as np
+
+
 class Graph(object):
-    def __init__(self, path, width, height, background=(255, 255, 255)):
+    # One svg file. Elements are kept in self.content and written by write_file(), or, with stream=True, written to
+    # the file as they are added so a big table never holds more than a buffer of it in memory. A streamed graph is
+    # written to path + '.part' and only moved to path by write_file(), so an unfinished one never replaces a good one.
+    # add_rects, add_texts and add_lines take a sequence (list or numpy array) for any argument, one entry per
+    # element, and format a whole batch at once; any argument given as a single value is shared by the whole batch.
+    # Logos are drawn with <use>: each distinct logo is defined once per document, as a <symbol> in <defs>, however
+    # many times it is drawn. If Graph.sprite is set to a LogoSprite holding the logo it isn't defined in the document
+    # at all and the <use> links to the shared sprite sheet instead. logos='inline' embeds every image as it used to.
+    # Compact output gives each distinct style a short css class, defined once in a <style> block, in place of a
+    # style attribute on every element, and rounds coordinates to `precision` places. Compressed output is a gzipped
+    # .svgz. The class attributes below are the defaults for every graph, so a run can switch them all at once.
+    sprite = None
+    compact = False
+    precision = 2
+    compress = False
+
+    RECT = "<rect x='%s' y='%s' width='%s' height='%s' style='stroke-width:%s;stroke:%s;fill:%s;'/>\n"
+    TEXT = "<text text-anchor='%s' alignment-baseline='%s' x='%s' y='%s' style='" \
+           "font-family:%s;fill:%s;font-size:%spx;weight:%s'>%s</text>\n"
+    LINE = "<line x1='%s' y1='%s' x2='%s' y2='%s' style='stroke:%s;stroke-width:%s;'/>\n"
+    USE = "<use xlink:href='%s' x='%s' y='%s' width='%s' height='%s'/>\n"
+
+    # compact output: the same elements with a class for everything that isn't a coordinate or text
+    RECT_CLASS = "<rect x='%s' y='%s' width='%s' height='%s' class='%s'/>\n"
+    RECT_STYLE = "stroke-width:%s;stroke:%s;fill:%s;"
+    TEXT_CLASS = "<text x='%s' y='%s' class='%s'>%s</text>\n"
+    TEXT_STYLE = "text-anchor:%s;alignment-baseline:%s;font-family:%s;fill:%s;font-size:%spx;weight:%s"
+    LINE_CLASS = "<line x1='%s' y1='%s' x2='%s' y2='%s' class='%s'/>\n"
+    LINE_STYLE = "stroke:%s;stroke-width:%s;"
+
+    def __init__(self, path, width, height, background=(255, 255, 255), stream=False, logos='symbol', compact=None,
+                 precision=None, compress=None):
+        self.compact = Graph.compact if compact is None else compact
+        self.precision = Graph.precision if precision is None else precision
+        self.compress = Graph.compress if compress is None else compress
+        if self.compress and not path.endswith('.svgz'):
+            path = path + 'z' if path.endswith('.svg') else path + '.svgz'
         self.path = path
+        self.content = []
+        self.logos = logos
+        self.classes = {}
+        self._symbols = set()
+        self._sprite_href = None
+        self._out = None
+        if stream:
+            self._out = self._open(path + '.part')
 
-        self.content = ["<svg version='1.1'\n\t" +
-                        "baseProfile='full'\n\t" +
-                        "encoding='UTF-8'\n\t" +
-                        "width='{}' height='{}'\n\t".format(width, height) +
-                        "xmlns='http://www.w3.org/2000/svg'\n\t" +
-                        "xmlns:xlink='http://www.w3.org/1999/xlink'\n\t" +
-                        "style='shape-rendering:crispEdges;'>\n",
-                        "<rect width='100%' height='100%' style='fill:rgb({},{},{})' />\n".format(*background)]
+        self._write("<svg version='1.1'\n\t" +
+                    "baseProfile='full'\n\t" +
+                    "encoding='UTF-8'\n\t" +
+                    "width='{}' height='{}'\n\t".format(width, height) +
+                    "xmlns='http://www.w3.org/2000/svg'\n\t" +
+                    "xmlns:xlink='http://www.w3.org/1999/xlink'\n\t" +
+                    "style='shape-rendering:crispEdges;'>\n")
+        self._write("<rect width='100%' height='100%' style='fill:rgb({},{},{})' />\n".format(*background))
+
+    def _open(self, path):
+        if self.compress:
+            return gzip.open(path, 'wt', encoding='utf-8')
+        return open(path, 'w+', encoding='utf-8', buffering=1 << 16)
+
+    def _write(self, s):
+        if self._out is None:
+            self.content.append(s)
+        else:
+            self._out.write(s)
+
+    def _class(self, style):
+        # the short class name for a style, the first time it is used
+        try:
+            return self.classes[style]
+        except KeyError:
+            name = self.classes[style] = 'c' + _base36(len(self.classes))
+            return name
+
+    def _round(self, values):
+        return [_round(x, self.precision) for x in values]
 
     def add_image(self, x, y, width, height, uri):
-        s = "<image x='{}' y='{}'" \
-            " width='{}px' height='{}px'" \
-            " xlink:href='data:image/jpg;base64,{}'/>\n".format(x, y, width, height, uri)
-        self.content.append(s)
+        if self.compact:
+            x, y, width, height = self._round((x, y, width, height))
+        if self.logos == 'inline':
+            s = "<image x='{}' y='{}'" \
+                " width='{}px' height='{}px'" \
+                " xlink:href='data:image/jpg;base64,{}'/>\n".format(x, y, width, height, uri)
+            self._write(s)
+            return
+        self._write(Graph.USE % (self._logo(uri), x, y, width, height))
+
+    def _logo(self, uri):
+        # the href of the logo's symbol, defining the symbol first if this document needs its own copy
+        symbol = LogoSprite.symbol_id(uri)
+        sprite = Graph.sprite
+        if sprite is not None and symbol in sprite:
+            if self._sprite_href is None:
+                self._sprite_href = sprite.href(self.path)
+            return self._sprite_href + '#' + symbol
+        if symbol not in self._symbols:
+            self._symbols.add(symbol)
+            self._write('<defs>' + LogoSprite.symbol(symbol, uri) + '</defs>\n')
+        return '#' + symbol
 
     def add_line(self, x1, y1, x2, y2, color=(0, 0, 0), width=1):
-        s = "<line x1='{}' y1='{}' x2='{}' y2='{}' style='".format(x1, y1, x2, y2)
-        s += "stroke:rgb({},{},{});".format(*color)
-        s += "stroke-width:{};".format(width)
-        s += "'/>\n"
-        self.content.append(s)
+        if self.compact:
+            self._write(Graph.LINE_CLASS % (*self._round((x1, y1, x2, y2)),
+                                            self._class(Graph.LINE_STYLE % (_paint(color), width))))
+            return
+        self._write(Graph.LINE % (x1, y1, x2, y2, _paint(color), width))
 
-    def add_rect(self, x, y, width, height, color=(0, 0, 0), fill='none', stroke_width=1):
-        s = "<rect x='{}' y='{}' width='{}' height='{}' style='stroke-width:{};stroke:".format(x, y, width, height,
-                                                                                               stroke_width)
-        if isinstance(color, tuple):
-            s += "rgb({},{},{});".format(*color)
-        else:
-            s += color + ";"
-        s += "fill:"
-        if isinstance(fill, tuple):
-            s += "rgb({},{},{});".format(*fill)
+    def add_lines(self, x1, y1, x2, y2, color=(0, 0, 0), width=1):
+        n = _count(x1, y1, x2, y2)
+        if self.compact:
+            styles = [self._class(Graph.LINE_STYLE % row) for row in zip(_paints(color, n), _column(width, n))]
+            rows = zip(*[self._round(_column(v, n)) for v in (x1, y1, x2, y2)], styles)
+            template = Graph.LINE_CLASS
         else:
-            s += fill + ";"
-        s += "'/>\n"
+            rows = zip(*[_column(v, n) for v in (x1, y1, x2, y2)], _paints(color, n), _column(width, n))
+            template = Graph.LINE
+        self._write(''.join([template % row for row in rows]))
+
+    def add_rect(self, x, y, width, height, color=(0, 0, 0), fill='none', stroke_width=1):
+        if self.compact:
+            self._write(Graph.RECT_CLASS % (*self._round((x, y, width, height)),
+                                            self._class(Graph.RECT_STYLE % (stroke_width, _paint(color), _paint(fill)))))
+            return
+        self._write(Graph.RECT % (x, y, width, height, stroke_width, _paint(color), _paint(fill)))
 
-        self.content.append(s)
+    def add_rects(self, x, y, width, height, color=(0, 0, 0), fill='none', stroke_width=1):
+        n = _count(x, y, width, height)
+        if self.compact:
+            styles = [self._class(Graph.RECT_STYLE % row) for row in
+                      zip(_column(stroke_width, n), _paints(color, n), _paints(fill, n))]
+            rows = zip(*[self._round(_column(v, n)) for v in (x, y, width, height)], styles)
+            template = Graph.RECT_CLASS
+        else:
+            rows = zip(*[_column(v, n) for v in (x, y, width, height, stroke_width)], _paints(color, n),
+                       _paints(fill, n))
+            template = Graph.RECT
+        self._write(''.join([template % row for row in rows]))
 
     def add_text(self, x, y, alignment='baseline', anchor='middle', color=(0, 0, 0), font='Arial', size=12, text='',
                  weight='normal'):
-        s = "<text text-anchor='{}'" \
-            " alignment-baseline='{}'" \
-            " x='{}' y='{}' style='".format(anchor, alignment, x, y, text)
-        s += "font-family:{};".format(font)
-        s += "fill:rgb({},{},{});".format(*color)
-        s += "font-size:{}px;".format(size)
-        s += "weight:{}".format(weight)
-        s += "'>{}</text>\n".format(text)
+        if self.compact:
+            style = Graph.TEXT_STYLE % (anchor, alignment, font, _paint(color), size, weight)
+            self._write(Graph.TEXT_CLASS % (*self._round((x, y)), self._class(style), text))
+            return
+        self._write(Graph.TEXT % (anchor, alignment, x, y, font, _paint(color), size, weight, text))
+
+    def add_texts(self, x, y, text, alignment='baseline', anchor='middle', color=(0, 0, 0), font='Arial', size=12,
+                  weight='normal'):
+        n = _count(x, y, text)
+        if self.compact:
+            styles = [self._class(Graph.TEXT_STYLE % row) for row in
+                      zip(*[_column(v, n) for v in (anchor, alignment, font)], _paints(color, n),
+                          *[_column(v, n) for v in (size, weight)])]
+            rows = zip(*[self._round(_column(v, n)) for v in (x, y)], styles, _column(text, n))
+            template = Graph.TEXT_CLASS
+        else:
+            rows = zip(*[_column(v, n) for v in (anchor, alignment, x, y, font)], _paints(color, n),
+                       *[_column(v, n) for v in (size, weight, text)])
+            template = Graph.TEXT
+        self._write(''.join([template % row for row in rows]))
 
-        self.content.append(s)
+    def _style_block(self):
+        # css may come anywhere in the document, so a streamed graph can define its classes last
+        if not self.classes:
+            return ''
+        return '<style>\n' + ''.join(['.{}{{{}}}\n'.format(name, style) for style, name in self.classes.items()]) + \
+            '</style>\n'
 
     def write_file(self):
-        with open(self.path, 'w+', encoding='utf-8') as outfile:
+        if self._out is not None:
+            self._out.write(self._style_block() + "</svg>")
+            self._out.close()
+            self._out = None
+            os.replace(self.path + '.part', self.path)
+            return
+        with self._open(self.path) as outfile:
             for x in self.content:
                 outfile.write(x)
-            outfile.write("</svg>")
+            outfile.write(self._style_block() + "</svg>")
+
+
+class LogoSprite:
+    # A sprite sheet: one svg file holding a <symbol> for each logo, which graphs link to instead of carrying their own
+    # copies. It is written once, before the graphs that use it, and is only read after that.
+    _ids = {}
+
+    def __init__(self, path):
+        self.path = path
+        self.ids = set()
+        self.uris = {}
+
+    def __getstate__(self):
+        # the graphs only need to know which logos are in the sprite, not the logos themselves
+        state = dict(self.__dict__)
+        state['uris'] = {}
+        return state
+
+    @staticmethod
+    def symbol_id(uri):
+        """Return (str) the symbol id for the logo, the same in every document and sprite."""
+        try:
+            return LogoSprite._ids[uri]
+        except KeyError:
+            symbol = LogoSprite._ids[uri] = 'logo-' + hashlib.sha1(uri.encode('utf8')).hexdigest()[:16]
+            return symbol
+
+    @staticmethod
+    def symbol(symbol, uri):
+        # no viewBox, so the <use> width and height size the image just as they did the inline <image>
+        return "<symbol id='{}'><image width='100%' height='100%' xlink:href='data:image/jpg;base64,{}'/></symbol>" \
+            .format(symbol, uri)
+
+    def __contains__(self, symbol):
+        return symbol in self.ids
+
+    def add(self, uri):
+        symbol = LogoSprite.symbol_id(uri)
+        self.ids.add(symbol)
+        self.uris[symbol] = uri
+        return symbol
+
+    def add_schedule(self, schedule, teams=None):
+        """Add the logo of every team in the schedule (or just the teams given) that has one."""
+        for x in teams if teams is not None else schedule:
+            try:
+                uri = schedule[x]['logoURI']
+            except KeyError:
+                continue
+            if uri:
+                self.add(uri)
+
+    def href(self, path):
+        """Return (str) the sprite's address relative to the svg file at path."""
+        relative = os.path.relpath(os.path.abspath(self.path), os.path.dirname(os.path.abspath(path)))
+        return urllib.parse.quote(relative.replace(os.sep, '/'))
+
+    def write(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path + '.part', 'w+', encoding='utf-8') as outfile:
+            outfile.write("<svg version='1.1' xmlns='http://www.w3.org/2000/svg' "
+                          "xmlns:xlink='http://www.w3.org/1999/xlink'>\n<defs>\n")
+            for symbol, uri in self.uris.items():
+                outfile.write(LogoSprite.symbol(symbol, uri) + '\n')
+            outfile.write('</defs>\n</svg>')
+        os.replace(self.path + '.part', self.path)
+
+
+_PAINTS = {}
+
+
+def _round(value, precision):
+    # a coordinate to the precision given, written without a trailing '.0'
+    if isinstance(value, float):
+        value = round(value, precision)
+        if value.is_integer():
+            return int(value)
+    return value
+
+
+def _base36(i):
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    s = digits[i % 36]
+    while i >= 36:
+        i //= 36
+        s = digits[i % 36] + s
+    return s
+
+
+def _paint(color):
+    # an (r, g, b) color or an svg paint such as 'none'; tables repeat a few colors many times, so each is formatted once
+    if isinstance(color, str):
+        return color
+    key = tuple(color)
+    try:
+        return _PAINTS[key]
+    except KeyError:
+        if len(_PAINTS) > 1 << 16:
+            # the team color scale makes new colors all the time; don't keep every one of them
+            _PAINTS.clear()
+        paint = _PAINTS[key] = 'rgb({},{},{})'.format(*key)
+        return paint
+
+
+def _single(value):
+    if isinstance(value, np.ndarray):
+        return value.ndim == 0
+    return isinstance(value, (str, int, float)) or not hasattr(value, '__len__')
+
+
+def _count(*values):
+    # the batch size, from the first argument given as a sequence
+    for value in values:
+        if not _single(value):
+            return len(value)
+    return 1
+
+
+def _column(value, n):
+    if _single(value):
+        return [value] * n
+    if isinstance(value, np.ndarray):
+        # python numbers format the same as the single element methods' arguments
+        return value.tolist()
+    return list(value)
+
+
+def _paints(color, n):
+    if isinstance(color, (str, tuple)):
+        return [_paint(color)] * n
+    if isinstance(color, np.ndarray):
+        color = color.tolist()
+    return [_paint(x) for x in color]
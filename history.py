@@ -0,0 +1,100 @@
+import bisect
+
+import numpy as np
+
+from projection import ScheduleVersion
+from utils import Utils
+
+
+class RatingHistory:
+    # The S&P+ history of every team, parsed once when the schedule is loaded.
+    # Dates are kept as sorted day ordinals with the ratings aligned to them, so "the rating of a team as of a date"
+    # is a binary search instead of a strptime scan over every key.
+    def __init__(self, schedule, teams=None):
+        self.version = ScheduleVersion.of(schedule)
+        if teams is None:
+            teams = list(schedule)
+        self.teams = list(teams)
+        self.index = {x: i for i, x in enumerate(self.teams)}
+
+        self.keys = {}
+        self.ordinals = {}
+        self.values = {}
+        for x in self.teams:
+            keys = list(schedule[x]['sp+'].keys())
+            ordinals = Utils.dates_to_ordinals(keys)
+            order = np.argsort(ordinals, kind='stable')
+            self.keys[x] = [keys[i] for i in order]
+            self.ordinals[x] = ordinals[order].tolist()
+            self.values[x] = [schedule[x]['sp+'][k] for k in self.keys[x]]
+
+        # Flattened copy of every history for vectorized lookups; each team owns one contiguous, sorted segment
+        lengths = [len(self.ordinals[x]) for x in self.teams]
+        self._starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64) if lengths else \
+            np.zeros(0, dtype=np.int64)
+        self._values = np.array([v for x in self.teams for v in self.values[x]], dtype=float)
+        self._search = RatingHistory._combine(np.repeat(np.arange(len(self.teams)), lengths),
+                                              np.array([v for x in self.teams for v in self.ordinals[x]],
+                                                       dtype=np.int64))
+
+    def __contains__(self, team):
+        return team in self.index
+
+    def refresh(self, schedule, teams=()):
+        """
+        Re-read the histories in place if the schedule changed, so everything holding this history sees the new
+        ratings; returns True if it did.
+        :param teams: teams to cover as well, if they aren't already
+        """
+        missing = [x for x in teams if x not in self.index]
+        if self.version == ScheduleVersion.of(schedule) and not missing:
+            return False
+        self.__init__(schedule, teams=self.teams + missing)
+        return True
+
+    @staticmethod
+    def _combine(teams, ordinals):
+        # Sort key that orders by team first, then by date
+        return (np.asarray(teams, dtype=np.int64) << 32) + (np.asarray(ordinals, dtype=np.int64) + (1 << 31))
+
+    def _position(self, team, when):
+        pos = bisect.bisect_right(self.ordinals[team], Utils.date_to_ordinal(when)) - 1
+        if pos < 0:
+            raise ValueError('{} has no S&P+ value on or before {}'.format(team, when))
+        return pos
+
+    def as_of(self, team, when):
+        """Return (date string, rating) of the most recent S&P+ value on or before the date given."""
+        pos = self._position(team, when)
+        return self.keys[team][pos], self.values[team][pos]
+
+    def rating(self, team, when):
+        """Return (float) the most recent S&P+ value on or before the date given."""
+        return self.values[team][self._position(team, when)]
+
+    def latest(self, team):
+        """Return (date string, rating) of the newest S&P+ value on file."""
+        return self.keys[team][-1], self.values[team][-1]
+
+    def ratings_as_of(self, teams, ordinals):
+        """
+        Vectorized as-of lookup.
+        :param teams: array of indexes into self.teams
+        :param ordinals: array of day ordinals, broadcastable against teams
+        :return: (ratings, found) arrays; found is False wherever the team has no rating on or before the date
+        """
+        return RatingHistory.lookup(self.arrays(), teams, ordinals)
+
+    def arrays(self):
+        # The flattened histories, enough to do lookups without the object (e.g. from shared memory in a worker)
+        return {'search': self._search, 'starts': self._starts, 'values': self._values}
+
+    @staticmethod
+    def lookup(arrays, teams, ordinals):
+        teams, ordinals = np.broadcast_arrays(np.asarray(teams, dtype=np.int64), np.asarray(ordinals, dtype=np.int64))
+        if len(arrays['search']) == 0:
+            return np.zeros(teams.shape), np.zeros(teams.shape, dtype=bool)
+
+        pos = np.searchsorted(arrays['search'], RatingHistory._combine(teams, ordinals), side='right') - 1
+        found = pos >= arrays['starts'][teams]
+        return np.where(found, arrays['values'][np.maximum(pos, 0)], 0.0), found
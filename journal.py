@@ -0,0 +1,177 @@
+import contextlib
+import json
+import os
+
+
+class ScheduleJournal:
+    # An append only log of the changes made to a schedule json file, kept next to it (schedule.json.journal).
+    # Instead of rewriting the whole file for a few new ratings or results, each change is appended as one compact
+    # json line: a game slot, an S&P+ rating, a poll entry or a team's own fields, always as its new value. Loading
+    # replays the journal over the file; compact() folds it into a new snapshot and empties it. Everything that reads
+    # a schedule json file goes through load() here or ScheduleStream (which replays each team as it is read), so no
+    # reader sees the snapshot without the changes logged since.
+    # Every record sets a value rather than changing one, so replaying a record twice (e.g. after a crash between
+    # writing a snapshot and emptying the journal) does no harm.
+    # It offers the same writes as a ScheduleDatabase, so a Schedule can log to either.
+    def __init__(self, file, ratio=0.25, partial=False):
+        """
+        :param file: the schedule json file
+        :param ratio: compact once the journal is this large relative to the snapshot
+        :param partial: the schedule logging to it holds only part of the file, so it must never become the snapshot
+        """
+        self.file = file
+        self.path = file + '.journal'
+        self.ratio = ratio
+        self.partial = partial
+        self._pending = []
+        self._depth = 0
+
+    def __len__(self):
+        return sum(1 for _ in self.records())
+
+    def size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def due(self):
+        """Return (bool) whether the journal has grown enough to be worth compacting."""
+        if self.partial:
+            return False
+        snapshot = os.path.getsize(self.file) if os.path.exists(self.file) else 0
+        return self.size() > self.ratio * snapshot
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Group records so they reach the journal in one write; nested uses join the outermost one."""
+        self._depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._depth -= 1
+            if self._depth == 0:
+                self._pending = []
+            raise
+        self._depth -= 1
+        if self._depth == 0:
+            self.flush()
+
+    def _append(self, record):
+        self._pending.append(json.dumps(record, separators=(',', ':'), ensure_ascii=False))
+        if self._depth == 0:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        with open(self.path, 'a', encoding='utf8') as outfile:
+            outfile.write('\n'.join(self._pending) + '\n')
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        self._pending = []
+
+    # -- writing ------------------------------------------------------------------------------------------------------
+
+    def put_team(self, name, team):
+        """Log the team's own fields (everything but its games, ratings and rankings)."""
+        fields = {k: v for k, v in team.items() if k not in ('schedule', 'sp+', 'rankings', 'scores')}
+        self._append({'op': 'team', 'team': name, 'fields': fields})
+
+    def put_games(self, team, games):
+        """Log (slot, game dict) pairs of the team's schedule."""
+        with self.transaction():
+            for slot, game in games:
+                self._append({'op': 'game', 'team': team, 'slot': slot, 'game': game})
+
+    def put_ratings(self, team, ratings):
+        """Log (date, S&P+) pairs of the team's ratings."""
+        with self.transaction():
+            for date, value in ratings:
+                self._append({'op': 'rating', 'team': team, 'date': date, 'value': value})
+
+    def put_ranking(self, team, poll, date, entry):
+        """Log one team's entry in one poll."""
+        self._append({'op': 'ranking', 'team': team, 'poll': poll, 'date': date, 'entry': entry})
+
+    # -- reading ------------------------------------------------------------------------------------------------------
+
+    def records(self):
+        """Yield (dict) every record in the journal, oldest first. A last line cut off by a crash is ignored."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf8') as infile:
+            for line in infile:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    if line.endswith('\n'):
+                        raise
+                    return
+
+    def changes(self):
+        """Return (dict) of team -> the records about it, oldest first."""
+        changes = {}
+        for record in self.records():
+            changes.setdefault(record['team'], []).append(record)
+        return changes
+
+    def load(self):
+        """Return (dict) the whole schedule: the snapshot with every logged change applied."""
+        with open(self.file, 'r', encoding='utf8') as infile:
+            schedule = json.load(infile)
+        self.replay(schedule)
+        return schedule
+
+    def replay(self, schedule, records=None):
+        """
+        Apply the journal to the schedule loaded from the snapshot.
+        :param records: the records to apply (e.g. one team's, from changes()); defaults to the whole journal
+        :return: (int) the number of records applied
+        """
+        count = 0
+        for record in self.records() if records is None else records:
+            current = schedule.get(record['team'])
+            if current is None:
+                # not loaded (a partial schedule)
+                continue
+            if record['op'] == 'game':
+                if 'schedule' not in current:
+                    # an opponent loaded without its games
+                    continue
+                games = current['schedule']
+                if record['slot'] < len(games):
+                    games[record['slot']] = record['game']
+                else:
+                    games.append(record['game'])
+            elif record['op'] == 'rating':
+                current.setdefault('sp+', {})[record['date']] = record['value']
+            elif record['op'] == 'ranking':
+                current.setdefault('rankings', {}).setdefault(record['poll'], {})[record['date']] = record['entry']
+            elif record['op'] == 'team':
+                for key in [x for x in current if x not in ('schedule', 'sp+', 'rankings', 'scores')]:
+                    if key not in record['fields']:
+                        del current[key]
+                current.update(record['fields'])
+            else:
+                raise ValueError('unknown journal record {}'.format(record['op']))
+            count += 1
+        return count
+
+    def compact(self, schedule):
+        """Write the schedule (with every change applied) as the new snapshot and empty the journal."""
+        if self.partial:
+            raise ValueError('only part of {} was loaded; it can only be logged to, not compacted'.format(self.file))
+        self.flush()
+        temp = self.file + '.tmp'
+        with open(temp, 'w+', encoding='utf8') as outfile:
+            json.dump(schedule, outfile, indent=4, sort_keys=True, ensure_ascii=False)
+        # the snapshot is replaced whole or not at all; the journal is only emptied once it is
+        os.replace(temp, self.file)
+        self.clear()
+
+    def write(self, schedule):
+        """Replace the snapshot with the schedule dict, as ScheduleDatabase.write replaces the database."""
+        self.compact(schedule)
+
+    def clear(self):
+        self._pending = []
+        if os.path.exists(self.path):
+            os.remove(self.path)
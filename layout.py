@@ -0,0 +1,89 @@
+from colors import ColorScale
+from graph import Graph
+
+
+class ScaledColors:
+    # The colors of a run of color-coded cells, which depend on the color scale being rendered: the fills of the cells
+    # or the colors of the text written on them. A TableLayout resolves them once for each scale it renders.
+    __slots__ = ('cells', 'text', 'index')
+
+    def __init__(self, cells, text=False, index=None):
+        self.cells = cells
+        self.text = text
+        self.index = index
+
+    def __getitem__(self, index):
+        """Return (ScaledColors) the color of one of the cells."""
+        return ScaledColors(self.cells, self.text, index)
+
+    def resolve(self, scale, resolved):
+        # resolved caches each run of cells' (fills, text colors) for the scale being rendered
+        try:
+            colors = resolved[id(self.cells)]
+        except KeyError:
+            values, lower, upper, primary, secondary = self.cells
+            colors = resolved[id(self.cells)] = ColorScale.of(scale, primary, secondary).colors(values, lower, upper)
+        colors = colors[1] if self.text else colors[0]
+        if self.index is None:
+            return colors
+        return tuple(colors[self.index].tolist())
+
+
+class TableLayout:
+    # A graph drawn once and rendered in as many color scales as wanted.
+    # It takes the same drawing calls as a Graph and keeps them, with every row, label and position already worked
+    # out; only the colors of the color-coded cells are left open, as ScaledColors from scaled(). render() then plays
+    # the drawing back once, into one Graph per scale, resolving those colors for each, so another scale costs the
+    # writing of another file and nothing more.
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.calls = []
+
+    def scaled(self, values, lower=0, upper=1, primary=None, secondary=None):
+        """
+        Return (fills, text colors) for a run of color-coded cells, to draw with in place of colors.
+        :param values: the values the cells are colored by
+        :param lower: the value at the bottom of the scale
+        :param upper: the value at the top of the scale
+        :param primary: the team's primary (red, green, blue), for the team scale
+        :param secondary: the team's secondary (red, green, blue), for the team scale
+        """
+        cells = (list(values), lower, upper, primary, secondary)
+        return ScaledColors(cells), ScaledColors(cells, text=True)
+
+    def _record(name):
+        def record(self, *args, **kwargs):
+            self.calls.append((name, args, kwargs))
+        record.__name__ = name
+        record.__doc__ = 'Draw as Graph.{} does, once the layout is rendered.'.format(name)
+        return record
+
+    add_image = _record('add_image')
+    add_line = _record('add_line')
+    add_lines = _record('add_lines')
+    add_rect = _record('add_rect')
+    add_rects = _record('add_rects')
+    add_text = _record('add_text')
+    add_texts = _record('add_texts')
+
+    del _record
+
+    def render(self, paths, **kwargs):
+        """
+        Write the graph once for each color scale.
+        :param paths: (dict) the svg file to write for each scale, e.g. {'red-green': ..., 'team': ...}
+        :param kwargs: passed on to each Graph, e.g. stream=True
+        """
+        graphs = {x: Graph(path=paths[x], width=self.width, height=self.height, **kwargs) for x in paths}
+        resolved = {x: {} for x in paths}
+        for name, args, options in self.calls:
+            scaled = any(isinstance(x, ScaledColors) for x in options.values())
+            for scale, graph in graphs.items():
+                if scaled:
+                    getattr(graph, name)(*args, **{k: v.resolve(scale, resolved[scale])
+                                                   if isinstance(v, ScaledColors) else v for k, v in options.items()})
+                else:
+                    getattr(graph, name)(*args, **options)
+        for graph in graphs.values():
+            graph.write_file()
@@ -0,0 +1,126 @@
+import base64
+import hashlib
+import os
+
+
+class LogoStore:
+    # Team logos kept once on disk, named by the sha256 of their bytes (logos/ab/abcdef...).
+    # A schedule only records each team's 'logoHash'; the bytes are read, and base64 encoded for the svgs, the first
+    # time a logo is rendered and then kept for the rest of the run.
+    def __init__(self, directory='logos'):
+        self.directory = directory
+        self._bytes = {}
+        self._uris = {}
+
+    @staticmethod
+    def beside(file):
+        """Return (LogoStore) in a 'logos' directory next to the given schedule file."""
+        return LogoStore(os.path.join(os.path.dirname(os.path.abspath(file)), 'logos'))
+
+    def path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def __contains__(self, digest):
+        return digest in self._bytes or os.path.exists(self.path(digest))
+
+    def put(self, data):
+        """Store the image bytes (once, however many teams share them) and return (str) their hash."""
+        digest = hashlib.sha256(data).hexdigest()
+        if digest not in self:
+            os.makedirs(os.path.dirname(self.path(digest)), exist_ok=True)
+            # write then rename, so a reader never sees part of a logo
+            temp = self.path(digest) + '.tmp'
+            with open(temp, 'wb') as outfile:
+                outfile.write(data)
+            os.replace(temp, self.path(digest))
+        return digest
+
+    def get(self, digest):
+        """Return (bytes) the image with the given hash; raises KeyError if the store doesn't have it."""
+        try:
+            return self._bytes[digest]
+        except KeyError:
+            try:
+                with open(self.path(digest), 'rb') as infile:
+                    data = self._bytes[digest] = infile.read()
+            except FileNotFoundError:
+                # e.g. the logos directory wasn't copied along with the schedule; a missing logo is skipped, as a
+                # team without one always has been
+                raise KeyError(digest) from None
+            return data
+
+    def uri(self, digest):
+        """Return (str) the image with the given hash, base64 encoded as it used to be held in 'logoURI'."""
+        try:
+            return self._uris[digest]
+        except KeyError:
+            uri = self._uris[digest] = base64.b64encode(self.get(digest)).decode()
+            return uri
+
+    def externalize(self, schedule):
+        """
+        Move every team's base64 'logoURI' into the store, leaving only a 'logoHash', and attach the store.
+        Logos whose base64 doesn't come back byte for byte from the decoded image are left where they are.
+        This is a migration, run by Schedule.externalize_logos, which saves the schedule afterwards.
+        :return: (list) the teams whose logos were moved
+        """
+        moved = []
+        for name, team in schedule.items():
+            # only a logo held in the team itself, not one a TeamRecord would read from the store
+            uri = dict.get(team, 'logoURI')
+            if not isinstance(uri, str):
+                continue
+            try:
+                data = base64.b64decode(uri, validate=True)
+            except ValueError:
+                continue
+            if base64.b64encode(data).decode() != uri:
+                continue
+            team['logoHash'] = self.put(data)
+            del team['logoURI']
+            moved.append(name)
+        self.attach(schedule)
+        return moved
+
+    def attach(self, schedule):
+        """Make schedule[team]['logoURI'] read through the store for every team that only has a 'logoHash'."""
+        for name, team in schedule.items():
+            if not isinstance(team, TeamRecord):
+                schedule[name] = TeamRecord(team, store=self)
+            else:
+                team.store = self
+        return schedule
+
+
+class TeamRecord(dict):
+    # A team's entry in the schedule. Exactly a dict (and saved as one), except that a missing 'logoURI' is looked up
+    # in the logo store from the team's 'logoHash', whether it is read with [], get() or tested for with in.
+    def __init__(self, *args, store=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.store = store
+
+    def _stored_logo(self):
+        return self.store is not None and dict.__contains__(self, 'logoHash')
+
+    def __missing__(self, key):
+        if key == 'logoURI' and self._stored_logo():
+            return self.store.uri(dict.__getitem__(self, 'logoHash'))
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or \
+            (key == 'logoURI' and self._stored_logo() and dict.__getitem__(self, 'logoHash') in self.store)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __reduce__(self):
+        # pickle (e.g. for a process pool) as a plain record plus its store
+        return TeamRecord._rebuild, (dict(self), self.store)
+
+    @staticmethod
+    def _rebuild(data, store):
+        return TeamRecord(data, store=store)
@@ -0,0 +1,253 @@
+from collections.abc import MutableMapping
+from datetime import datetime
+
+import numpy as np
+from scipy.special import ndtr
+
+from defs import HOME_FIELD_ADVANTAGE, SPPLUS_STDEV
+from distribution import JointWinTotalEngine, WinTotalEngine
+from games import GameIndex
+from history import RatingHistory
+from projection import ScheduleVersion
+from utils import Utils
+
+
+class WinProbabilityEngine:
+    # Computes the game by game win probabilities for a whole group of teams in one pass.
+    # Everything lives in a single (team x S&P+ date x game) array and each Team is handed views of its own slice,
+    # so building a conference or cluster costs one array operation instead of one norm.cdf call per cell.
+    # In lazy mode nothing is evaluated up front: each (team, date) vector is computed the first time it is asked for,
+    # and the full array only if something needs every date at once.
+    def __init__(self, schedule, teams=None, now=None, history=None, lazy=False):
+        self.schedule = schedule
+        self.version = ScheduleVersion.of(schedule)
+        # an engine pinned to a date stays on it when it refreshes; otherwise it goes on following the clock
+        self._now = now
+        self.now = now if now else datetime.now()
+        self.lazy = lazy
+
+        if teams is None:
+            teams = list(schedule)
+        self.teams = list(teams)
+        self.index = {x: i for i, x in enumerate(self.teams)}
+        self.games = [schedule[x]['schedule'] for x in self.teams]
+
+        # Only parse the histories and games we actually need if shared ones weren't handed over
+        needed = sorted(set(self.teams) | set(x['opponent'] for games in self.games for x in games))
+        if history is None:
+            history = RatingHistory(schedule, teams=needed)
+        else:
+            # a shared history is brought up to date where it lives, so its owners see the same ratings
+            history.refresh(schedule, teams=needed)
+        self.history = history
+        self.game_index = GameIndex(schedule, teams=needed)
+
+        # The S&P+ dates are kept in chronological order
+        self.dates = [history.keys[x] for x in self.teams]
+        self.date_index = [{x: d for d, x in enumerate(dates)} for dates in self.dates]
+
+        n_teams = len(self.teams)
+        n_dates = max([len(x) for x in self.dates] + [1])
+        n_games = max([len(x) for x in self.games] + [1])
+
+        # The rating of each team on each of its S&P+ dates
+        self.date_mask = np.zeros((n_teams, n_dates), dtype=bool)
+        self.date_ordinals = np.zeros((n_teams, n_dates), dtype=np.int64)
+        self.ratings = np.zeros((n_teams, n_dates))
+        for i, x in enumerate(self.teams):
+            k = len(self.dates[i])
+            self.date_mask[i, :k] = True
+            self.date_ordinals[i, :k] = history.ordinals[x]
+            self.ratings[i, :k] = history.values[x]
+
+        # The opponent, home field offset and start date of each game slot
+        self.game_mask = np.zeros((n_teams, n_games), dtype=bool)
+        self.offsets = np.zeros((n_teams, n_games))
+        self.start_ordinals = np.zeros((n_teams, n_games), dtype=np.int64)
+        self.results = np.zeros((n_teams, n_games))
+        self.conference_games = np.zeros((n_teams, n_games), dtype=bool)
+        for i, games in enumerate(self.games):
+            self.game_mask[i, :len(games)] = True
+            conference = schedule[self.teams[i]]['conference']
+            for j, game in enumerate(games):
+                # Who has the 2.5 point home field advantage?
+                if game['home-away'] == 'home':
+                    self.offsets[i, j] = HOME_FIELD_ADVANTAGE
+                elif game['home-away'] == 'neutral':
+                    self.offsets[i, j] = 0.0
+                else:
+                    self.offsets[i, j] = -HOME_FIELD_ADVANTAGE
+                self.results[i, j] = 1.0 if game['winner'] == 'true' else 0.0
+                # Independents and FCS teams don't play conference games
+                self.conference_games[i, j] = conference not in ('FBS Independents', 'FCS') and \
+                    schedule[game['opponent']]['conference'] == conference
+            self.start_ordinals[i, :len(games)] = Utils.dates_to_ordinals([x['startDate'] for x in games])
+
+        self.opponents = self._opponent_indexes()
+        self._opponent_ratings = None
+        self._probabilities = None
+        self._rows = {}
+        if not lazy:
+            self._probabilities = self._evaluate()
+        self._win_totals = None
+        self._joint_win_totals = None
+
+    def __contains__(self, team):
+        return team in self.index
+
+    def refresh(self):
+        # Recompute everything if the schedule changed since the engine was built; returns True if it did
+        if self.version == ScheduleVersion.of(self.schedule):
+            return False
+        self.__init__(self.schedule, teams=self.teams, now=self._now, history=self.history, lazy=self.lazy)
+        return True
+
+    def _opponent_indexes(self):
+        # each game's opponent, as an index into the history
+        opp = np.zeros(self.game_mask.shape, dtype=np.int64)
+        for i, games in enumerate(self.games):
+            opp[i, :len(games)] = [self.history.index[x['opponent']] for x in games]
+        return opp
+
+    @property
+    def opponent_ratings(self):
+        # A (team x date x game) tensor holding the most recent opponent S&P+ value prior to each date.
+        # Note there might be a misalignment between the S&P+ value dates for different teams, especially FCS teams
+        if self._opponent_ratings is None:
+            self._opponent_ratings = self._rate_opponents()
+        return self._opponent_ratings
+
+    @property
+    def probabilities(self):
+        # Every win probability as one (team x date x game) array, built on first use in lazy mode
+        if self._probabilities is None:
+            self._probabilities = self._evaluate()
+        return self._probabilities
+
+    def _rate_opponents(self):
+        ratings, found = self.history.ratings_as_of(self.opponents[:, None, :], self.date_ordinals[:, :, None])
+
+        valid = self.date_mask[:, :, None] & self.game_mask[:, None, :]
+        if np.any(valid & ~found):
+            t, d, g = [x[0] for x in np.nonzero(valid & ~found)]
+            raise ValueError('{} has no S&P+ value on or before {}'.format(self.games[t][g]['opponent'],
+                                                                              self.dates[t][d]))
+
+        return np.where(valid, ratings, 0.0)
+
+    @staticmethod
+    def probability(rating, opponent_rating, offset):
+        # Array version of Utils.calculate_win_prob_from_spplus, with the home field advantage given as an offset
+        return ndtr((rating - opponent_rating + offset) / SPPLUS_STDEV)
+
+    def _evaluate(self):
+        # Every win probability in one call
+        prob = WinProbabilityEngine.probability(self.ratings[:, :, None], self.opponent_ratings,
+                                                self.offsets[:, None, :])
+
+        # If a game was already played, assign 100% or 0% win probability from the game date onward
+        played = self.game_mask & Utils.is_past(self.start_ordinals, self.now)
+        after = played[:, None, :] & (self.date_ordinals[:, :, None] >= self.start_ordinals[:, None, :])
+        prob = np.where(after, self.results[:, None, :], prob)
+
+        return prob
+
+    def _evaluate_row(self, i, d):
+        # The same computation as _evaluate, for one team on one date
+        n = len(self.games[i])
+        ratings, found = self.history.ratings_as_of(self.opponents[i, :n], self.date_ordinals[i, d])
+        if not np.all(found):
+            g = np.nonzero(~found)[0][0]
+            raise ValueError('{} has no S&P+ value on or before {}'.format(self.games[i][g]['opponent'],
+                                                                              self.dates[i][d]))
+        prob = WinProbabilityEngine.probability(self.ratings[i, d], ratings, self.offsets[i, :n])
+
+        played = Utils.is_past(self.start_ordinals[i, :n], self.now)
+        after = played & (self.date_ordinals[i, d] >= self.start_ordinals[i, :n])
+        return np.where(after, self.results[i, :n], prob)
+
+    def vector(self, team, date):
+        """Return (numpy array) the team's game by game win probabilities as of one of its S&P+ dates."""
+        i = self.index[team]
+        d = self.date_index[i][date]
+        if self._probabilities is not None and (i, d) not in self._rows:
+            return self._probabilities[i, d, :len(self.games[i])]
+        if (i, d) not in self._rows:
+            self._rows[(i, d)] = self._evaluate_row(i, d)
+        return self._rows[(i, d)]
+
+    @property
+    def win_totals(self):
+        # Win total distributions for every team and date, computed on first use
+        if self._win_totals is None:
+            self._win_totals = WinTotalEngine(self.probabilities,
+                                              mask=self.date_mask[:, :, None] & self.game_mask[:, None, :])
+        return self._win_totals
+
+    @property
+    def joint_win_totals(self):
+        # Joint conference x overall win distributions for every team and date, computed on first use
+        if self._joint_win_totals is None:
+            self._joint_win_totals = JointWinTotalEngine(self.probabilities, self.conference_games[:, None, :],
+                                                         mask=self.date_mask[:, :, None] & self.game_mask[:, None, :])
+        return self._joint_win_totals
+
+    def owns(self, team, date, vec):
+        # Is vec still the engine's own win probability vector for the team on that date?
+        if not isinstance(vec, np.ndarray) or team not in self.index or date not in self.date_index[self.index[team]]:
+            return False
+        i = self.index[team]
+        return vec is self._rows.get((i, self.date_index[i][date])) or \
+            (self._probabilities is not None and vec.base is self._probabilities)
+
+    def win_probabilities(self, team):
+        # A dict of S&P+ date -> win probability vector, each vector is a view into the shared array
+        if self.lazy:
+            return LazyWinProbabilities(self, team)
+        i = self.index[team]
+        n = len(self.games[i])
+        return {x: self.probabilities[i, d, :n] for d, x in enumerate(self.dates[i])}
+
+    def game_ordinals(self, team):
+        # The start dates of the team's games as day ordinals
+        i = self.index[team]
+        return self.start_ordinals[i, :len(self.games[i])]
+
+
+class LazyWinProbabilities(MutableMapping):
+    # The dict of S&P+ date -> win probability vector handed to a Team by a lazy engine.
+    # A date's vector is computed the first time it is read; vectors assigned by hand are kept as given.
+    def __init__(self, engine, team):
+        self.engine = engine
+        self.team = team
+        self.dates = engine.dates[engine.index[team]]
+        self.replaced = {}
+        self.removed = set()
+
+    def __getitem__(self, date):
+        if date in self.replaced:
+            return self.replaced[date]
+        if date in self.removed or date not in self.engine.date_index[self.engine.index[self.team]]:
+            raise KeyError(date)
+        return self.engine.vector(self.team, date)
+
+    def __setitem__(self, date, value):
+        self.replaced[date] = value
+        self.removed.discard(date)
+
+    def __delitem__(self, date):
+        if date not in self:
+            raise KeyError(date)
+        self.replaced.pop(date, None)
+        self.removed.add(date)
+
+    def __iter__(self):
+        for x in self.dates:
+            if x not in self.removed:
+                yield x
+        for x in self.replaced:
+            if x not in self.engine.date_index[self.engine.index[self.team]]:
+                yield x
+
+    def __len__(self):
+        return sum(1 for _ in self)
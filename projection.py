@@ -0,0 +1,44 @@
+class ScheduleVersion:
+    # Counts the changes made to a schedule dict, so anything derived from it can tell when it is stale.
+    # The count is kept on the schedule itself, a VersionedSchedule, so it goes wherever the schedule goes (a copy
+    # pickled into a worker process included) and no other dict can ever be mistaken for it. A plain dict is never
+    # changed through a Schedule, and stays at version 0.
+    @staticmethod
+    def of(schedule):
+        return getattr(schedule, 'version', 0)
+
+    @staticmethod
+    def bump(schedule):
+        if not isinstance(schedule, VersionedSchedule):
+            raise ValueError('only a VersionedSchedule keeps count of its changes')
+        schedule.version += 1
+
+
+class VersionedSchedule(dict):
+    # The schedule dict a Schedule holds: a plain dict (and saved as one) that also carries its ScheduleVersion
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+
+
+class ProjectionCache:
+    # Memoized win total projections for one team, keyed on (kind, resolved S&P+ date, schedule version)
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        try:
+            value = self.entries[key]
+            self.hits += 1
+        except KeyError:
+            self.misses += 1
+            value = self.entries[key] = compute()
+        return value
+
+    def clear(self):
+        self.entries = {}
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries)}
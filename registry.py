@@ -0,0 +1,85 @@
+import time
+
+from history import RatingHistory
+from probability import WinProbabilityEngine
+from team import Team
+
+
+class TeamRegistry:
+    # Owns a loaded schedule and builds each Team at most once per run.
+    # Conferences, Clusters and the driver functions ask the registry for their teams instead of building their own,
+    # so a school drawn in its conference graph, the P5 or G5 cluster, the FBS cluster and its own team graph is the
+    # same object with the same (already computed) projections every time.
+    def __init__(self, schedule, history=None, teams=None):
+        """
+        :param schedule: the schedule dict
+        :param history: a RatingHistory for the schedule; parsed here if not given
+        :param teams: teams to build up front, together, so they share one WinProbabilityEngine
+        """
+        self.schedule = schedule
+        if history is None:
+            history = RatingHistory(schedule)
+        self.history = history
+
+        # Conference and division membership, in schedule order, from one pass over the schedule
+        self.position = {x: i for i, x in enumerate(schedule)}
+        self.conferences = {}
+        self.divisions = {}
+        for x in schedule:
+            conference = schedule[x]['conference']
+            self.conferences.setdefault(conference, []).append(x)
+            self.divisions.setdefault((conference, schedule[x].get('division', 'none')), []).append(x)
+
+        self.engines = []
+        self._teams = {}
+        self.requests = 0
+        self.seconds = 0.0
+
+        if teams:
+            self.teams(teams)
+
+    def __contains__(self, team):
+        return team in self._teams
+
+    def members(self, conferences):
+        """Return (list) of the teams in any of the conferences given, in schedule order."""
+        members = [x for c in set(conferences) for x in self.conferences.get(c, [])]
+        return sorted(members, key=self.position.get)
+
+    def engine(self, names):
+        """Return (WinProbabilityEngine) holding exactly the teams given, building it only the first time."""
+        for engine in self.engines:
+            if set(engine.teams) == set(names):
+                return engine
+        engine = WinProbabilityEngine(schedule=self.schedule, teams=list(names), history=self.history)
+        self.engines.append(engine)
+        return engine
+
+    def teams(self, names):
+        """Return (list) of the Team for each name, building the ones not seen before together."""
+        names = list(names)
+        missing = [x for x in names if x not in self._teams]
+        if missing:
+            start = time.perf_counter()
+            engine = self.engine(missing)
+            for x in missing:
+                self._teams[x] = Team(name=x, schedule=self.schedule, engine=engine)
+            self.seconds += time.perf_counter() - start
+        self.requests += len(names)
+        return [self._teams[x] for x in names]
+
+    def team(self, name):
+        return self.teams([name])[0]
+
+    def stats(self):
+        """Return (dict) of how many Teams were asked for, how many were built and the build time that was avoided."""
+        built = len(self._teams)
+        reused = self.requests - built
+        per_team = self.seconds / built if built else 0.0
+        return {'requests': self.requests, 'built': built, 'reused': reused, 'engines': len(self.engines),
+                'seconds': self.seconds, 'seconds avoided': reused * per_team}
+
+    def report(self):
+        stats = self.stats()
+        return '{} teams requested, {} built ({:.2f}s), {} reused (about {:.2f}s avoided)'.format(
+            stats['requests'], stats['built'], stats['seconds'], stats['reused'], stats['seconds avoided'])
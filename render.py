@@ -0,0 +1,235 @@
+import collections
+import multiprocessing
+import multiprocessing.connection
+import os
+import time
+import traceback
+
+from cluster import Cluster
+from conference import Conference
+from graph import Graph
+
+
+class GraphJob:
+    # One graph to draw: a graph method of a team, a conference or a cluster of conferences, and what to pass it.
+    # A job is only a description, so it is cheap to send to a worker, which builds the Conference or Cluster there
+    # from its own copy of the registry.
+    KINDS = ('team', 'conference', 'cluster')
+
+    __slots__ = ('kind', 'name', 'graph', 'members', 'options')
+
+    def __init__(self, kind, name, graph, members=None, **options):
+        """
+        :param kind: 'team', 'conference' or 'cluster'
+        :param name: the team or conference; for a cluster, just its name
+        :param graph: the graph method to call, e.g. 'make_standings_projection_graph'
+        :param members: for a cluster, the conferences in it
+        :param options: passed on to the graph method
+        """
+        if kind not in GraphJob.KINDS:
+            raise ValueError('unknown graph job kind {}'.format(kind))
+        self.kind = kind
+        self.name = name
+        self.graph = graph
+        self.members = members
+        self.options = options
+
+    def __str__(self):
+        return '{} {} {}'.format(self.kind, self.name, self.graph)
+
+    def run(self, schedule, registry):
+        if self.kind == 'team':
+            target = registry.team(self.name)
+        elif self.kind == 'conference':
+            target = Conference(name=self.name, schedule=schedule, registry=registry)
+        else:
+            target = Cluster(schedule=schedule, teams=registry.members(self.members), registry=registry)
+        getattr(target, self.graph)(**self.options)
+
+
+class GraphReport:
+    # How a GraphJob went: 'ok', 'failed' (with the error and where it was raised) or 'timeout'
+    __slots__ = ('job', 'status', 'seconds', 'error', 'traceback')
+
+    def __init__(self, job, status, seconds=0.0, error=None, traceback=None):
+        self.job = job
+        self.status = status
+        self.seconds = seconds
+        self.error = error
+        self.traceback = traceback
+
+    @property
+    def ok(self):
+        return self.status == 'ok'
+
+    def __str__(self):
+        text = '{} {} ({:.1f}s)'.format(self.status, self.job, self.seconds)
+        if self.error:
+            text += ': ' + self.error
+        return text
+
+
+class RenderScheduler:
+    # Draws a list of GraphJobs on a set of worker processes.
+    # The projections are worked out once, in this process, before any graph is drawn: each worker gets the schedule
+    # and the registry, with every Team already built, once when it starts (shared copy-on-write where processes are
+    # forked), and only reads them. Workers are handed one job at a time, so the scheduler always knows which job
+    # each one is running and since when. Each job's outcome comes back as a GraphReport, in the order the jobs were
+    # given, so one failed graph doesn't stop the others. A job running longer than the timeout is reported as such
+    # and only its worker is stopped and replaced; so is one whose worker dies under it (e.g. out of memory).
+    def __init__(self, schedule, registry, workers=None, timeout=None, progress=None):
+        """
+        :param schedule: the schedule dict
+        :param registry: the TeamRegistry the graphs draw their teams from
+        :param workers: the number of worker processes; defaults to one per core. With 1, the jobs run here, one
+            after another, and the timeout isn't enforced.
+        :param timeout: seconds a single job may run for, or None for no limit
+        :param progress: called with (report, jobs done, jobs in all) as each job finishes
+        """
+        self.schedule = schedule
+        self.registry = registry
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.progress = progress
+
+    @staticmethod
+    def print_progress(report, done, total):
+        print('[{}/{}] {}'.format(done, total, report))
+
+    def run(self, jobs):
+        """Return (list) of a GraphReport for each job, in the same order."""
+        jobs = list(jobs)
+        reports = [None] * len(jobs)
+        if self.workers < 2 or len(jobs) < 2:
+            for i, job in enumerate(jobs):
+                reports[i] = _render(job, self.schedule, self.registry)
+                self._done(reports, i)
+            return reports
+
+        # Graph's class settings (the sprite sheet, compact or compressed output) go to the workers as well
+        context = {'schedule': self.schedule, 'registry': self.registry,
+                   'graph': {x: getattr(Graph, x) for x in ('sprite', 'compact', 'precision', 'compress')}}
+        waiting = collections.deque(range(len(jobs)))
+        workers = [_Worker(context) for _ in range(min(self.workers, len(jobs)))]
+        try:
+            while waiting or any(x.job is not None for x in workers):
+                for worker in workers:
+                    if worker.job is None and waiting:
+                        i = waiting.popleft()
+                        worker.submit(i, jobs[i])
+                busy = [x for x in workers if x.job is not None]
+                multiprocessing.connection.wait([x.connection for x in busy] + [x.process.sentinel for x in busy],
+                                                timeout=1.0 if self.timeout else None)
+                now = time.monotonic()
+                for k, worker in enumerate(workers):
+                    i = worker.job
+                    if i is None:
+                        continue
+                    report = worker.result()
+                    if report is not None:
+                        worker.job = None
+                    elif not worker.process.is_alive():
+                        report = GraphReport(jobs[i], 'failed', now - worker.started,
+                                             error='the worker process exited with code {}'.format(
+                                                 worker.process.exitcode))
+                    elif self.timeout and now - worker.started > self.timeout:
+                        report = GraphReport(jobs[i], 'timeout', now - worker.started,
+                                             error='still running after {}s'.format(self.timeout))
+                    else:
+                        continue
+                    reports[i] = report
+                    self._done(reports, i)
+                    if worker.job is not None:
+                        # stuck or gone; a fresh worker takes its place
+                        worker.stop()
+                        workers[k] = _Worker(context)
+        finally:
+            for worker in workers:
+                worker.close()
+        return reports
+
+    def _done(self, reports, i):
+        if self.progress is not None:
+            self.progress(reports[i], sum(x is not None for x in reports), len(reports))
+
+    @staticmethod
+    def failures(reports):
+        """Return (list) of the reports of the jobs that didn't draw their graph."""
+        return [x for x in reports if not x.ok]
+
+
+class _Worker:
+    # One worker process, fed one job at a time over its own pipe
+    def __init__(self, context):
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_serve, args=(child, context), daemon=True)
+        self.process.start()
+        child.close()
+        self.job = None
+        self.started = None
+
+    def submit(self, i, job):
+        self.connection.send(job)
+        self.job = i
+        self.started = time.monotonic()
+
+    def result(self):
+        # the finished job's GraphReport, or None if it hasn't finished (or never will)
+        try:
+            if self.connection.poll():
+                return self.connection.recv()
+        except (EOFError, OSError):
+            pass
+        return None
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join()
+        self.connection.close()
+
+    def close(self):
+        # an idle worker is asked to finish; one still busy is stopped
+        if self.job is None and self.process.is_alive():
+            try:
+                self.connection.send(None)
+            except OSError:
+                pass
+            self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.connection.close()
+
+
+def _render(job, schedule, registry):
+    start = time.perf_counter()
+    try:
+        job.run(schedule, registry)
+    except Exception as error:
+        return GraphReport(job, 'failed', time.perf_counter() - start, '{}: {}'.format(type(error).__name__, error),
+                           traceback.format_exc())
+    return GraphReport(job, 'ok', time.perf_counter() - start)
+
+
+# Set up once in each worker process by _attach
+_worker = {}
+
+
+def _attach(context):
+    _worker['schedule'] = context['schedule']
+    _worker['registry'] = context['registry']
+    for key, value in context['graph'].items():
+        setattr(Graph, key, value)
+
+
+def _serve(connection, context):
+    # a worker's loop: draw each job sent until told to stop (None) or the scheduler goes away
+    _attach(context)
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        connection.send(_render(job, _worker['schedule'], _worker['registry']))
@@ -1,98 +1,136 @@
 import csv
-import json
 
 from cluster import Cluster
-from conference import Conference
 from defs import FBS, PFIVE, GFIVE
-from team import Team
+from graph import Graph, LogoSprite
+from history import RatingHistory
+from journal import ScheduleJournal
+from logos import LogoStore
+from registry import TeamRegistry
+from render import GraphJob, RenderScheduler
+
+# the color scales every graph is made in, unless one is asked for
+SCALES = ['team', 'red-green', 'red-blue']
+# worker processes for the graphs (None for one per core) and the seconds any one graph may take
+WORKERS = None
+TIMEOUT = 600
+
+
+def load_schedule(sprite=None):
+    # with any changes logged since schedule.json was last written
+    global schedule
+    schedule = ScheduleJournal('schedule.json').load()
+    # logos moved to the store next to schedule.json (Schedule.externalize_logos) are only decoded for the graphs
+    # that draw them
+    LogoStore.beside('schedule.json').attach(schedule)
+
+    # parse every S&P+ history once, up front
+    global history
+    history = RatingHistory(schedule)
+
+    # every FBS team is built once, here, and shared by all of the graphs
+    global registry
+    registry = TeamRegistry(schedule, history=history,
+                            teams=[x for x in schedule if schedule[x]['conference'] in FBS])
+
+    # optionally, one sprite sheet at the path given holds every logo and the graphs link to it instead of embedding
+    if sprite:
+        Graph.sprite = LogoSprite(sprite)
+        Graph.sprite.add_schedule(schedule)
+        Graph.sprite.write()
+
+
+def render(jobs):
+    """Draw the graphs on every core; return (list) of a GraphReport for each, after printing any that failed."""
+    scheduler = RenderScheduler(schedule, registry, workers=WORKERS, timeout=TIMEOUT)
+    reports = scheduler.run(jobs)
+    for report in RenderScheduler.failures(reports):
+        print(report)
+    return reports
+
+
+def cluster_jobs(absolute=False, old=None, scale=None, week=-1, order='winexp'):
+    groups = {'fbs': FBS, 'pfive': PFIVE, 'gfive': GFIVE, 'independent': ['FBS Independents']}
+    return [GraphJob('cluster', cluster, 'make_standings_projection_graph', members=groups[cluster], method='sp+',
+                     absolute=absolute, old=old, file=cluster, scale=scale or SCALES, week=week, order=order)
+            for cluster in groups]
 
 
-def load_schedule():
-    with open("schedule.json", "r", encoding='utf8') as file:
-        global schedule
-        schedule = json.load(file)
+def conf_jobs(absolute=False, old=None, scale=None, week=-1, order='winexp'):
+    return [GraphJob('conference', conference, 'make_standings_projection_graph', absolute=absolute, method='sp+',
+                     file=conference, old=old, scale=scale or SCALES, week=week, order=order)
+            for conference in PFIVE + GFIVE]
 
 
-def make_cluster_graphs(absolute=False, old=None, scale=None, week=-1, order='winexp'):
-    groups = {'fbs': FBS, 'pfive': PFIVE, 'gfive': GFIVE, 'independent': ['FBS Independents']}
-    for cluster in groups:
-        current = Cluster(schedule=schedule,
-                          teams=[x for x in schedule if schedule[x]['conference'] in groups[cluster]])
+def team_jobs(old=True, scale=None, week=-1):
+    jobs = []
+    for team in registry.members(FBS):
         if not scale:
-            for color in ['team', 'red-green', 'red-blue']:
-                current.make_standings_projection_graph(method='sp+', absolute=absolute, old=old, file=cluster,
-                                                        scale=color, week=week, order=order)
+            jobs.append(GraphJob('team', team, 'make_win_probability_graph', absolute=False, file=team, old=old,
+                                 scale=SCALES, method='sp+', week=week))
         else:
-            current.make_standings_projection_graph(method='sp+', absolute=absolute, old=old, file=cluster, scale=scale,
-                                                    week=week, order=order)
+            jobs.append(GraphJob('team', team, 'make_win_probability_graph', absolute=False, file=team, old=old,
+                                 scale=scale, method='sp+'))
+    return jobs
 
 
-def make_conf_graphs(absolute=False, old=None, scale=None, week=-1, order='winexp'):
-    for conference in PFIVE + GFIVE:
-        conf = Conference(name=conference, schedule=schedule)
+def retrospective_jobs(old=None, scale=None):
+    jobs = []
+    for team in registry.members(FBS):
         if not scale:
-            for color in ['team', 'red-green', 'red-blue']:
-                try:
-                    conf.make_standings_projection_graph(absolute=absolute, method='sp+', file=conference, old=old,
-                                                         scale=color, week=week, order=order)
-                except KeyError:
-                    print('problem with {}'.format(conf))
+            for color in SCALES:
+                jobs.append(GraphJob('team', team, 'make_retrospective_projection_graph', absolute=False, file=team,
+                                     scale=color, method='sp+'))
         else:
-            try:
-                conf.make_standings_projection_graph(absolute=absolute, method='sp+', file=conference, old=old,
-                                                     scale=scale, week=week, order=order)
-            except KeyError:
-                print('problem with {}'.format(conf))
+            jobs.append(GraphJob('team', team, 'make_win_probability_graph', absolute=False, file=team, scale=scale,
+                                 method='sp+'))
+    return jobs
+
+
+def make_cluster_graphs(absolute=False, old=None, scale=None, week=-1, order='winexp'):
+    return render(cluster_jobs(absolute=absolute, old=old, scale=scale, week=week, order=order))
+
+
+def make_conf_graphs(absolute=False, old=None, scale=None, week=-1, order='winexp'):
+    return render(conf_jobs(absolute=absolute, old=old, scale=scale, week=week, order=order))
 
 
 def make_team_graphs(old=True, scale=None, week=-1):
-    for team in schedule:
-        if schedule[team]['conference'] in FBS:
-            val = Team(name=team, schedule=schedule)
-            if not scale:
-                for color in ['team', 'red-green', 'red-blue']:
-                    val.make_win_probability_graph(absolute=False, file=team, old=old, scale=color, method='sp+',
-                                                   week=week)
-            else:
-                val.make_win_probability_graph(absolute=False, file=team, old=old, scale=scale, method='sp+')
+    return render(team_jobs(old=old, scale=scale, week=week))
 
 
 def make_retrospective_graphs(old=None, scale=None):
-    for team in schedule:
-        if schedule[team]['conference'] in FBS:
-            val = Team(name=team, schedule=schedule)
-            if not scale:
-                for color in ['team', 'red-green', 'red-blue']:
-                    val.make_retrospective_projection_graph(absolute=False, file=team, scale=color, method='sp+')
-            else:
-                val.make_win_probability_graph(absolute=False, file=team, scale=scale, method='sp+')
+    return render(retrospective_jobs(old=old, scale=scale))
 
 
 def export_retrospective_data():
     wins = ['0 wins', '1 win']
     wins.extend([str(x) + ' wins' for x in range(2, 13)])
     data = [['Team', 'Date', 'S&P+', *wins]]
-    for team in schedule:
-        if schedule[team]['conference'] in FBS:
-            data.extend(Team(name=team, schedule=schedule).export_retrospective_data())
+    for team in registry.teams(registry.members(FBS)):
+        data.extend(team.export_retrospective_data())
     with open('retrospective.csv', 'w+', newline='') as file:
         cw = csv.writer(file)
         for row in data:
             cw.writerow(row)
 
 
-load_schedule()
+if __name__ == '__main__':
+    # the worker processes import this module too, and mustn't run the whole script again
+    load_schedule()
+
+    groups = {'fbs': FBS, 'pfive': PFIVE, 'gfive': GFIVE, 'independent': ['FBS Independents']}
 
-groups = {'fbs': FBS, 'pfive': PFIVE, 'gfive': GFIVE, 'independent': ['FBS Independents']}
+    current = Cluster(schedule=schedule, teams=registry.members(FBS), registry=registry)
+    current.write_schedule_swap_matrix()
+    current.rank_schedules(spplus=current.get_avg_spplus(0, 25), txtoutput=True)
+    current.make_schedule_ranking_graph(spplus=['top5', 'average'])
 
-current = Cluster(schedule=schedule, teams=[x for x in schedule if schedule[x]['conference'] in FBS])
-current.write_schedule_swap_matrix()
-current.rank_schedules(spplus=current.get_avg_spplus(0, 25), txtoutput=True)
-current.make_schedule_ranking_graph(spplus='top5')
-current.make_schedule_ranking_graph(spplus='average')
+    # every graph is independent of the others, so they all go to the pool together
+    render(conf_jobs(scale='red-green', old=True, week=-1, order='sp+') +
+           cluster_jobs(scale='red-green', old=True, week=-1, order='sp+') +
+           conf_jobs(scale='red-green', old=True, week=-1, order='winexp') +
+           cluster_jobs(scale='red-green', old=True, week=-1, order='winexp') +
+           team_jobs(scale='red-green', old=True, week=-1))
 
-make_conf_graphs(scale='red-green', old=True, week=-1, order='sp+')
-make_cluster_graphs(scale='red-green', old=True, week=-1, order='sp+')
-make_conf_graphs(scale='red-green', old=True, week=-1, order='winexp')
-make_cluster_graphs(scale='red-green', old=True, week=-1, order='winexp')
-make_team_graphs(scale='red-green', old=True, week=-1)
+    print(registry.report())
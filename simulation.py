@@ -0,0 +1,158 @@
+import numpy as np
+
+
+class SeasonSimulator:
+    # Simulates whole seasons for a group of teams at once.
+    # Every game is drawn once per simulation, so when two of the teams play each other exactly one of them wins.
+    # Seasons are drawn in chunks as a (simulations x games) array of outcomes and handed to reducers, which keep
+    # running totals; nothing the size of the full run is ever held in memory.
+    def __init__(self, engine, dates, seed=None, chunk=20000):
+        """
+        :param engine: a WinProbabilityEngine holding every team to simulate
+        :param dates: dict of team name -> the S&P+ date whose win probabilities are used for that team
+        :param seed: seed for the random number generator; the same seed gives the same seasons for any chunk size
+        :param chunk: how many seasons to draw at a time
+        """
+        self.engine = engine
+        self.teams = list(engine.teams)
+        self.chunk = chunk
+        self.rng = np.random.default_rng(seed)
+
+        # One column per distinct game. A game between two of the teams is shared, and drawn with the probability
+        # of the team listed first; its opponent gets the other side of the same draw.
+        home, away, slots, probabilities = [], [], [], []
+        seen = set()
+        for i, team in enumerate(self.teams):
+            vec = engine.vector(team, dates[team])
+            for g, game in enumerate(engine.games[i]):
+                j = self._shared(team, game)
+                if j is not None and (str(game['id']), j) in seen:
+                    continue
+                if j is not None:
+                    seen.add((str(game['id']), i))
+                home.append(i)
+                away.append(-1 if j is None else j)
+                slots.append(g)
+                probabilities.append(vec[g])
+
+        self.home = np.array(home, dtype=np.int64)
+        self.away = np.array(away, dtype=np.int64)
+        self.slots = np.array(slots, dtype=np.int64)
+        self.probabilities = np.array(probabilities, dtype=float)
+
+        # wins = outcomes @ incidence + base: a game adds a win to the first team when drawn as 1, else to the second
+        n_games, n_teams = len(self.home), len(self.teams)
+        self.incidence = np.zeros((n_games, n_teams), dtype=np.float32)
+        self.incidence[np.arange(n_games), self.home] = 1
+        shared = self.away >= 0
+        self.incidence[np.nonzero(shared)[0], self.away[shared]] = -1
+        self.base = np.bincount(self.away[shared], minlength=n_teams).astype(np.int64)
+        self.games_played = np.array([len(x) for x in engine.games], dtype=np.int64)
+
+    def _shared(self, team, game):
+        # index of the opponent if it is one of the teams and has the same game on its schedule, else None
+        j = self.engine.index.get(game['opponent'])
+        if j is None or 'id' not in game or self.engine.game_index.find(game['id'], game['opponent']) is None:
+            return None
+        return j
+
+    def draw(self, n):
+        """Return (numpy array) of n simulated seasons: True where the first team listed for the game won it."""
+        return self.rng.random((n, len(self.probabilities))) < self.probabilities
+
+    def wins(self, outcomes):
+        """Return (numpy array) of (simulations x teams) win totals for a block of outcomes."""
+        return (outcomes.astype(np.float32) @ self.incidence).astype(np.int64) + self.base
+
+    def run(self, n, reducers):
+        """
+        Simulate n seasons, feeding each chunk to every reducer.
+        :param reducers: objects with an update(simulator, outcomes, wins) method
+        :return: the reducers
+        """
+        done = 0
+        while done < n:
+            size = min(self.chunk, n - done)
+            outcomes = self.draw(size)
+            wins = self.wins(outcomes)
+            for reducer in reducers:
+                reducer.update(self, outcomes, wins)
+            done += size
+        return reducers
+
+
+class RecordCounts:
+    # How often each team finished with each number of wins
+    def __init__(self):
+        self.counts = None
+        self.n = 0
+
+    def update(self, simulator, outcomes, wins):
+        if self.counts is None:
+            self.counts = np.zeros((len(simulator.teams), simulator.games_played.max() + 1), dtype=np.int64)
+        for i in range(wins.shape[1]):
+            self.counts[i] += np.bincount(wins[:, i], minlength=self.counts.shape[1])
+        self.n += len(wins)
+
+    def result(self, simulator):
+        """Return (dict) of team -> distribution over season win totals."""
+        return {x: (self.counts[i, :simulator.games_played[i] + 1] / self.n).tolist()
+                for i, x in enumerate(simulator.teams)}
+
+
+class RankCounts:
+    # How often each team finished in each position of a group (e.g. a conference or division) by total wins.
+    # Teams with the same number of wins share the better position.
+    def __init__(self, groups):
+        """:param groups: dict of group name -> list of team names"""
+        self.groups = groups
+        self.counts = {}
+        self.n = 0
+
+    def update(self, simulator, outcomes, wins):
+        for name, members in self.groups.items():
+            idx = [simulator.engine.index[x] for x in members]
+            w = wins[:, idx].astype(np.int64)
+            # position = the number of teams in the group with more wins. Each season's wins are offset past the
+            # last season's, so one flat sort orders every season at once and a search counts the teams at or
+            # below each team; nothing bigger than the wins themselves is built.
+            n = len(idx)
+            key = w + (np.arange(len(w), dtype=np.int64) * (w.max(initial=0) + 1))[:, None]
+            at_or_below = np.searchsorted(np.sort(key, axis=None), key, side='right') - n * np.arange(len(w))[:, None]
+            rank = n - at_or_below
+            counts = self.counts.setdefault(name, np.zeros((len(idx), len(idx)), dtype=np.int64))
+            for k in range(len(idx)):
+                counts[k] += np.bincount(rank[:, k], minlength=len(idx))
+        self.n += len(wins)
+
+    def result(self, simulator):
+        """Return (dict) of group -> {team -> probability of finishing in each position}."""
+        return {name: {x: (self.counts[name][k] / self.n).tolist() for k, x in enumerate(members)}
+                for name, members in self.groups.items()}
+
+
+class Standings:
+    # Mean and spread of the simulated win totals, and how often each team had the most wins of all the teams
+    def __init__(self):
+        self.total = None
+        self.squares = None
+        self.first = None
+        self.n = 0
+
+    def update(self, simulator, outcomes, wins):
+        if self.total is None:
+            self.total = np.zeros(wins.shape[1])
+            self.squares = np.zeros(wins.shape[1])
+            self.first = np.zeros(wins.shape[1], dtype=np.int64)
+        self.total += wins.sum(axis=0)
+        self.squares += (wins.astype(float) ** 2).sum(axis=0)
+        self.first += (wins == wins.max(axis=1, keepdims=True)).sum(axis=0)
+        self.n += len(wins)
+
+    def result(self, simulator):
+        """Return (list) of [team, mean wins, standard deviation, probability of (a share of) the most wins]."""
+        mean = self.total / self.n
+        std = np.sqrt(np.maximum(self.squares / self.n - mean ** 2, 0))
+        table = [[x, mean[i], std[i], self.first[i] / self.n] for i, x in enumerate(simulator.teams)]
+        table.sort(key=lambda y: y[1], reverse=True)
+        return table
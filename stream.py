@@ -0,0 +1,157 @@
+import json
+
+from journal import ScheduleJournal
+from logos import LogoStore
+
+
+class ScheduleStream:
+    # Reads a schedule json file one team at a time instead of parsing the whole file into memory.
+    # Only one team's record (plus a block of the file) is held while reading, so a job that needs one conference,
+    # a handful of teams or a few fields builds just that much of the schedule. Iterating yields (name, record) for
+    # each wanted team in file order; load() builds a partial schedule dict from them. Each record comes with the
+    # changes logged in the file's ScheduleJournal already applied.
+    def __init__(self, file, conferences=None, teams=None, fields=None, skip=(), opponents=True, chunk=1 << 20):
+        """
+        :param file: the schedule json file
+        :param conferences: only the teams in these conferences (default: every conference)
+        :param teams: only these teams (default: every team); with conferences, a team in either is wanted
+        :param fields: keep only these fields of each team (default: every field)
+        :param skip: drop these fields of each team, e.g. ('logoURI', 'rankings')
+        :param opponents: when loading, also keep the opponents of the wanted teams, without their own games, so the
+            ratings and conferences the projections look up are there. Their scores are kept as 'scores', a dict of
+            game id -> score breakdown.
+        :param chunk: (int) characters read from the file at a time
+        """
+        self.file = file
+        self.conferences = set(conferences) if conferences is not None else None
+        self.teams = set(teams) if teams is not None else None
+        self.fields = set(fields) if fields is not None else None
+        self.skip = set(skip)
+        self.opponents = opponents
+        self.chunk = chunk
+
+    def wanted(self, name, record):
+        """Return (bool) whether the team passes the conference and team filters."""
+        if self.conferences is None and self.teams is None:
+            return True
+        return (self.teams is not None and name in self.teams) or \
+               (self.conferences is not None and record.get('conference') in self.conferences)
+
+    def trim(self, record):
+        """Return (dict) the record with only the fields asked for, in their original order."""
+        return {k: v for k, v in record.items() if (self.fields is None or k in self.fields) and k not in self.skip}
+
+    def __iter__(self):
+        for name, record in self.records():
+            if self.wanted(name, record):
+                yield name, self.trim(record)
+
+    def records(self):
+        """Yield (name, record) for every team in the file, in file order, unfiltered, with its logged changes."""
+        journal = ScheduleJournal(self.file)
+        changes = journal.changes()
+        with open(self.file, 'r', encoding='utf8') as infile:
+            reader = _Reader(infile, self.chunk)
+            reader.expect('{')
+            if reader.peek() == '}':
+                return
+            while True:
+                name = reader.value()
+                reader.expect(':')
+                record = reader.value()
+                if name in changes:
+                    journal.replay({name: record}, changes[name])
+                yield name, record
+                if reader.next() == '}':
+                    return
+                reader.back()
+                reader.expect(',')
+
+    def load(self):
+        """
+        Return (dict) the partial schedule: the wanted teams, plus (with opponents) their opponents minus their games
+        (but with their scores).
+        Teams with a 'logoHash' read their logos from the store next to the file, as a full load does.
+        """
+        schedule = {}
+        others = {}
+        for name, record in self.records():
+            if self.wanted(name, record):
+                schedule[name] = self.trim(record)
+            elif self.opponents:
+                # only the summary is kept; most of a record is its games. Their scores stay, by game id, so the
+                # games of the wanted teams still have both sides of the score
+                games = record.pop('schedule', None) or []
+                others[name] = self.trim(record)
+                others[name]['scores'] = {str(g['id']): g['scoreBreakdown'] for g in games
+                                          if 'id' in g and 'scoreBreakdown' in g}
+
+        if self.opponents:
+            needed = set(g['opponent'] for x in schedule for g in schedule[x].get('schedule', []))
+            for name in others:
+                if name in needed and name not in schedule:
+                    schedule[name] = others[name]
+
+        LogoStore.beside(self.file).attach(schedule)
+        return schedule
+
+
+class _Reader:
+    # A window onto a json file, refilled a chunk at a time; decodes one value at a time with the stdlib decoder.
+    WHITESPACE = ' \t\n\r'
+
+    def __init__(self, infile, chunk):
+        self.infile = infile
+        self.chunk = chunk
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        # drop what has been read and append the next chunk
+        data = self.infile.read(self.chunk)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position:] + data
+        self.position = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in _Reader.WHITESPACE:
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._fill():
+                raise ValueError('unexpected end of schedule file')
+
+    def next(self):
+        c = self.peek()
+        self.position += 1
+        return c
+
+    def back(self):
+        self.position -= 1
+
+    def expect(self, c):
+        found = self.next()
+        if found != c:
+            raise ValueError('expected {!r} in schedule file, found {!r}'.format(c, found))
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                # most likely cut off at the end of the window; a real error is raised again once the file is read
+                if self.eof or not self._fill():
+                    raise
+                continue
+            if end == len(self.buffer) and not self.eof and self._fill():
+                # a number may continue into the next chunk
+                continue
+            self.position = end
+            return value
@@ -0,0 +1,56 @@
+import numpy as np
+
+from distribution import WinTotalEngine
+from probability import WinProbabilityEngine
+from utils import Utils
+
+
+class StrengthOfScheduleEngine:
+    # How would a team with a given S&P+ rating fare against each schedule?
+    # Any number of reference ratings (a grid, the average of the top 25, ...) are evaluated together as one
+    # (reference x team x game) array. Nothing on the Teams or in the schedule is modified.
+    def __init__(self, engine, references, dates=None, when=None):
+        """
+        :param engine: a WinProbabilityEngine holding the teams whose schedules are ranked
+        :param references: the S&P+ ratings to evaluate each schedule with
+        :param dates: dict of team name -> the date to rate that team's opponents as of
+        :param when: a single date to rate every opponent as of, used if dates is not given
+        """
+        self.engine = engine
+        self.teams = list(engine.teams)
+        self.references = np.atleast_1d(np.asarray(references, dtype=float))
+
+        if dates is not None:
+            ordinals = Utils.dates_to_ordinals([dates[x] for x in self.teams])
+        else:
+            ordinals = np.full(len(self.teams), Utils.date_to_ordinal(when), dtype=np.int64)
+
+        # The opponents on each schedule, rated as of the team's date
+        # Note there might be a misalignment between the S&P+ value dates for different teams, especially FCS teams
+        opp, found = engine.history.ratings_as_of(engine.opponents, ordinals[:, None])
+        if np.any(engine.game_mask & ~found):
+            t, g = [x[0] for x in np.nonzero(engine.game_mask & ~found)]
+            raise ValueError('{} has no S&P+ value on or before the date used for {}'.format(
+                engine.games[t][g]['opponent'], self.teams[t]))
+
+        # Who has the 2.5 point home field advantage? The engine already knows.
+        self.probabilities = WinProbabilityEngine.probability(self.references[:, None, None], opp[None, :, :],
+                                                              engine.offsets[None, :, :])
+        self.totals = WinTotalEngine(self.probabilities, mask=np.broadcast_to(engine.game_mask,
+                                                                              self.probabilities.shape),
+                                     keep_steps=False)
+
+    def win_probabilities(self, team, reference=0):
+        """Return (list) the game by game win probabilities of the reference team on this team's schedule."""
+        i = self.engine.index[team]
+        return self.probabilities[reference, i, :len(self.engine.games[i])].tolist()
+
+    def distribution(self, team, reference=0):
+        """Return (list) the distribution of season win totals of the reference team on this team's schedule."""
+        i = self.engine.index[team]
+        return self.totals.final((reference, i), len(self.engine.games[i]))
+
+    def curves(self):
+        """Return (dict) of team -> expected wins on its schedule for every reference rating."""
+        xw = self.totals.expected_wins()
+        return {x: xw[:, i] for i, x in enumerate(self.teams)}
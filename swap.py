@@ -0,0 +1,157 @@
+import math
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from distribution import WinTotalEngine
+from history import RatingHistory
+from probability import WinProbabilityEngine
+from utils import Utils
+
+
+class ScheduleSwapEngine:
+    # Expected wins for every team playing every other team's schedule.
+    # Each schedule is reduced once to its opponents, home field offsets, dates and results (all taken from the
+    # WinProbabilityEngine), so a swap is just a different pairing of ratings and schedules: nothing in the schedule
+    # dict is touched and no Team objects are built.
+    def __init__(self, engine, dates):
+        """
+        :param engine: a WinProbabilityEngine holding every team in the swap
+        :param dates: dict of team name -> the S&P+ date to project that team from
+        """
+        self.engine = engine
+        self.teams = list(engine.teams)
+        rows = [engine.index[x] for x in self.teams]
+        cols = [engine.date_index[i][dates[x]] for i, x in zip(rows, self.teams)]
+
+        # Everything the computation needs, as plain arrays that never change once built
+        self.snapshot = {'ratings': engine.ratings[rows, cols],
+                         'ordinals': engine.date_ordinals[rows, cols],
+                         'opponents': engine.opponents,
+                         'offsets': engine.offsets,
+                         'start_ordinals': engine.start_ordinals,
+                         'results': engine.results,
+                         'game_mask': engine.game_mask,
+                         'played': engine.game_mask & Utils.is_past(engine.start_ordinals, engine.now)}
+        self.snapshot.update(engine.history.arrays())
+
+    def _check(self, missing):
+        if missing is not None:
+            r, t, g = missing
+            raise ValueError('{} has no S&P+ value on or before the date used for {}'.format(
+                self.engine.games[t][g]['opponent'], self.teams[r]))
+
+    def expected_wins(self, rows=None, workers=None):
+        """
+        Return (numpy array) where [i, j] is the expected wins of team rows[i] playing team j's schedule.
+        :param rows: indexes of the teams (rows of the matrix) to compute; defaults to every team
+        :param workers: if more than 1, split the rows into blocks and compute them on a process pool
+        """
+        if rows is None:
+            rows = np.arange(len(self.teams))
+        rows = np.asarray(rows, dtype=np.int64)
+
+        if not workers or workers < 2 or len(rows) < 2:
+            xw, missing = swap_block(self.snapshot, rows)
+            self._check(missing)
+            return xw
+
+        # A few blocks per worker keeps them all busy when some rows are more expensive than others
+        size = max(1, math.ceil(len(rows) / (4 * workers)))
+        blocks = [rows[i:i + size] for i in range(0, len(rows), size)]
+
+        shared = SharedSnapshot(self.snapshot)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(shared.spec,)) as pool:
+                # map() hands the blocks back in submission order, so the merge is deterministic
+                results = list(pool.map(_shared_block, blocks))
+        finally:
+            shared.release()
+
+        for xw, missing in results:
+            self._check(missing)
+        return np.concatenate([xw for xw, missing in results], axis=0)
+
+    def matrix(self, rows=None, workers=None):
+        """Return (dict) of team -> {team -> expected wins on the other schedule / expected wins on its own}."""
+        if rows is None:
+            rows = range(len(self.teams))
+        rows = list(rows)
+        xw = self.expected_wins(rows, workers=workers)
+        data = {}
+        for k, i in enumerate(rows):
+            A = self.teams[i]
+            data[A] = {B: xw[k, j] / xw[k, i] for j, B in enumerate(self.teams)}
+            data[A][A] = 1
+        return data
+
+
+def swap_block(snapshot, rows):
+    """
+    Expected wins of the given teams on every schedule in the snapshot.
+    :return: (expected wins, missing) where missing is the first (row, schedule, game) whose opponent has no S&P+
+             value early enough, or None
+    """
+    ordinals = snapshot['ordinals'][rows][:, None, None]
+    game_mask = snapshot['game_mask']
+
+    # The opponents on each schedule, rated as of the date the row team is projected from
+    opp, found = RatingHistory.lookup(snapshot, snapshot['opponents'][None, :, :], ordinals)
+    valid = np.broadcast_to(game_mask[None, :, :], opp.shape)
+    missing = None
+    if np.any(valid & ~found):
+        r, t, g = [int(x[0]) for x in np.nonzero(valid & ~found)]
+        missing = (int(rows[r]), t, g)
+
+    prob = WinProbabilityEngine.probability(snapshot['ratings'][rows][:, None, None], opp,
+                                            snapshot['offsets'][None, :, :])
+
+    # Games already played keep the result of the team that actually played them
+    after = snapshot['played'][None, :, :] & (ordinals >= snapshot['start_ordinals'][None, :, :])
+    prob = np.where(after, snapshot['results'][None, :, :], prob)
+
+    return WinTotalEngine(prob, mask=valid, keep_steps=False).expected_wins(), missing
+
+
+class SharedSnapshot:
+    # Copies a dict of arrays into shared memory once, so every worker process reads the same read-only blocks
+    def __init__(self, arrays):
+        self.blocks = []
+        self.spec = {}
+        for key, value in arrays.items():
+            value = np.ascontiguousarray(value)
+            block = shared_memory.SharedMemory(create=True, size=max(1, value.nbytes))
+            np.ndarray(value.shape, dtype=value.dtype, buffer=block.buf)[...] = value
+            self.blocks.append(block)
+            self.spec[key] = (block.name, value.shape, value.dtype.str)
+
+    @staticmethod
+    def attach(spec):
+        # Returns (arrays, blocks); keep the blocks referenced for as long as the arrays are used
+        blocks, arrays = [], {}
+        for key, (name, shape, dtype) in spec.items():
+            block = shared_memory.SharedMemory(name=name)
+            array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+            array.flags.writeable = False
+            blocks.append(block)
+            arrays[key] = array
+        return arrays, blocks
+
+    def release(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+# Set up once in each worker process by _attach
+_worker = {}
+
+
+def _attach(spec):
+    _worker['snapshot'], _worker['blocks'] = SharedSnapshot.attach(spec)
+
+
+def _shared_block(rows):
+    return swap_block(_worker['snapshot'], rows)
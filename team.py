@@ -2,13 +2,18 @@ import csv
 import os
 from datetime import datetime
 
+from colors import ColorScale
 from defs import WEEKS
+from distribution import JointWinTotalEngine, WinTotalEngine
 from graph import Graph
+from layout import TableLayout
+from probability import WinProbabilityEngine
+from projection import ProjectionCache
 from utils import Utils
 
 
 class Team:
-    def __init__(self, name=None, schedule=None):
+    def __init__(self, name=None, schedule=None, engine=None, lazy=False):
         self.schedule = schedule
 
         if not name:
@@ -17,45 +22,18 @@ class Team:
             assert isinstance(name, str), "Name is not a string!"
             self.name = name
             self.conference = self.schedule[self.name]['conference']
-            self.logo_URI = self.schedule[self.name]['logoURI']
             self.spplus = self.schedule[self.name]['sp+']
-            best_match = max(
-                datetime.strptime(dt, '%Y-%m-%d') for dt in self.spplus.keys() if
-                datetime.strptime(dt, '%Y-%m-%d') <= datetime.now()).strftime('%Y-%m-%d')
-
-            self.latest_spplus = self.schedule[self.name]['sp+'][best_match]
 
             # Create an array of individual game win probabilities
             # Each vector corresponds to an entry in the S&P+ values list, indicating chronological change
-            self.win_probabilities = {}
-            for x in self.spplus:
-                cur = self.spplus[x]
-                self.win_probabilities[x] = []
-                date = datetime.strptime(x, "%Y-%m-%d")
-                for i in range(len(self.schedule[self.name]['schedule'])):
-                    # Get the opponent S&P+ value
-                    opp_sp = self.schedule[self.schedule[self.name]['schedule'][i]['opponent']]['sp+']
-                    # Use the most recent S&P+ values prior to the specified date
-                    # Note there might be a misalignment between the S&P+ value dates for different teams, especially FCS teams
-                    best_match = max(
-                        datetime.strptime(dt, '%Y-%m-%d') for dt in opp_sp.keys() if
-                        datetime.strptime(dt, '%Y-%m-%d') <= date).strftime('%Y-%m-%d')
-                    osp = opp_sp[best_match]
-                    # Who has the 2.5 point home field advantage?
-                    loc = self.schedule[self.name]['schedule'][i]['home-away']
-                    # Calculate the win probability and record it
-                    self.win_probabilities[x].append(Utils.calculate_win_prob_from_spplus(cur, osp, loc))
-
-            # If a game was already played, assign 100% or 0% win probability
-            for x in range(len(self.schedule[self.name]['schedule'])):
-                start = datetime.strptime(self.schedule[self.name]['schedule'][x]['startDate'], '%Y-%m-%d')
-                if start < datetime.now():
-                    if self.schedule[self.name]['schedule'][x]['winner'] == 'true':
-                        out = 1.0
-                    else:
-                        out = 0.0
-                    for i in [x for x in self.win_probabilities.keys() if datetime.strptime(x, '%Y-%m-%d') >= start]:
-                        self.win_probabilities[i][x] = out
+            # The vectors are views into an engine shared by every team in the conference or cluster
+            if engine is None or engine.schedule is not self.schedule or self.name not in engine:
+                engine = WinProbabilityEngine(schedule=self.schedule, teams=[self.name], lazy=lazy)
+            self.engine = engine
+            self._load_engine()
+
+            # Projections are memoized per S&P+ date until the schedule changes
+            self.projections = ProjectionCache()
 
             try:
                 self.primary_color = Utils.hex_to_rgb(self.schedule[self.name]['primaryColor'])
@@ -69,33 +47,46 @@ class Team:
             except KeyError:
                 self.division = "none"
 
+    @property
+    def logo_URI(self):
+        # Looked up when a graph is drawn, so a logo store only decodes the logos that are rendered
+        return self.schedule[self.name]['logoURI']
+
+    def _load_engine(self):
+        self.version = self.engine.version
+        self.history = self.engine.history
+        self.game_index = self.engine.game_index
+        self.win_probabilities = self.engine.win_probabilities(self.name)
+
+        self.latest_spplus = self.history.rating(self.name, datetime.now())
+
+    def _current(self):
+        # Pick up any changes made to the schedule (new S&P+ values, results, ...) since the team was built
+        self.engine.refresh()
+        if self.version != self.engine.version:
+            self._load_engine()
+            self.projections.clear()
+
     @staticmethod
     def expected_wins(vec):
         return sum(x * vec[x] for x in range(len(vec)))
 
     def get_best_sp_match(self, week):
-        start, end = datetime.strptime(WEEKS[week - 1][0], '%Y-%m-%d'), datetime.strptime(WEEKS[week - 1][1],
-                                                                                          '%Y-%m-%d')
-        try:
-            date = max(
-                datetime.strptime(dt, '%Y-%m-%d') for dt in self.win_probabilities.keys() if
-                start <= datetime.strptime(dt, '%Y-%m-%d') <= end).strftime('%Y-%m-%d')
-        except ValueError:
-            date = max(datetime.strptime(dt, '%Y-%m-%d') for dt in self.win_probabilities.keys() if
-                       datetime.strptime(dt, '%Y-%m-%d') <= end).strftime('%Y-%m-%d')
-        return date
+        # The latest S&P+ date within the week; if there is none, the latest one before the week ended.
+        # Either way that is simply the latest date on or before the end of the week.
+        self._current()
+        return self.history.as_of(self.name, WEEKS[week - 1][1])[0]
 
     def get_played_games(self):
         # Determine which games were already played and record the score for those that were
         played = []
-        for x in self.schedule[self.name]['schedule']:
+        past = Utils.is_past(self.engine.game_ordinals(self.name))
+        for i, (x, started) in enumerate(zip(self.schedule[self.name]['schedule'], past)):
             pf = sum(x['scoreBreakdown'])
-            pa = 0
-            for y in self.schedule[x['opponent']]['schedule']:
-                if x['id'] == y['id']:
-                    pa = sum(y['scoreBreakdown'])
+            # None where the opponent's side of the score isn't known
+            pa = self.game_index.opponent_score(self.name, i)
 
-            if datetime.strptime(x['startDate'], '%Y-%m-%d') < datetime.now():
+            if started:
                 if x['canceled'] == 'true':
                     status = 'canceled'
                 else:
@@ -120,10 +111,12 @@ class Team:
 
         if old:
             prior = self.project_win_totals(week - 1)
-        if not os.path.exists(".\svg output\{} ~ {}".format(method, scale)):
-            os.makedirs(".\svg output\{} ~ {}".format(method, scale))
-        path = os.path.join(".\svg output\{} ~ {}".format(method, scale),
-                            '{} ~ {} ~ {}.svg'.format(file, method, scale))
+        # scale may be a list of color scales; each gets its own file, all drawn from the one layout
+        paths = {}
+        for x in ([scale] if isinstance(scale, str) else scale):
+            os.makedirs(".\svg output\{} ~ {}".format(method, x), exist_ok=True)
+            paths[x] = os.path.join(".\svg output\{} ~ {}".format(method, x),
+                                    '{} ~ {} ~ {}.svg'.format(file, method, x))
 
         if not old:
             rows = 1 + len(cur_win_prob)
@@ -132,7 +125,7 @@ class Team:
             rows = 1 + len(cur_win_prob)
             cols = 6 + len(cur_win_prob)
 
-        graph = Graph(path=path, width=hstep * cols + 2 * margin, height=vstep * rows + 4 * margin + menuheight)
+        graph = TableLayout(width=hstep * cols + 2 * margin, height=vstep * rows + 4 * margin + menuheight)
 
         # Add the team logo
         try:
@@ -141,7 +134,8 @@ class Team:
                             logowidth,
                             logoheight,
                             self.schedule[self.name]['logoURI'])
-        except IndexError:
+        except (IndexError, KeyError):
+            # no logo to draw
             pass
 
         # Add the S&P+ value
@@ -201,24 +195,17 @@ class Team:
             else:
                 upper, lower = max(record[i]), min(record[i])
 
+            # the fill of each box, and whether its text should be white or black, in whichever color scale
+            fills, text_colors = graph.scaled(record[i], lower, upper, self.primary_color, self.secondary_color)
+
             for j in range(0, len(record) + 1):
                 # where wins <= games played, make the table
                 if j < len(record[i]):
-                    if absolute:
-                        r, g, b = Utils.gradient_color(0, 1, record[i][j], scale=scale,
-                                                       primaryColor=self.primary_color,
-                                                       secondaryColor=self.secondary_color)
-                    else:
-                        r, g, b = Utils.gradient_color(lower, upper, record[i][j], scale=scale,
-                                                       primaryColor=self.primary_color,
-                                                       secondaryColor=self.secondary_color)
+                    fill, text_color = fills[j], text_colors[j]
 
                     # Draw the color-coded box
                     graph.add_rect(margin + hstep * (4 + j), margin + vstep * (2 + i), hstep, vstep, color='none',
-                                   fill=(r, g, b))
-
-                    # Should the text be white or black?
-                    text_color = Utils.get_text_contrast_color(r, g, b)
+                                   fill=fill)
 
                     graph.add_text(margin + hstep * (4.5 + j),
                                    margin + vstep * (2.5 + i) - 2,
@@ -289,19 +276,15 @@ class Team:
                     # summarize the game
                     graph.add_text(margin + hstep * 3.5, margin + vstep * (2.5 + i) - 3, alignment='central', text=wl)
 
+                    pf, pa = played[i][0:2]
                     graph.add_text(margin + hstep * 3.5, margin + vstep * (2.5 + i) + 12,
-                                   text='{} - {}'.format(*played[i][0:2]))
+                                   text='{} - {}'.format(pf, '?' if pa is None else pa))
 
             else:
                 # Add the opponent S&P+ value
-                opp_sp = self.schedule[self.schedule[self.name]['schedule'][i]['opponent']]['sp+']
                 # Use the most recent S&P+ values prior to the specified date
                 # Note there might be a misalignment between the S&P+ value dates for different teams, especially FCS teams
-                d = datetime.strptime(cur_date, '%Y-%m-%d')
-                date = max(
-                    datetime.strptime(dt, '%Y-%m-%d') for dt in opp_sp.keys() if
-                    datetime.strptime(dt, '%Y-%m-%d') <= d).strftime('%Y-%m-%d')
-                osp = opp_sp[date]
+                osp = self.history.rating(self.schedule[self.name]['schedule'][i]['opponent'], cur_date)
                 if osp > 0:
                     txt = '+{}'.format(osp)
                     r, g, b = 0, 205, 0
@@ -429,35 +412,63 @@ class Team:
             # Draw the outline box for the win total header label
             graph.add_rect(margin + hstep * 4, margin, hstep * (cols - 5), vstep, fill='none', stroke_width=2)
 
-        graph.write_file()
+        graph.render(paths)
 
-    def project_win_totals(self, week=None, date=None):
+    def _resolve_date(self, week=None, date=None):
+        self._current()
         if not week or (week > len(self.win_probabilities)):
             week = -1
 
         if not date:
-            best_match = self.get_best_sp_match(week)
-        else:
-            best_match = date
+            return self.get_best_sp_match(week)
+        return date
 
-        win_probs = [x for x in self.win_probabilities[best_match]]
+    def _project_vector(self, kind, win_probs):
+        if kind == 'joint':
+            conference = self.engine.conference_games[self.engine.index[self.name], :len(win_probs)]
+            return JointWinTotalEngine(win_probs, conference).table()
+        totals = WinTotalEngine(win_probs)
+        return totals.record() if kind == 'record' else totals.final()
+
+    def _project(self, kind, week=None, date=None):
+        best_match = self._resolve_date(week, date)
+        win_probs = self.win_probabilities[best_match]
+
+        if not self.engine.owns(self.name, best_match, win_probs):
+            # The probabilities were replaced by hand, so work from them directly
+            return self._project_vector(kind, win_probs)
+
+        def compute():
+            if self.engine.lazy:
+                # Only this date was evaluated, so only this date is projected
+                return self._project_vector(kind, win_probs)
+            # The engine has already worked out the table for every date
+            i = self.engine.index[self.name]
+            index = (i, self.engine.date_index[i][best_match])
+            if kind == 'record':
+                return self.engine.win_totals.record(index, len(win_probs))
+            if kind == 'joint':
+                return self.engine.joint_win_totals.table(index, len(win_probs))
+            return self.engine.win_totals.final(index, len(win_probs))
+
+        return self.projections.get((kind, best_match, self.version), compute)
 
-        # Make a ragged table to store 'games' x 'wins'
-        record = [[0 for y in range(0, x + 1)] for x in range(1, len(win_probs) + 1)]
-        record[0][0] = 1 - win_probs[0]  # first game was a loss
-        record[0][1] = win_probs[0]  # first game was a win
+    def project_win_totals(self, week=None, date=None):
+        # A ragged table of 'games' x 'wins'
+        return self._project('record', week, date)
 
-        for i in range(1, len(record)):
-            for j in range(0, i + 1):
-                record[i][j] += record[i - 1][j] * (1 - win_probs[i])  # newest game was a loss
-                record[i][j + 1] += record[i - 1][j] * (win_probs[i])  # newest game was a win
+    def project_win_distribution(self, week=None, date=None):
+        # Just the final row of project_win_totals, i.e. the distribution of season win totals
+        return self._project('final', week, date)
 
-        return record
+    def project_conference_record(self, week=None, date=None):
+        # A table of 'conference wins' x 'wins': [i][j] is the probability of i conference wins and j wins overall
+        return self._project('joint', week, date)
 
     def export_retrospective_data(self):
         win_probs = []
         for date in self.spplus:
-            win_probs.append([date, self.spplus[date], *self.project_win_totals(date=date)[-1]])
+            win_probs.append([date, self.spplus[date], *self.project_win_distribution(date=date)])
 
         return [[self.name, *x] for x in win_probs]
 
@@ -465,12 +476,11 @@ class Team:
                                    menuheight=40, absolute=False, method='sp+', scale='red-green'):
         win_probs = []
         for date in self.spplus:
-            win_probs.append([date, self.spplus[date], self.project_win_totals(date=date)[-1]])
+            win_probs.append([date, self.spplus[date], self.project_win_distribution(date=date)])
 
         width = max([len(x[2]) for x in win_probs])
         length = len(win_probs)
-        if not os.path.exists(".\svg output\{} ~ {}".format(method, scale)):
-            os.makedirs(".\svg output\{} ~ {}".format(method, scale))
+        os.makedirs(".\svg output\{} ~ {}".format(method, scale), exist_ok=True)
         path = os.path.join(".\svg output\{} ~ {}".format(method, scale),
                             '{} ~ {} ~ {} ~ RETROSPECTIVE.svg'.format(file, method, scale))
 
@@ -486,7 +496,8 @@ class Team:
                             logowidth,
                             logoheight,
                             self.schedule[self.name]['logoURI'])
-        except IndexError:
+        except (IndexError, KeyError):
+            # no logo to draw
             pass
         # TODO: change this block to give the gradient
         '''
@@ -531,24 +542,18 @@ class Team:
             else:
                 upper, lower = max(win_probs[i][2]), min(win_probs[i][2])
 
+            # the fill of each box, and whether its text should be white or black
+            colors = ColorScale.of(scale, self.primary_color, self.secondary_color)
+            fills, text_colors = colors.colors(win_probs[i][2], lower, upper)
+
             for j in range(0, len(win_probs)):
                 # where wins <= games played, make the table
                 if j < len(win_probs[i][2]):
-                    if absolute:
-                        r, g, b = Utils.gradient_color(0, 1, win_probs[i][2][j], scale=scale,
-                                                       primaryColor=self.primary_color,
-                                                       secondaryColor=self.secondary_color)
-                    else:
-                        r, g, b = Utils.gradient_color(lower, upper, win_probs[i][2][j], scale=scale,
-                                                       primaryColor=self.primary_color,
-                                                       secondaryColor=self.secondary_color)
+                    fill, text_color = fills[j].tolist(), text_colors[j].tolist()
 
                     # Draw the color-coded box
                     graph.add_rect(margin + hstep * (2 + j), margin + vstep * (2 + i), hstep, vstep, color='none',
-                                   fill=(r, g, b))
-
-                    # Should the text be white or black?
-                    text_color = Utils.get_text_contrast_color(r, g, b)
+                                   fill=fill)
 
                     graph.add_text(margin + hstep * (2.5 + j),
                                    margin + vstep * (2.5 + i) - 2,
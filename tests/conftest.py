@@ -0,0 +1,73 @@
+import json
+import os
+import random
+import sys
+
+import pytest
+
+# The modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CONFERENCES = {'ACC': ['Atlantic', 'Coastal'], 'SEC': ['East', 'West'], 'Mountain West': [None],
+               'FBS Independents': [None], 'FCS': [None]}
+SIZES = {'ACC': 6, 'SEC': 6, 'Mountain West': 4, 'FBS Independents': 2, 'FCS': 2}
+RATING_DATES = ['2019-02-01', '2019-08-25', '2019-09-12', '2019-10-05', '2019-10-20', '2019-11-20']
+# The last few weeks are far enough out to stay in the future
+GAME_DATES = ['2019-08-31', '2019-09-07', '2019-09-14', '2019-09-21', '2019-10-05', '2019-10-19', '2099-10-26',
+              '2099-11-02', '2099-11-09']
+
+
+def make_schedule(seed=1):
+    """Return (dict) a small made up schedule in the layout of schedule.json."""
+    rng = random.Random(seed)
+    schedule = {}
+    for conference, divisions in CONFERENCES.items():
+        for k in range(SIZES[conference]):
+            name = '{} team {}'.format(conference.lower(), k)
+            team = {'color': '#%06x' % rng.randint(0, 0xffffff), 'conference': conference,
+                    'logoURI': 'TE9HTw==', 'nameRaw': name.title(), 'rankings': {'AP': {}}, 'schedule': [],
+                    'sp+': {}}
+            if divisions[0]:
+                team['division'] = divisions[k % 2]
+            base = rng.gauss(0, 12)
+            # FCS teams are rated less often
+            for date in RATING_DATES[::2] if conference == 'FCS' else RATING_DATES:
+                team['sp+'][date] = round(base + rng.gauss(0, 3), 1)
+            if k < 2:
+                team['rankings']['AP']['2019-09-08'] = {'overall': k + 1, 'voters': {'voter': {'rank': k + 1}}}
+            schedule[name] = team
+
+    teams = list(schedule)
+    game_id = 1000
+    for date in GAME_DATES:
+        pool = teams[:]
+        rng.shuffle(pool)
+        while len(pool) > 1:
+            home, away = pool.pop(), pool.pop()
+            game_id += 1
+            location = rng.choice(['home', 'home', 'neutral'])
+            past = date < '2020'
+            home_score = [rng.randint(0, 14) for _ in range(4)] if past else []
+            away_score = [rng.randint(0, 14) for _ in range(4)] if past else []
+            for team, opponent, where, mine, theirs in (
+                    (home, away, location, home_score, away_score),
+                    (away, home, 'away' if location == 'home' else 'neutral', away_score, home_score)):
+                schedule[team]['schedule'].append({
+                    'canceled': 'false', 'home-away': where, 'id': str(game_id), 'location': 'Stadium',
+                    'opponent': opponent, 'scoreBreakdown': mine, 'startDate': date, 'startTime': '12:00',
+                    'teamRank': '', 'winner': 'true' if past and sum(mine) > sum(theirs) else 'false'})
+    return schedule
+
+
+@pytest.fixture
+def schedule():
+    return make_schedule()
+
+
+@pytest.fixture
+def schedule_file(tmp_path, schedule):
+    """Return (str) the path of a schedule json file holding the made up schedule."""
+    path = str(tmp_path / 'schedule.json')
+    with open(path, 'w+', encoding='utf8') as outfile:
+        json.dump(schedule, outfile, indent=4, sort_keys=True)
+    return path
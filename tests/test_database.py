@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from database import ScheduleDatabase
+from stream import ScheduleStream
+
+
+@pytest.fixture
+def database(tmp_path):
+    db = ScheduleDatabase(str(tmp_path / 'schedule.db'))
+    yield db
+    db.close()
+
+
+def full_load(file):
+    with open(file, 'r', encoding='utf8') as infile:
+        return json.load(infile)
+
+
+def test_load_equals_imported_json(database, schedule_file):
+    database.import_json(schedule_file)
+    full = full_load(schedule_file)
+    loaded = database.load()
+    assert loaded == full
+    # in the json layout, key order included
+    assert list(loaded) == list(full)
+    for name in full:
+        assert list(loaded[name]) == list(full[name])
+
+
+def test_partial_load_equals_stream(database, schedule_file):
+    database.import_json(schedule_file)
+    filters = ((['SEC'], None), (None, ['fcs team 1', 'acc team 0']), (['Mountain West'], ['fcs team 0']))
+    for conferences, teams in filters:
+        for opponents in (True, False):
+            expected = ScheduleStream(schedule_file, conferences=conferences, teams=teams, opponents=opponents).load()
+            assert database.load(conferences=conferences, teams=teams, opponents=opponents) == expected
+
+
+def test_write_and_export_round_trip(database, schedule, tmp_path):
+    database.write(schedule)
+    assert database.load() == schedule
+    exported = str(tmp_path / 'exported.json')
+    database.export_json(exported)
+    assert full_load(exported) == schedule
+
+
+def test_writes_match_the_dict(database, schedule):
+    database.write(schedule)
+    name = 'sec team 2'
+    game = dict(schedule[name]['schedule'][3], winner='true', scoreBreakdown=[7, 7, 7, 7])
+    schedule[name]['schedule'][3] = game
+    database.put_games(name, [(3, game)])
+    schedule[name]['sp+']['2019-11-27'] = 12.5
+    schedule[name]['sp+']['2019-02-01'] = -1.0
+    database.put_ratings(name, [('2019-11-27', 12.5), ('2019-02-01', -1.0)])
+    entry = {'overall': 4, 'voters': {}}
+    schedule[name]['rankings']['AP']['2019-09-15'] = entry
+    database.put_ranking(name, 'AP', '2019-09-15', entry)
+    schedule[name]['nameRaw'] = 'Renamed'
+    database.put_team(name, schedule[name])
+
+    loaded = database.load()
+    assert loaded == schedule
+    assert list(loaded[name]['sp+']) == list(schedule[name]['sp+'])
+    # both teams in the game are found by its id
+    assert sorted(database.locate(game['id'])) == sorted(
+        (x, slot) for x in schedule for slot, g in enumerate(schedule[x]['schedule']) if g['id'] == game['id'])
@@ -0,0 +1,59 @@
+import itertools
+
+import numpy as np
+
+from distribution import JointWinTotalEngine, WinTotalEngine
+
+
+def brute_force(probabilities, conference=None):
+    # P(i conference wins, j wins overall), adding up every possible season one by one
+    n = len(probabilities)
+    if conference is None:
+        conference = [False] * n
+    table = np.zeros((sum(conference) + 1, n + 1))
+    for outcome in itertools.product((0, 1), repeat=n):
+        p = np.prod([q if won else 1 - q for q, won in zip(probabilities, outcome)])
+        table[sum(w for w, c in zip(outcome, conference) if c), sum(outcome)] += p
+    return table
+
+
+def test_win_totals_match_brute_force():
+    rng = np.random.default_rng(4)
+    probabilities = rng.random((3, 4, 7))
+    engine = WinTotalEngine(probabilities)
+    for index in np.ndindex(3, 4):
+        expected = brute_force(probabilities[index]).sum(axis=0)
+        np.testing.assert_allclose(engine.distributions[index], expected, atol=1e-12)
+        # every step is the distribution after that many games
+        for g in range(7):
+            np.testing.assert_allclose(engine.record(index)[g], brute_force(probabilities[index][:g + 1]).sum(axis=0),
+                                       atol=1e-12)
+        np.testing.assert_allclose(engine.expected_wins()[index], probabilities[index].sum(), atol=1e-12)
+
+
+def test_padded_games_never_add_a_win():
+    rng = np.random.default_rng(5)
+    probabilities = rng.random((5, 6))
+    games = [6, 4, 1, 0, 3]
+    mask = np.arange(6)[None, :] < np.array(games)[:, None]
+    engine = WinTotalEngine(probabilities, mask=mask)
+    for i, n in enumerate(games):
+        expected = brute_force(probabilities[i, :n]).sum(axis=0)
+        np.testing.assert_allclose(engine.final(i, games=n), expected, atol=1e-12)
+        assert np.all(engine.distributions[i, n + 1:] == 0)
+
+
+def test_joint_win_totals_match_brute_force():
+    rng = np.random.default_rng(11)
+    probabilities = rng.random((4, 7))
+    conference = rng.random((4, 7)) < 0.6
+    games = [7, 5, 7, 2]
+    mask = np.arange(7)[None, :] < np.array(games)[:, None]
+    engine = JointWinTotalEngine(probabilities, conference, mask=mask)
+    for i, n in enumerate(games):
+        expected = brute_force(probabilities[i, :n], conference[i, :n])
+        np.testing.assert_allclose(engine.table(i, games=n, conference_games=int(conference[i, :n].sum())),
+                                   expected, atol=1e-12)
+        # summing out either axis gives the one dimensional distributions
+        np.testing.assert_allclose(engine.overall_wins()[i, :n + 1],
+                                   WinTotalEngine(probabilities[i, :n]).distributions, atol=1e-12)
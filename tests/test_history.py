@@ -0,0 +1,62 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from history import RatingHistory
+from utils import Utils
+
+
+def linear_as_of(ratings, when):
+    # The strptime scan over every key that RatingHistory replaced
+    best_match = max(datetime.strptime(dt, '%Y-%m-%d') for dt in ratings
+                     if datetime.strptime(dt, '%Y-%m-%d') <= when).strftime('%Y-%m-%d')
+    return best_match, ratings[best_match]
+
+
+def dates():
+    # every day of the season, plus the rating dates themselves
+    first = datetime(2019, 2, 1)
+    return [first + timedelta(days=k) for k in range(0, 330, 3)] + [datetime(2019, 11, 20)]
+
+
+def test_as_of_matches_linear_search(schedule):
+    history = RatingHistory(schedule)
+    for name in schedule:
+        for when in dates():
+            expected = linear_as_of(schedule[name]['sp+'], when)
+            assert history.as_of(name, when) == expected
+            assert history.as_of(name, when.strftime('%Y-%m-%d')) == expected
+            assert history.rating(name, when) == expected[1]
+
+
+def test_as_of_with_unsorted_keys(schedule):
+    # the json isn't guaranteed to list the ratings in order
+    name = next(iter(schedule))
+    items = list(schedule[name]['sp+'].items())
+    random.Random(3).shuffle(items)
+    schedule[name]['sp+'] = dict(items)
+    history = RatingHistory(schedule, teams=[name])
+    for when in dates():
+        assert history.as_of(name, when) == linear_as_of(schedule[name]['sp+'], when)
+
+
+def test_as_of_before_first_rating_raises(schedule):
+    history = RatingHistory(schedule)
+    with pytest.raises(ValueError):
+        history.as_of(next(iter(schedule)), datetime(2019, 1, 31))
+
+
+def test_vectorized_lookup_matches_as_of(schedule):
+    history = RatingHistory(schedule)
+    ordinals = np.array([Utils.date_to_ordinal(x) for x in dates()])
+    teams = np.arange(len(history.teams))
+    ratings, found = history.ratings_as_of(teams[:, None], ordinals[None, :])
+    assert found.all()
+    for i, name in enumerate(history.teams):
+        for k, when in enumerate(dates()):
+            assert ratings[i, k] == linear_as_of(schedule[name]['sp+'], when)[1]
+
+    ratings, found = history.ratings_as_of(teams, Utils.date_to_ordinal('2019-01-31'))
+    assert not found.any()
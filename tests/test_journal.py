@@ -0,0 +1,108 @@
+import copy
+import json
+import os
+
+import pytest
+
+from database import ScheduleDatabase
+from journal import ScheduleJournal
+from stream import ScheduleStream
+
+
+def full_load(file):
+    with open(file, 'r', encoding='utf8') as infile:
+        return json.load(infile)
+
+
+def log_changes(journal, schedule):
+    """Log a few changes of every kind, make the same changes to the dict and return it."""
+    expected = copy.deepcopy(schedule)
+    name = 'acc team 3'
+    game = dict(expected[name]['schedule'][7], winner='true', scoreBreakdown=[3, 0, 7, 0])
+    expected[name]['schedule'][7] = game
+    journal.put_games(name, [(7, game)])
+    extra = dict(game, id='9999', opponent='fcs team 1', startDate='2099-11-30')
+    expected[name]['schedule'].append(extra)
+    journal.put_games(name, [(len(expected[name]['schedule']) - 1, extra)])
+
+    with journal.transaction():
+        expected['sec team 0']['sp+']['2019-11-27'] = 20.5
+        expected['sec team 0']['sp+']['2019-02-01'] = 1.5
+        journal.put_ratings('sec team 0', [('2019-11-27', 20.5), ('2019-02-01', 1.5)])
+        entry = {'overall': 9, 'voters': {}}
+        expected['sec team 0']['rankings']['AP']['2019-09-15'] = entry
+        journal.put_ranking('sec team 0', 'AP', '2019-09-15', entry)
+
+    fields = dict(expected['fcs team 1'], nameRaw='Renamed', primaryColor='#000000')
+    del fields['color']
+    expected['fcs team 1'] = dict(fields)
+    journal.put_team('fcs team 1', fields)
+    return expected
+
+
+def test_load_replays_the_journal(schedule_file):
+    journal = ScheduleJournal(schedule_file)
+    expected = log_changes(journal, full_load(schedule_file))
+    assert len(journal) == 6
+    assert journal.load() == expected
+    # replaying the same records again changes nothing
+    loaded = journal.load()
+    journal.replay(loaded)
+    assert loaded == expected
+
+
+def test_compact_round_trip(schedule_file):
+    journal = ScheduleJournal(schedule_file)
+    expected = log_changes(journal, full_load(schedule_file))
+    journal.compact(journal.load())
+    assert not os.path.exists(journal.path)
+    assert len(journal) == 0
+    assert full_load(schedule_file) == expected
+    assert ScheduleJournal(schedule_file).load() == expected
+
+
+def test_every_reader_sees_the_journal(schedule_file, tmp_path):
+    journal = ScheduleJournal(schedule_file)
+    expected = log_changes(journal, full_load(schedule_file))
+    assert ScheduleStream(schedule_file).load() == expected
+    partial = ScheduleStream(schedule_file, teams=['acc team 3']).load()
+    assert partial['acc team 3'] == expected['acc team 3']
+
+    database = ScheduleDatabase(str(tmp_path / 'schedule.db'))
+    try:
+        database.import_json(schedule_file)
+        assert database.load() == expected
+    finally:
+        database.close()
+
+
+def test_torn_last_line_is_ignored(schedule_file):
+    journal = ScheduleJournal(schedule_file)
+    expected = log_changes(journal, full_load(schedule_file))
+    # a crash part way through an append leaves a line without its newline
+    with open(journal.path, 'a', encoding='utf8') as outfile:
+        outfile.write('{"op":"rating","team":"sec te')
+    assert journal.load() == expected
+
+    with open(journal.path, 'a', encoding='utf8') as outfile:
+        outfile.write('\n')
+    with pytest.raises(json.JSONDecodeError):
+        journal.load()
+
+
+def test_failed_transaction_logs_nothing(schedule_file):
+    journal = ScheduleJournal(schedule_file)
+    with pytest.raises(RuntimeError):
+        with journal.transaction():
+            journal.put_ratings('sec team 0', [('2019-11-27', 20.5)])
+            raise RuntimeError
+    assert len(journal) == 0
+    assert journal.load() == full_load(schedule_file)
+
+
+def test_partial_journal_is_never_compacted(schedule_file):
+    journal = ScheduleJournal(schedule_file, partial=True)
+    log_changes(journal, full_load(schedule_file))
+    assert not journal.due()
+    with pytest.raises(ValueError):
+        journal.compact(ScheduleStream(schedule_file, conferences=['SEC']).load())
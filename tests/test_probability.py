@@ -0,0 +1,57 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from probability import WinProbabilityEngine
+from utils import Utils
+
+NOW = datetime(2019, 10, 10)
+
+
+def reference(schedule, name, now):
+    # The game by game loop the engine replaced: one norm.cdf call per (date, game), then the played games
+    probabilities = {}
+    games = schedule[name]['schedule']
+    for x, cur in schedule[name]['sp+'].items():
+        date = datetime.strptime(x, '%Y-%m-%d')
+        probabilities[x] = []
+        for game in games:
+            opp_sp = schedule[game['opponent']]['sp+']
+            best_match = max(datetime.strptime(dt, '%Y-%m-%d') for dt in opp_sp
+                             if datetime.strptime(dt, '%Y-%m-%d') <= date).strftime('%Y-%m-%d')
+            probabilities[x].append(Utils.calculate_win_prob_from_spplus(cur, opp_sp[best_match], game['home-away']))
+    for g, game in enumerate(games):
+        start = datetime.strptime(game['startDate'], '%Y-%m-%d')
+        if start < now:
+            for x in [x for x in probabilities if datetime.strptime(x, '%Y-%m-%d') >= start]:
+                probabilities[x][g] = 1.0 if game['winner'] == 'true' else 0.0
+    return probabilities
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_engine_matches_single_game_formula(schedule, lazy):
+    engine = WinProbabilityEngine(schedule, now=NOW, lazy=lazy)
+    for name in schedule:
+        expected = reference(schedule, name, NOW)
+        assert list(engine.dates[engine.index[name]]) == sorted(expected)
+        for date, vec in expected.items():
+            np.testing.assert_allclose(engine.vector(name, date), vec, rtol=1e-12, atol=1e-15)
+
+
+def test_engine_for_some_teams_matches_engine_for_all(schedule):
+    every = WinProbabilityEngine(schedule, now=NOW)
+    teams = [x for x in schedule if schedule[x]['conference'] == 'SEC']
+    some = WinProbabilityEngine(schedule, teams=teams, now=NOW)
+    for name in teams:
+        for date in some.dates[some.index[name]]:
+            np.testing.assert_array_equal(some.vector(name, date), every.vector(name, date))
+
+
+def test_missing_opponent_rating_raises(schedule):
+    # an opponent with no rating on or before the first date can't be projected against
+    name = next(iter(schedule))
+    opponent = schedule[name]['schedule'][0]['opponent']
+    del schedule[opponent]['sp+']['2019-02-01']
+    with pytest.raises(ValueError):
+        WinProbabilityEngine(schedule, teams=[name], now=NOW)
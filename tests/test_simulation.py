@@ -0,0 +1,61 @@
+from datetime import datetime
+
+import numpy as np
+
+from probability import WinProbabilityEngine
+from simulation import RankCounts, RecordCounts, SeasonSimulator, Standings
+
+NOW = datetime(2019, 10, 10)
+
+
+def make_simulator(schedule, seed, chunk=20000):
+    teams = [x for x in schedule if schedule[x]['conference'] in ('ACC', 'SEC')]
+    engine = WinProbabilityEngine(schedule, teams=teams, now=NOW)
+    dates = {x: engine.history.latest(x)[0] for x in teams}
+    return SeasonSimulator(engine, dates, seed=seed, chunk=chunk)
+
+
+def groups(simulator):
+    found = {}
+    for x in simulator.teams:
+        team = simulator.engine.schedule[x]
+        found.setdefault('{} {}'.format(team['conference'], team['division']), []).append(x)
+    return found
+
+
+def simulate(simulator, n=3000):
+    reducers = simulator.run(n, [RecordCounts(), RankCounts(groups(simulator)), Standings()])
+    return [x.result(simulator) for x in reducers]
+
+
+def test_same_seed_gives_same_seasons(schedule):
+    first = simulate(make_simulator(schedule, seed=9))
+    assert simulate(make_simulator(schedule, seed=9)) == first
+    # the chunks are drawn from one stream, so how the run is split doesn't matter
+    assert simulate(make_simulator(schedule, seed=9, chunk=700)) == first
+    assert simulate(make_simulator(schedule, seed=10)) != first
+
+
+def test_shared_games_have_one_winner(schedule):
+    simulator = make_simulator(schedule, seed=1)
+    outcomes = simulator.draw(500)
+    wins = simulator.wins(outcomes)
+    # every game between two of the teams is won by exactly one of them
+    shared = simulator.away >= 0
+    assert wins.sum(axis=1).tolist() == (outcomes[:, ~shared].sum(axis=1) + shared.sum()).tolist()
+    assert np.all(wins <= simulator.games_played)
+
+
+def test_rank_counts_match_pairwise_count(schedule):
+    simulator = make_simulator(schedule, seed=2)
+    outcomes = simulator.draw(400)
+    wins = simulator.wins(outcomes)
+    counts = RankCounts(groups(simulator))
+    counts.update(simulator, outcomes, wins)
+    for name, members in counts.groups.items():
+        idx = [simulator.engine.index[x] for x in members]
+        w = wins[:, idx]
+        # position = the number of teams in the group with more wins
+        rank = (w[:, None, :] > w[:, :, None]).sum(axis=2)
+        for k in range(len(idx)):
+            assert counts.counts[name][k].tolist() == np.bincount(rank[:, k], minlength=len(idx)).tolist()
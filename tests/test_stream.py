@@ -0,0 +1,63 @@
+import json
+from datetime import datetime
+
+import numpy as np
+
+from probability import WinProbabilityEngine
+from stream import ScheduleStream
+
+
+def full_load(file):
+    with open(file, 'r', encoding='utf8') as infile:
+        return json.load(infile)
+
+
+def test_unfiltered_stream_equals_full_load(schedule_file):
+    full = full_load(schedule_file)
+    for chunk in (1 << 20, 64, 7):
+        loaded = ScheduleStream(schedule_file, chunk=chunk).load()
+        assert loaded == full
+        assert list(loaded) == list(full)
+
+
+def test_partial_load_matches_full_load(schedule_file):
+    full = full_load(schedule_file)
+    stream = ScheduleStream(schedule_file, conferences=['SEC'], teams=['fcs team 0'], chunk=100)
+    partial = stream.load()
+
+    wanted = [x for x in full if full[x]['conference'] == 'SEC' or x == 'fcs team 0']
+    assert [x for x in partial if 'schedule' in partial[x]] == wanted
+    for name in wanted:
+        assert partial[name] == full[name]
+
+    # the opponents come without their games, but with their scores and everything else
+    opponents = set(g['opponent'] for x in wanted for g in full[x]['schedule']) - set(wanted)
+    assert set(partial) == set(wanted) | opponents
+    for name in opponents:
+        summary = dict(partial[name])
+        scores = summary.pop('scores')
+        assert summary == {k: v for k, v in full[name].items() if k != 'schedule'}
+        assert scores == {g['id']: g['scoreBreakdown'] for g in full[name]['schedule']}
+
+
+def test_partial_load_projects_like_full_load(schedule_file):
+    # everything the projections look up for the wanted teams is in a partial load
+    full = full_load(schedule_file)
+    partial = ScheduleStream(schedule_file, conferences=['ACC']).load()
+    teams = [x for x in full if full[x]['conference'] == 'ACC']
+    now = datetime(2019, 10, 10)
+    a = WinProbabilityEngine(full, teams=teams, now=now)
+    b = WinProbabilityEngine(partial, teams=teams, now=now)
+    np.testing.assert_array_equal(a.probabilities, b.probabilities)
+    np.testing.assert_array_equal(a.joint_win_totals.distributions, b.joint_win_totals.distributions)
+
+
+def test_fields_and_skip(schedule_file):
+    full = full_load(schedule_file)
+    names = [x for x, record in ScheduleStream(schedule_file, fields=['conference', 'sp+'])]
+    assert names == list(full)
+    for name, record in ScheduleStream(schedule_file, teams=['sec team 1'], skip=('logoURI', 'rankings')):
+        assert name == 'sec team 1'
+        assert record == {k: v for k, v in full[name].items() if k not in ('logoURI', 'rankings')}
+    loaded = ScheduleStream(schedule_file, fields=['conference', 'sp+'], opponents=False).load()
+    assert loaded == {x: {'conference': full[x]['conference'], 'sp+': full[x]['sp+']} for x in full}
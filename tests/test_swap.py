@@ -0,0 +1,32 @@
+from datetime import datetime
+
+import numpy as np
+
+from probability import WinProbabilityEngine
+from swap import ScheduleSwapEngine
+
+NOW = datetime(2019, 10, 10)
+
+
+def make_swap(schedule):
+    engine = WinProbabilityEngine(schedule, now=NOW)
+    dates = {x: engine.history.latest(x)[0] for x in engine.teams}
+    return engine, dates, ScheduleSwapEngine(engine, dates)
+
+
+def test_parallel_swap_matches_serial(schedule):
+    engine, dates, swap = make_swap(schedule)
+    serial = swap.expected_wins()
+    np.testing.assert_array_equal(swap.expected_wins(workers=2), serial)
+
+    rows = [5, 0, 3, 11]
+    np.testing.assert_array_equal(swap.expected_wins(rows, workers=2), serial[rows])
+    assert swap.matrix(rows, workers=2) == swap.matrix(rows)
+
+
+def test_own_schedule_matches_engine(schedule):
+    # the diagonal is each team playing its own schedule, which the engine already projects
+    engine, dates, swap = make_swap(schedule)
+    xw = swap.expected_wins()
+    for i, name in enumerate(swap.teams):
+        np.testing.assert_allclose(xw[i, i], engine.vector(name, dates[name]).sum(), rtol=1e-12)
@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from tiebreak import TitleCounts, Tiebreaker
+
+
+def make_simulator(teams, games):
+    """
+    A stand-in for SeasonSimulator with just what the tiebreaker reads.
+    :param games: list of (first, second) team names; an outcome of 1 means the first one won
+    """
+    index = {x: i for i, x in enumerate(teams)}
+    return SimpleNamespace(teams=teams, engine=SimpleNamespace(index=index),
+                           home=np.array([index[a] for a, b in games], dtype=np.int64),
+                           away=np.array([index[b] for a, b in games], dtype=np.int64))
+
+
+def play(simulator, games, winners, extra=None):
+    # one season's outcomes and win totals (conference games plus any extra wins), as arrays of one row
+    outcomes = np.array([[winner == game[0] for game, winner in zip(games, winners)]])
+    wins = np.zeros((1, len(simulator.teams)), dtype=np.int64)
+    for winner in winners:
+        wins[0, simulator.engine.index[winner]] += 1
+    for name, count in (extra or {}).items():
+        wins[0, simulator.engine.index[name]] += count
+    return outcomes, wins
+
+
+def order(positions, members):
+    return [members[k] for k in np.argsort(positions[0])]
+
+
+def test_head_to_head_breaks_two_way_ties():
+    teams = ['A', 'B', 'C', 'D']
+    games = [('A', 'B'), ('A', 'C'), ('A', 'D'), ('B', 'C'), ('B', 'D'), ('C', 'D')]
+    simulator = make_simulator(teams, games)
+    # A and B are 2-1, C and D 1-2; A beat B and D beat C
+    outcomes, wins = play(simulator, games, ['A', 'C', 'A', 'B', 'B', 'D'])
+    positions = Tiebreaker(simulator, {'X': teams}, seed=0).rank(outcomes, wins)
+    assert order(positions['X'], teams) == ['A', 'B', 'D', 'C']
+
+
+def test_overall_wins_break_circular_ties():
+    teams = ['A', 'B', 'C']
+    games = [('A', 'B'), ('B', 'C'), ('C', 'A')]
+    simulator = make_simulator(teams, games)
+    # every team is 1-1 and beat one of the others, so it comes down to the games outside the conference
+    outcomes, wins = play(simulator, games, ['A', 'B', 'C'], extra={'A': 3, 'B': 2, 'C': 4})
+    positions = Tiebreaker(simulator, {'X': teams}, seed=0).rank(outcomes, wins)
+    assert order(positions['X'], teams) == ['C', 'A', 'B']
+
+
+def test_divisions_are_ranked_separately():
+    east, west = ['A', 'B', 'C'], ['D', 'E']
+    games = [('A', 'B'), ('A', 'C'), ('B', 'C'), ('A', 'D'), ('B', 'E'), ('C', 'D'), ('D', 'E')]
+    simulator = make_simulator(east + west, games)
+    # A and B are 2-1 in the conference; B beat A, which settles it even though A has more wins overall
+    outcomes, wins = play(simulator, games, ['B', 'A', 'C', 'A', 'B', 'D', 'D'], extra={'A': 5})
+    positions = Tiebreaker(simulator, {'East': east, 'West': west}, seed=0).rank(outcomes, wins)
+    assert order(positions['East'], east) == ['B', 'A', 'C']
+    assert order(positions['West'], west) == ['D', 'E']
+
+
+def test_division_record_comes_before_overall_wins():
+    east, west = ['A', 'B', 'C'], ['D']
+    games = [('A', 'C'), ('B', 'D')]
+    simulator = make_simulator(east + west, games)
+    # A and B are 1-0 and never met; A's win was in the division, B's wasn't
+    outcomes, wins = play(simulator, games, ['A', 'B'], extra={'B': 5})
+    positions = Tiebreaker(simulator, {'East': east, 'West': west}, seed=0).rank(outcomes, wins)
+    assert order(positions['East'], east) == ['A', 'B', 'C']
+
+
+def test_coin_flips_are_seeded():
+    teams = ['A', 'B', 'C', 'D']
+    simulator = make_simulator(teams + ['E'], [('A', 'E')])
+    # a full tie in every season: only the coin decides, so each team should finish everywhere some of the time
+    outcomes = np.zeros((400, 1), dtype=bool)
+    wins = np.array([[1, 1, 1, 1, 2]] * 400)
+
+    first = Tiebreaker(simulator, {'X': teams}, seed=5).rank(outcomes, wins)['X']
+    assert np.array_equal(Tiebreaker(simulator, {'X': teams}, seed=5).rank(outcomes, wins)['X'], first)
+    assert not np.array_equal(Tiebreaker(simulator, {'X': teams}, seed=6).rank(outcomes, wins)['X'], first)
+    for k in range(4):
+        assert set(first[:, k]) == {0, 1, 2, 3}
+    for row in first:
+        assert sorted(row) == [0, 1, 2, 3]
+
+
+def test_title_counts():
+    east, west = ['A', 'B'], ['C', 'D']
+    games = [('A', 'B'), ('C', 'D'), ('A', 'C')]
+    simulator = make_simulator(east + west, games)
+    outcomes, wins = play(simulator, games, ['A', 'D', 'C'])
+    counts = TitleCounts({'East': east, 'West': west}, seed=0)
+    counts.update(simulator, np.repeat(outcomes, 3, axis=0), np.repeat(wins, 3, axis=0))
+    result = counts.result(simulator)
+    assert result['A']['division'] == 1 and result['A']['title game'] == 1
+    assert result['B']['positions'] == [0, 1]
+    assert result['C']['division'] == 0 and result['D']['division'] == 1
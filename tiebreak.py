@@ -0,0 +1,105 @@
+import numpy as np
+
+
+class Tiebreaker:
+    # Orders the teams of each division in every simulated season at once.
+    # Teams are ranked by conference wins; ties are broken by head-to-head wins among the teams sharing that
+    # conference record, then division record, then overall wins, and finally by a coin flip. Every step is a key in
+    # one sort per season, so there is no Python loop over the simulations.
+    # Note a three way tie is settled by the head-to-head results within the tied group in one step; the group is not
+    # re-split and re-tested the way some conference rulebooks spell out.
+    BASE = 64  # larger than any count of wins, so the keys never overlap
+
+    def __init__(self, simulator, divisions, seed=None):
+        """
+        :param simulator: the SeasonSimulator producing the outcomes
+        :param divisions: dict of division name -> list of team names; together they make up the conference
+        :param seed: seed (or SeedSequence) for the coin flips; not the simulator's, or the flips repeat its draws
+        """
+        self.divisions = divisions
+        self.members = [x for d in divisions.values() for x in d]
+        local = {x: k for k, x in enumerate(self.members)}
+        self.local = {d: [local[x] for x in members] for d, members in divisions.items()}
+        self.rng = np.random.default_rng(seed)
+
+        # The conference games are the simulated games between two members
+        index = [simulator.engine.index[x] for x in self.members]
+        where = {i: k for k, i in enumerate(index)}
+        self.columns, self.first, self.second = [], [], []
+        for c, (a, b) in enumerate(zip(simulator.home, simulator.away)):
+            if a in where and b in where:
+                self.columns.append(c)
+                self.first.append(where[a])
+                self.second.append(where[b])
+        self.columns = np.array(self.columns, dtype=np.int64)
+        self.first = np.array(self.first, dtype=np.int64)
+        self.second = np.array(self.second, dtype=np.int64)
+        self.index = np.array(index, dtype=np.int64)
+
+    def head_to_head(self, outcomes):
+        """Return (numpy array) of (simulations x members x members) wins of each member over each other member."""
+        n = len(self.members)
+        h2h = np.zeros((len(outcomes), n * n), dtype=np.int64)
+        won = outcomes[:, self.columns].astype(np.int64)
+        # Conference opponents can meet twice, so add the games up rather than assigning them
+        np.add.at(h2h.T, self.first * n + self.second, won.T)
+        np.add.at(h2h.T, self.second * n + self.first, 1 - won.T)
+        return h2h.reshape(len(outcomes), n, n)
+
+    def rank(self, outcomes, wins):
+        """
+        :return: dict of division -> (simulations x teams) array of finishing positions, 0 for the division winner
+        """
+        h2h = self.head_to_head(outcomes)
+        conference_wins = h2h.sum(axis=2)
+        overall = wins[:, self.index]
+        coin = self.rng.random(overall.shape)
+
+        positions = {}
+        for d, idx in self.local.items():
+            block = h2h[:, idx][:, :, idx]
+            cw = conference_wins[:, idx]
+            tied = cw[:, :, None] == cw[:, None, :]
+            key = cw
+            key = key * Tiebreaker.BASE + (block * tied).sum(axis=2)
+            key = key * Tiebreaker.BASE + block.sum(axis=2)
+            key = key * Tiebreaker.BASE + overall[:, idx]
+            key = key + coin[:, idx]
+            # position = the number of teams in the division ranked ahead
+            order = np.argsort(-key, axis=1, kind='stable')
+            pos = np.empty_like(order)
+            np.put_along_axis(pos, order, np.arange(len(idx))[None, :], axis=1)
+            positions[d] = pos
+        return positions
+
+
+class TitleCounts:
+    # Streaming reducer counting division titles and appearances in the conference title game.
+    # With more than one division the division winners play for the title; otherwise the top two teams do.
+    def __init__(self, divisions, seed=None):
+        self.divisions = divisions
+        self.seed = seed
+        self.tiebreaker = None
+        self.positions = {d: np.zeros((len(x), len(x)), dtype=np.int64) for d, x in divisions.items()}
+        self.n = 0
+
+    def update(self, simulator, outcomes, wins):
+        if self.tiebreaker is None:
+            self.tiebreaker = Tiebreaker(simulator, self.divisions, seed=self.seed)
+        for d, pos in self.tiebreaker.rank(outcomes, wins).items():
+            for k in range(pos.shape[1]):
+                self.positions[d][k] += np.bincount(pos[:, k], minlength=pos.shape[1])
+        self.n += len(wins)
+
+    def result(self, simulator):
+        """Return (dict) of team -> {'positions': [...], 'division': p, 'title game': p}."""
+        result = {}
+        for d, members in self.divisions.items():
+            for k, x in enumerate(members):
+                positions = self.positions[d][k] / self.n
+                if len(self.divisions) > 1:
+                    title_game = positions[0]
+                else:
+                    title_game = positions[:2].sum()
+                result[x] = {'positions': positions.tolist(), 'division': positions[0], 'title game': title_game}
+        return result